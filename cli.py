@@ -2,11 +2,12 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
+import queue
 import logging
-import colorlog
+import logging.handlers
+import pkgutil
 import argparse
 import importlib
-from pathlib import Path
 from io import TextIOWrapper
 from datetime import datetime
 
@@ -28,6 +29,36 @@ def add_subcommands(subcmd_modules, parser):
         module.cli(subcommand)
 
 
+class RelativePathFormatterMixin(object):
+    '''Adds the relpathname log format attribute, so as to only show the
+    file in which a log was initiated, relative to the project path
+     e.g. pathname = /full/path/to/project/package/module.py
+          relpathname = package/module.py
+    It is only computed for the records a handler formats, on the thread of
+    the queue listener, rather than for every record created.
+    '''
+    project_path = os.path.dirname(os.path.abspath(sys.argv[0])) + os.sep
+
+    def format(self, record):
+        if record.pathname.startswith(self.project_path):
+            record.relpathname = record.pathname[len(self.project_path):]
+
+        else:
+            record.relpathname = record.pathname
+
+        return super().format(record)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    '''Enqueues records as they are, leaving all of their formatting to the
+    handlers of the queue listener. Unlike the stock QueueHandler, records
+    are neither formatted nor copied on the thread that logs them, and so
+    can only be queued within this process.
+    '''
+    def prepare(self, record):
+        return record
+
+
 class CommandLineInterface(object):
     def __init__(self, app, description, verbosity):
         self.app = app
@@ -37,6 +68,7 @@ class CommandLineInterface(object):
 
         self.arguments = self.read_cli_arguments(description, verbosity)
         self.log = logging.getLogger(app)
+        self.listener = None
 
     def read_cli_arguments(self, description, verbosity):
         parser = argparse.ArgumentParser(
@@ -47,6 +79,22 @@ class CommandLineInterface(object):
                             action='store_true',
                             default=verbosity,
                             help='verbose output')
+        parser.add_argument('--production',
+                            action='store_true',
+                            help='log only INFO and above, skipping the '
+                                 'debug records of every detected object '
+                                 'and the development log')
+        parser.add_argument('--trace',
+                            metavar='DIRECTORY',
+                            help='write per-stage timings and counters of '
+                                 'every scan as JSON lines into DIRECTORY')
+        parser.add_argument('--profile',
+                            metavar='FILE',
+                            help='profile the whole run into FILE')
+        parser.add_argument('--profiler',
+                            choices=('cprofile', 'pyinstrument'),
+                            default='cprofile',
+                            help='profiler used by --profile')
 
         subparsers = parser.add_subparsers(dest='subcommand')
         for module in self.load_subcommands():
@@ -63,15 +111,14 @@ class CommandLineInterface(object):
         return args
 
     def load_subcommands(self):
-        subcommand_directory = Path('.') / self.app / 'commands'
-        for subcommand_module_file in subcommand_directory.glob('*.py'):
-            subcommand_module_filename = subcommand_module_file.name
-            if subcommand_module_filename.startswith('__'):
+        # subcommand modules only declare their arguments when imported, and
+        #  import the heavy modules they run on from within main()
+        commands = importlib.import_module(name=f'{self.app}.commands')
+        for subcommand_module in pkgutil.iter_modules(commands.__path__):
+            if subcommand_module.name.startswith('__'):
                 continue
 
-            subcommand_module_name = subcommand_module_filename.replace('.py', '')
-
-            subcommand_package = f'{self.app}.commands.{subcommand_module_name}'
+            subcommand_package = f'{commands.__name__}.{subcommand_module.name}'
             yield importlib.import_module(name=subcommand_package)
 
     def __enter__(self):
@@ -85,26 +132,27 @@ class CommandLineInterface(object):
         for arg in vars(self.arguments):
             value = getattr(self.arguments, arg)
             if callable(value):
-                self.log.debug('\t{argument_key}:\t{value}'.format(
-                    argument_key=arg.rjust(length_of_longest_key, ' '),
-                    value='{}.{}()'.format(value.__module__, value.__name__)
-                ))
+                value = '{}.{}()'.format(value.__module__, value.__name__)
 
             elif isinstance(value, TextIOWrapper):
-                self.log.debug('\t{argument_key}:\t{value}'.format(
-                    argument_key=arg.rjust(length_of_longest_key, ' '),
-                    value=value.name))
+                value = value.name
 
-            else:
-                self.log.debug('\t{argument_key}:\t{value}'.format(
-                    argument_key=arg.rjust(length_of_longest_key, ' '),
-                    value=value))
+            self.log.debug('\t%s:\t%s',
+                           arg.rjust(length_of_longest_key, ' '), value)
 
         self.log.debug(self.start_time)
 
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            return self.log_exit(exc_type)
+        finally:
+            # flush the records still queued before the process exits
+            if self.listener is not None:
+                self.listener.stop()
+
+    def log_exit(self, exc_type):
         if exc_type in (KeyboardInterrupt, SystemExit):
             return False
 
@@ -116,57 +164,60 @@ class CommandLineInterface(object):
         else:
             finish_time = datetime.now()
             self.log.debug(finish_time)
-            self.log.debug('Execution time: {time}'.format(
-                time=(finish_time - self.start_time)
-            ))
+            self.log.debug('Execution time: %s',
+                           finish_time - self.start_time)
             self.log.debug("#" * 20 + " END EXECUTION " + "#" * 20)
             return True
 
     def setup_logger(self):
         self.log = logging.getLogger(self.app)
-        self.log.setLevel(logging.DEBUG)
+        # records below the logger's level are never even created, so in
+        #  production the debug records of the hot paths cost next to nothing
+        if self.arguments.production:
+            self.log.setLevel(logging.INFO)
+
+        else:
+            self.log.setLevel(logging.DEBUG)
 
         # create file handler which logs even debug messages
-        log_file = os.path.join('/tmp', self.app + '.log')
-        in_dev_debug_file_handler = logging.FileHandler(
-            os.path.join('/tmp', '{}.development.log'.format(self.app))
-        )
-        in_dev_debug_file_handler.setLevel(logging.DEBUG)
+        handlers = []
+        if not self.arguments.production:
+            in_dev_debug_file_handler = logging.FileHandler(
+                os.path.join('/tmp', '{}.development.log'.format(self.app))
+            )
+            in_dev_debug_file_handler.setLevel(logging.DEBUG)
+            handlers.append(in_dev_debug_file_handler)
 
         readable_debug_file_handler = logging.FileHandler(
             os.path.join('/tmp', '{}.debug.log'.format(self.app))
         )
         readable_debug_file_handler.setLevel(logging.DEBUG)
+        handlers.append(readable_debug_file_handler)
 
         # create console handler with a higher log level
         command_line_logging = logging.StreamHandler()
+        handlers.append(command_line_logging)
 
-        if self.arguments.verbose:
+        if self.arguments.verbose and not self.arguments.production:
             command_line_logging.setLevel(logging.DEBUG)
 
-            # add relpathname log format attribute so as to only show the file
-            #  in which a log was initiated, relative to the project path
-            #  e.g. pathname = /full/path/to/project/package/module.py
-            #       relpathname = package/module.py
-            default_record_factory = logging.getLogRecordFactory()
-            project_path = os.path.dirname(os.path.abspath(sys.argv[0])) + \
-                           os.sep
-            def relpathname_record_factory(*args, **kwargs):
-                record = default_record_factory(*args, **kwargs)
-                record.relpathname = record.pathname.replace(project_path, '')
-                return record
-            logging.setLogRecordFactory(relpathname_record_factory)
-
             # add colors to the logs!
-            colored_files_funcs_linenos_formatter = colorlog.ColoredFormatter(
-                fmt=(
-                    "%(asctime)s - %(log_color)s%(levelname)-8s%(reset)s"
-                    " [ %(relpathname)s::%(funcName)s():%(lineno)s ] "
-                    "%(message)s"
-                ),
-                datefmt='%Y-%m-%d %H:%M:%S',
-                reset=True,
-            )
+            import colorlog
+
+            class ColoredRelativePathFormatter(RelativePathFormatterMixin,
+                                               colorlog.ColoredFormatter):
+                pass
+
+            colored_files_funcs_linenos_formatter = \
+                ColoredRelativePathFormatter(
+                    fmt=(
+                        "%(asctime)s - %(log_color)s%(levelname)-8s%(reset)s"
+                        " [ %(relpathname)s::%(funcName)s():%(lineno)s ] "
+                        "%(message)s"
+                    ),
+                    datefmt='%Y-%m-%d %H:%M:%S',
+                    reset=True,
+                )
             in_dev_debug_file_handler.setFormatter(
                 colored_files_funcs_linenos_formatter)
             command_line_logging.setFormatter(
@@ -175,7 +226,10 @@ class CommandLineInterface(object):
         else:
             command_line_logging.setLevel(logging.INFO)
 
-        # add the handlers to the logger
-        self.log.addHandler(in_dev_debug_file_handler)
-        self.log.addHandler(command_line_logging)
-        self.log.addHandler(readable_debug_file_handler)
+        # the handlers write from the thread of a queue listener, so that
+        #  neither file I/O nor formatting holds up the threads logging
+        records = queue.SimpleQueue()
+        self.log.addHandler(DeferredQueueHandler(records))
+        self.listener = logging.handlers.QueueListener(
+            records, *handlers, respect_handler_level=True)
+        self.listener.start()
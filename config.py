@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import os
 import pathlib
 
 
@@ -9,11 +10,94 @@ class defaults(object):
     # number of pixels to crop from the border of image
     scanner = "hpaio:/usb/Deskjet_F4100_series?serial=CN7CM6G1Q104TJ"
     # scanner = "genesys:libusb:001:015"
+    # scanners the `station` command drives at the same time, each a dict of
+    #  its SANE 'device', and optionally a 'name' to tell its scans apart, a
+    #  'resolution' and an 'output_directory'. Empty for just `scanner`.
+    scanners = []
+    # scanimage executable, overridable to substitute a fake scanner
+    scanimage = os.environ.get('SCANIMAGE', 'scanimage')
+    resolution = 300
+    # width and height of the scanner bed in inches
+    scan_area = (8.5, 11.7)
     scan_border_reduction = 50
     border_reduction = 20
     intermediate_archival_directory = pathlib.Path('/tmp/scannedcoinsplitter/')
+    # intermediate images of the detection pipeline to archive for debugging:
+    #  None for none, 'all', or a collection of stage names (gray, threshold,
+    #  opening, negated, contours, bounding_boxes)
+    intermediate_archival_stages = None
+    # e.g. 0.25 to archive small previews instead of full resolution images
+    intermediate_archival_preview_scale = None
+    # images waiting to be written before the pipeline blocks
+    intermediate_archival_queue_size = 8
     minimum_coin_area = 22179
+    # fraction of the scan's resolution at which coins/bars are detected,
+    #  e.g. 0.5 or 0.25. Crops are always taken from the full resolution scan,
+    #  and the area, blur and kernel sizes above/below are rescaled to match.
+    detection_scale = 1.0
+    # map uncompressed TIFF/PNM scans from disk instead of decoding them, and
+    #  detect on a level reduced far enough to fit within memory_budget bytes
+    low_memory = False
+    memory_budget = 512 * 2**20
+    blur_kernel_size = 5
+    # 'otsu' for Otsu's thresholding after the Gaussian blur, or 'adaptive'
+    #  for adaptive Gaussian thresholding
+    thresholding = 'otsu'
+    opening_kernel_size = 8
+    # how coins/bars move between the obverse and reverse scans: 'none' when
+    #  each is flipped in place, 'horizontal' when the whole tray is flipped,
+    #  or 'auto' to pick whichever of the two pairs them more closely
+    pairing_mirror = 'none'
+    # obverse/reverse pairs further apart than this (in pixels) are left
+    #  unmatched, None for no limit
+    pairing_max_distance = None
     cropped_output_directory = 'split'
     merged_output_directory = 'merged'
+    # JSON manifest of every pair scanned, inside the output directory
+    manifest_directory = 'manifests'
+    # how each class of output image is encoded: 'png' with a zlib 'level'
+    #  of 0-9, lossless 'webp' (or lossy, with a 'quality' of 0-100), 'jpeg'
+    #  with a 'quality' of 0-100, or 'tiff' with 'deflate', 'lzw' or 'none'
+    #  'compression'
+    output_formats = {
+        'crop': {'format': 'png', 'level': 1},
+        'merged': {'format': 'png', 'level': 1},
+    }
+    # threads encoding and writing output images, and images that may wait
+    #  for them before the pipeline blocks
+    output_writer_threads = 4
+    output_writer_queue_size = 16
     output_directory = pathlib.Path('~').expanduser()/'Pictures'/'bullion'
-    timeout = 60 #seconds, 1 minute
\ No newline at end of file
+    # split results of previously seen scans, evicted least recently used
+    #  first once they take up more than cache_size bytes
+    cache_directory = pathlib.Path('~').expanduser()/'.cache'/'scannedcoinsplitter'
+    cache_size = 64 * 2**20
+    # perceptual hashes of every crop and merged image, to recognize items
+    #  scanned before, e.g. cache_directory/'fingerprints.sqlite3'; None to
+    #  not fingerprint them at all. Off by default, as items of the same
+    #  design look alike however far apart they were scanned
+    fingerprint_index = None
+    # merged images whose hashes are at most this many bits apart are
+    #  flagged as scans of the same item
+    duplicate_distance = 6
+    timeout = 60 #seconds, 1 minute, before a scan is aborted
+    # Unix domain socket on which `serve` accepts split jobs
+    service_socket = pathlib.Path(
+        os.environ.get('XDG_RUNTIME_DIR', '/tmp'))/'scannedcoinsplitter.sock'
+    # scan pairs the service splits at the same time, and jobs it holds
+    #  waiting for a worker before it turns clients away as busy
+    service_workers = 2
+    service_queue_size = 4
+    # seconds a job may wait for room in the queue before it is turned away
+    service_queue_timeout = 30
+    # seconds both scans of a pair must stop changing before `watch` splits
+    #  them, so that scans still being written are left alone
+    watch_settle_time = 5
+    # seconds between rescans of a watched directory when inotify is not
+    #  available, or while scans are waiting to settle
+    watch_poll_interval = 2
+    # seconds a scan may wait for the other side of its pair before it is
+    #  reported as incomplete
+    watch_incomplete_timeout = 600
+    # pairs already split, kept inside the watched directory
+    watch_progress_filename = '.scannedcoinsplitter-watch.json'
\ No newline at end of file
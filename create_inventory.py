@@ -1,45 +1,182 @@
 #!/usr/bin/env /home/doug/Software/ScannedCoinSplitter/venv/bin/python3
 # -*- coding: utf-8 -*-
+import argparse
+import collections
+import concurrent.futures
 import csv
+import os
 import pathlib
 import re
+import sqlite3
 import sys
 
+import progressbar
+
 
 DEFAULT_SCANNING_DIR = './results/safety-deposit-box'
 
+# extensions of the formats merged images may be written in
+IMAGE_EXTENSIONS = ('.png', '.webp', '.jpg', '.tiff')
 
-def main(args):
-    scan_directory = pathlib.Path(args[1])
-    print(f'Iterating over scanned and named images in {scan_directory}')
 
-    ingots = []
-    invalid_filenames = []
-    for scanned_image in scan_directory.glob('**/merged/*.png'):
-        try:
-            ingot = Ingot(path=scanned_image)
-        except AttributeError:
-            invalid_filenames.append(scanned_image)
-        else:
+def main(args):
+    # indexed by absolute path, so the index holds wherever it is run from
+    scan_directory = args.scan_directory.resolve()
+    report = (lambda *_: None) if args.quiet else print
+    csv_path = scan_directory / f'{scan_directory.name}.csv'
+
+    if not args.use_index:
+        report(f'Listing scanned and named images in {scan_directory}')
+        invalid_filenames = stream_inventory(scan_directory=scan_directory,
+                                             csv_path=csv_path,
+                                             jobs=args.jobs,
+                                             progress=args.progress)
+        report(f'Inventory written to {csv_path}')
+        report_invalid(invalid_filenames)
+        return
+
+    index_path = args.index or scan_directory / f'{scan_directory.name}.sqlite3'
+    with InventoryIndex(path=index_path) as index:
+        report(f'Indexing scanned and named images in {scan_directory}')
+        changes = index.update(scan_directory=scan_directory,
+                               jobs=args.jobs,
+                               progress=args.progress)
+        report(f'\t{changes.added} added, {changes.updated} updated, '
+               f'{changes.removed} removed, {changes.unchanged} unchanged')
+
+        if args.query is not None:
+            for row in index.query(name=args.query, unit=args.unit):
+                print(f'{row["weight_raw"]:>8} {row["unit"]:<3}  {row["name"]}')
+
+        if args.totals:
             print('.'*80)
-            print(ingot)
-            print(f'\tname   := {ingot.name}')
-            print(f'\tweight := {ingot.weight}')
-            ingots.append(ingot)
+            for row in index.totals(name=args.query, unit=args.unit):
+                print(f'{row["qty"]:>5} x {row["weight_raw"]:>8} '
+                      f'{row["unit"]:<3} {row["name"]}')
+            total = index.total_ozt(name=args.query, unit=args.unit)
+            print(f'Total: {total:.3f} ozt')
+
+        if args.csv:
+            with Inventory(path=csv_path) as inventory:
+                for ingot in index.ingots():
+                    inventory.add(ingot=ingot)
+            report(f'Inventory written to {csv_path}')
 
-    ingots.sort()
+        report_invalid(list(index.invalid()))
 
-    with Inventory(scan_directory=scan_directory) as inventory:
-        for ingot in ingots:
-            inventory.add(ingot=ingot)
 
+def report_invalid(invalid_filenames):
     if len(invalid_filenames) > 0:
-        print('!'*80)
-        print(f'{len(invalid_filenames)} invalid filenames:')
+        print('!'*80, file=sys.stderr)
+        print(f'{len(invalid_filenames)} invalid filenames, left out of '
+              f'the inventory:', file=sys.stderr)
         for path in invalid_filenames:
-            print(f'\t{path}')
-        print('Aborting.')
-        sys.exit(1)
+            print(f'\t{path}', file=sys.stderr)
+
+
+def stream_inventory(scan_directory: pathlib.Path, csv_path: pathlib.Path,
+                     jobs: int = None, progress: bool = False):
+    '''Write the inventory CSV straight from a walk of the scan tree,
+    without an index. Rows are written as soon as their filenames are parsed,
+    in the order of the images' paths. Returns the paths of the images with
+    invalid filenames.
+    '''
+    invalid_filenames = []
+    with Inventory(path=csv_path) as inventory:
+        for images in walk(scan_directory, jobs=jobs, progress=progress):
+            filenames = [os.path.basename(path) for path, _, _ in images]
+            for (path, _, _), ingot in zip(images,
+                                           parse_filenames(filenames)):
+                if ingot is None:
+                    invalid_filenames.append(path)
+                else:
+                    inventory.add(ingot=ingot)
+
+    return invalid_filenames
+
+
+def walk(scan_directory: pathlib.Path, jobs: int = None, progress: bool = False):
+    '''The (path, mtime_ns, size) of every image in a `merged` directory
+    below `scan_directory`, e.g. of **/merged/*.png. Each top-level
+    subdirectory is walked on a thread of its own; yields one list per
+    subdirectory, sorted by path, in the order of the subdirectories.
+    '''
+    with os.scandir(scan_directory) as entries:
+        directories = sorted(entry.path for entry in entries
+                             if entry.is_dir(follow_symlinks=False))
+
+    bar = None
+    if progress:
+        bar = progressbar.ProgressBar(max_value=len(directories),
+                                      fd=sys.stderr)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(walk_tree, directory)
+                   for directory in directories]
+        for walked, future in enumerate(futures, start=1):
+            yield future.result()
+            if bar is not None:
+                bar.update(walked)
+
+    if bar is not None:
+        bar.finish()
+
+
+def walk_tree(directory: str):
+    images = []
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        in_merged = os.path.basename(current) == 'merged'
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+
+                    elif in_merged and entry.name.endswith(IMAGE_EXTENSIONS) \
+                            and not entry.name.startswith('.') \
+                            and entry.is_file():
+                        stat = entry.stat()
+                        images.append((entry.path, stat.st_mtime_ns,
+                                       stat.st_size))
+        except PermissionError as e:
+            print(f'Skipping {current}: {e}', file=sys.stderr)
+
+    images.sort()
+    return images
+
+
+# an ingot parsed from its filename
+ParsedIngot = collections.namedtuple(
+    'ParsedIngot', ['filename', 'name', 'weight_raw', 'weight', 'unit', 'ozt'])
+
+
+def parse_filenames(filenames):
+    '''Parse a batch of filenames, with one match of WeightParser's regex
+    each. Returns a ParsedIngot per filename, or None where the filename
+    cannot be parsed.
+    '''
+    match = WeightParser.weight_regex.match
+    converter = WeightParser.weight_converter
+    parsed = []
+    for filename in filenames:
+        weight = match(filename)
+        if weight is None:
+            parsed.append(None)
+            continue
+
+        raw, unit = weight.group('value', 'unit')
+        value = float(raw)
+        if value.is_integer():
+            value = int(value)
+
+        stem = filename.rpartition('.')[0] or filename
+        name = stem.replace(f'{raw} {unit}', '').replace('  ', ' ').strip()
+        parsed.append(ParsedIngot(filename, name, raw, value, unit,
+                                  converter[unit](value)))
+
+    return parsed
 
 
 class WeightParser(object):
@@ -66,31 +203,161 @@ class WeightParser(object):
         return f'{self.raw} {self.unit}'
 
 
-class IngotNameParser(object):
-    def __init__(self, path: pathlib.Path, weight: WeightParser):
-        self.name = path.stem\
-            .replace(str(weight), '')\
-            .replace('  ', ' ')\
-            .strip()
+class IndexChanges(object):
+    def __init__(self):
+        self.added = 0
+        self.updated = 0
+        self.removed = 0
+        self.unchanged = 0
+
+
+class InventoryIndex(object):
+    '''SQLite index of the merged images in a scan tree, keyed by path and
+    remembering the size and modification time of each file, so that only
+    new or changed files have their filenames parsed again. Files whose names
+    cannot be parsed are kept in the index as invalid.
+    '''
+    schema = '''
+        CREATE TABLE IF NOT EXISTS images (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            valid INTEGER NOT NULL,
+            name TEXT,
+            weight_raw TEXT,
+            weight REAL,
+            unit TEXT,
+            ozt REAL
+        );
+        CREATE INDEX IF NOT EXISTS images_by_name ON images (name);
+        CREATE INDEX IF NOT EXISTS images_by_unit_weight
+            ON images (unit, weight);
+    '''
 
-    def __repr__(self):
-        return self.name
-
-
-class Ingot(object):
     def __init__(self, path: pathlib.Path):
-        self.filename = path.name
-        self.weight = WeightParser(filename=self.filename)
-        self.name = IngotNameParser(path=path, weight=self.weight)
+        self.path = path
+        self.connection = sqlite3.connect(str(path))
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(self.schema)
 
-    def __repr__(self):
-        return self.filename
-
-    def __eq__(self, other):
-        return self.filename == other.filename
+    def __enter__(self):
+        return self
 
-    def __lt__(self, other):
-        return self.filename < other.filename
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.connection.close()
+
+    def update(self, scan_directory: pathlib.Path, jobs: int = None,
+               progress: bool = False) -> IndexChanges:
+        changes = IndexChanges()
+        indexed = {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self.connection.execute(
+                'SELECT path, mtime_ns, size FROM images')
+        }
+
+        rows = []
+        for images in walk(scan_directory, jobs=jobs, progress=progress):
+            changed = []
+            for image in images:
+                path, mtime_ns, size = image
+                signature = indexed.pop(path, None)
+                if signature == (mtime_ns, size):
+                    changes.unchanged += 1
+                    continue
+
+                if signature is None:
+                    changes.added += 1
+                else:
+                    changes.updated += 1
+
+                changed.append(image)
+
+            filenames = [os.path.basename(path) for path, _, _ in changed]
+            rows.extend(self.row(image, ingot) for image, ingot
+                        in zip(changed, parse_filenames(filenames)))
+
+        changes.removed = len(indexed)
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO images VALUES '
+                '(:path, :mtime_ns, :size, :filename, :valid, :name, '
+                ':weight_raw, :weight, :unit, :ozt)', rows)
+            self.connection.executemany(
+                'DELETE FROM images WHERE path = ?',
+                ((path,) for path in indexed))
+
+        return changes
+
+    @staticmethod
+    def row(image: tuple, ingot: ParsedIngot) -> dict:
+        path, mtime_ns, size = image
+        row = {
+            'path': path,
+            'mtime_ns': mtime_ns,
+            'size': size,
+            'filename': os.path.basename(path),
+            'valid': ingot is not None,
+            'name': None,
+            'weight_raw': None,
+            'weight': None,
+            'unit': None,
+            'ozt': None,
+        }
+        if ingot is not None:
+            row.update(ingot._asdict())
+
+        return row
+
+    @staticmethod
+    def conditions(name: str = None, unit: str = None):
+        clauses = ['valid']
+        parameters = []
+        if name is not None:
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            escaped = name.replace('\\', '\\\\')\
+                .replace('%', '\\%')\
+                .replace('_', '\\_')
+            parameters.append(f'%{escaped}%')
+        if unit is not None:
+            clauses.append('unit = ?')
+            parameters.append(unit)
+
+        return ' AND '.join(clauses), parameters
+
+    def query(self, name: str = None, unit: str = None):
+        '''Valid ingots whose name contains `name`, weighed in `unit`'''
+        where, parameters = self.conditions(name=name, unit=unit)
+        return self.connection.execute(
+            f'SELECT * FROM images WHERE {where} ORDER BY name, weight',
+            parameters)
+
+    def totals(self, name: str = None, unit: str = None):
+        '''Quantity of each distinct ingot, by name and weight'''
+        where, parameters = self.conditions(name=name, unit=unit)
+        return self.connection.execute(
+            f'SELECT name, weight_raw, unit, COUNT(*) AS qty, '
+            f'SUM(ozt) AS ozt FROM images WHERE {where} '
+            f'GROUP BY name, weight_raw, unit ORDER BY name, weight',
+            parameters)
+
+    def total_ozt(self, name: str = None, unit: str = None) -> float:
+        where, parameters = self.conditions(name=name, unit=unit)
+        (total,) = self.connection.execute(
+            f'SELECT COALESCE(SUM(ozt), 0) FROM images WHERE {where}',
+            parameters).fetchone()
+        return total
+
+    def ingots(self):
+        '''Every valid ingot, in the order of their filenames'''
+        for row in self.connection.execute(
+                'SELECT * FROM images WHERE valid ORDER BY filename'):
+            yield ParsedIngot(*(row[field] for field in ParsedIngot._fields))
+
+    def invalid(self):
+        for (path,) in self.connection.execute(
+                'SELECT path FROM images WHERE NOT valid ORDER BY path'):
+            yield path
 
 
 class Inventory(object):
@@ -101,9 +368,9 @@ class Inventory(object):
         'g',
     ]
 
-    def __init__(self, scan_directory: pathlib.Path):
-        self.filename = f'{scan_directory.name}.csv'
-        self.csv_file = open(self.filename, 'w')
+    def __init__(self, path: pathlib.Path):
+        self.filename = path
+        self.csv_file = open(self.filename, 'w', newline='')
         self.csv_writer = csv.DictWriter(self.csv_file,
                                          fieldnames=self.fieldnames)
 
@@ -113,21 +380,63 @@ class Inventory(object):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.csv_file.close()
 
-    def add(self, ingot: Ingot):
+    def add(self, ingot: ParsedIngot):
         self.csv_writer.writerow({
-            'item': str(ingot.name),
+            'item': ingot.name,
             'qty': 1,
-            'ozt': ingot.weight.raw if ingot.weight.unit == 'ozt' else '',
-            'g': ingot.weight.raw if ingot.weight.unit == 'g' else '',
+            'ozt': ingot.weight_raw if ingot.unit == 'ozt' else '',
+            'g': ingot.weight_raw if ingot.unit == 'g' else '',
         })
 
 
+def read_cli_arguments():
+    parser = argparse.ArgumentParser(
+        description='Index the named, merged images of a scan tree and '
+                    'write out its inventory',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('scan_directory',
+                        nargs='?',
+                        default=DEFAULT_SCANNING_DIR,
+                        type=pathlib.Path,
+                        help='directory of named scans')
+    parser.add_argument('--index',
+                        type=pathlib.Path,
+                        help='SQLite index to keep up to date, by default '
+                             'SCAN_DIRECTORY/<name of SCAN_DIRECTORY>.sqlite3')
+    parser.add_argument('-q', '--query',
+                        metavar='NAME',
+                        help='list the ingots whose name contains NAME')
+    parser.add_argument('-u', '--unit',
+                        choices=sorted(WeightParser.weight_converter),
+                        help='only list or total ingots weighed in UNIT')
+    parser.add_argument('-t', '--totals',
+                        action='store_true',
+                        help='print the quantity of each ingot and the total '
+                             'weight in troy ounces')
+    parser.add_argument('--no-index',
+                        dest='use_index',
+                        action='store_false',
+                        help='write the inventory CSV straight from a walk of '
+                             'the scan tree, without reading or updating the '
+                             'index')
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        help='number of top-level subdirectories to walk at '
+                             'the same time, by default a few more than the '
+                             'number of processors')
+    parser.add_argument('-p', '--progress',
+                        action='store_true',
+                        help='show the progress of the walk on stderr')
+    parser.add_argument('--quiet',
+                        action='store_true',
+                        help='only report invalid filenames')
+    parser.add_argument('--no-csv',
+                        dest='csv',
+                        action='store_false',
+                        help='do not write the inventory CSV next to the scans')
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    arguments = list(sys.argv)
-    if len(sys.argv) != 2:
-        print(f'Usage: {sys.argv[0]} PATH/TO/NAMED/SCANS/DIRECTORY')
-        print(f'\tif no directory provided, it defaults to {DEFAULT_SCANNING_DIR}')
-        arguments.append(DEFAULT_SCANNING_DIR)
-        # sys.exit(1)
-
-    main(arguments)
\ No newline at end of file
+    main(read_cli_arguments())
\ No newline at end of file
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Acquisition of scans from SANE's scanimage"""
+import asyncio
+import logging
+import os
+import pathlib
+import queue
+import re
+import subprocess
+import threading
+
+import config
+from .utilities import exceptions
+from .utilities.image import source
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2**20
+
+# reported by `scanimage --batch` on stderr once a page's file is complete
+SCANNED_PAGE = re.compile(r'Scanned page (\d+)\.')
+# SANE_STATUS_NO_DOCS, with which scanimage exits once a feeder runs empty
+NO_DOCS = 7
+
+
+def scanimage_command(device=None, resolution=None, image_format='tiff'):
+    return [
+        config.defaults.scanimage,
+        "--device-name", device or config.defaults.scanner,
+        "--resolution", str(resolution or config.defaults.resolution),
+        "--format={0}".format(image_format),
+    ]
+
+
+def expected_scan_size(resolution=None):
+    '''Bytes of an uncompressed 8-bit RGB scan of the whole scanner bed, used
+    to preallocate the buffer the scan is read into'''
+    width, height = config.defaults.scan_area
+    resolution = resolution or config.defaults.resolution
+    return int(width * resolution) * int(height * resolution) * 3
+
+
+def stream_scan(path, device=None, resolution=None, timeout=None):
+    '''Run scanimage and read the scan from its stdout into memory, while a
+    writer thread tees the same bytes into the archival file at `path`. The
+    scan is decoded from memory, so it is never read back from disk. The
+    scanner is killed if it runs longer than `timeout` seconds
+    (config.defaults.timeout if not given).
+    '''
+    device = device or config.defaults.scanner
+    timeout = timeout or config.defaults.timeout
+
+    process = subprocess.Popen(
+        scanimage_command(device=device, resolution=resolution),
+        stdout=subprocess.PIPE,
+    )
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    try:
+        with TeeWriter(path) as tee:
+            buffer = read_into_buffer(process.stdout,
+                                      size=expected_scan_size(resolution),
+                                      tee=tee)
+        return_code = process.wait()
+
+    finally:
+        timer.cancel()
+        process.stdout.close()
+
+    if timed_out.is_set() or return_code != 0:
+        os.remove(str(path))
+        if timed_out.is_set():
+            raise exceptions.ScanTimeoutException(device, timeout)
+
+        raise exceptions.MissingScannerException(device)
+
+    return source.ScannedImage.load(buffer,
+                                    name=path.name.split(".")[0],
+                                    path=path)
+
+
+async def scan_to_file(path, device=None, resolution=None, timeout=None):
+    '''Run scanimage as a subprocess of the running event loop, with its
+    stdout going straight into the file at `path`, so that any number of
+    scanners can be driven at once from one thread. The scanner is killed if
+    it runs longer than `timeout` seconds (config.defaults.timeout if not
+    given).
+    '''
+    device = device or config.defaults.scanner
+    timeout = timeout or config.defaults.timeout
+
+    with open(str(path), 'wb') as f:
+        process = await asyncio.create_subprocess_exec(
+            *scanimage_command(device=device, resolution=resolution),
+            stdout=f,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, errors = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            os.remove(str(path))
+            raise exceptions.ScanTimeoutException(device, timeout)
+
+    if process.returncode != 0:
+        os.remove(str(path))
+        for line in errors.decode(errors='replace').splitlines():
+            logger.debug('%s: %s', device, line)
+
+        raise exceptions.MissingScannerException(device)
+
+    return path
+
+
+async def scan_batch(pattern, device=None, resolution=None, pages=None,
+                     source=None, timeout=None):
+    '''Run `scanimage --batch`, which scans page after page from a document
+    feeder into `pattern` % page number, and yield the (page number, path)
+    of each page as soon as scanimage reports it scanned. Scanning stops
+    once the feeder is empty or `pages` pages are scanned. The scanner is
+    killed if it takes longer than `timeout` seconds (config.defaults.timeout
+    if not given) to finish any one page.
+    '''
+    device = device or config.defaults.scanner
+    timeout = timeout or config.defaults.timeout
+
+    command = scanimage_command(device=device, resolution=resolution)
+    command.append('--batch={0}'.format(pattern))
+    if pages is not None:
+        command.append('--batch-count={0}'.format(pages))
+    if source is not None:
+        command += ['--source', source]
+
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    scanned = 0
+    try:
+        while True:
+            try:
+                line = await asyncio.wait_for(process.stderr.readline(),
+                                              timeout)
+            except asyncio.TimeoutError:
+                raise exceptions.ScanTimeoutException(device, timeout)
+
+            if not line:
+                break
+
+            line = line.decode(errors='replace').strip()
+            found = SCANNED_PAGE.search(line)
+            if found is None:
+                logger.debug('%s: %s', device, line)
+                continue
+
+            scanned += 1
+            page = int(found.group(1))
+            yield page, pathlib.Path(str(pattern) % page)
+
+        return_code = await process.wait()
+
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+    if return_code not in (0, NO_DOCS):
+        raise exceptions.MissingScannerException(device)
+
+    logger.debug('%s: %d pages scanned', device, scanned)
+
+
+def read_into_buffer(stream, size, tee=None):
+    '''Read `stream` until EOF into a buffer preallocated to `size` bytes,
+    handing every chunk read to `tee` as well. Returns a memoryview of the
+    bytes read.
+    '''
+    buffer = bytearray(size)
+    received = 0
+    while True:
+        if received == len(buffer):
+            # the estimate was too small; views of the old buffer handed to
+            #  the tee stay valid as they keep the old buffer alive
+            grown = bytearray(2 * len(buffer) or CHUNK_SIZE)
+            grown[:received] = buffer
+            buffer = grown
+
+        chunk = memoryview(buffer)[received:received + CHUNK_SIZE]
+        read = stream.readinto(chunk)
+        if not read:
+            break
+
+        if tee is not None:
+            tee.write(chunk[:read])
+
+        received += read
+
+    return memoryview(buffer)[:received]
+
+
+class TeeWriter(object):
+    '''Writes chunks to a file on a background thread'''
+    def __init__(self, path):
+        self.path = path
+        self.chunks = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self.run,
+                                       name='scan-tee-writer',
+                                       daemon=True)
+
+    def __enter__(self):
+        self.file = open(str(self.path), 'wb')
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.chunks.put(None)
+        self.thread.join()
+        self.file.close()
+        if exc_type is None and self.error is not None:
+            raise self.error
+
+        return False
+
+    def write(self, chunk):
+        self.chunks.put(chunk)
+
+    def run(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+
+            if self.error is None:
+                try:
+                    self.file.write(chunk)
+                except OSError as e:
+                    self.error = e
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""On-disk cache of split results, keyed by the content of the scans and the
+configuration they were split with, so that unchanged scans are never split
+again"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+
+import numpy
+
+import config
+from .utilities import files
+
+logger = logging.getLogger(__name__)
+
+# configuration that changes which boxes are detected in a scan
+DETECTION_PARAMETERS = (
+    'scan_border_reduction',
+    'border_reduction',
+    'minimum_coin_area',
+    'blur_kernel_size',
+    'opening_kernel_size',
+    'thresholding',
+)
+
+# configuration that additionally changes how the crops of a pair are merged
+PAIRING_PARAMETERS = (
+    'pairing_mirror',
+    'pairing_max_distance',
+)
+
+# configuration that changes the paths and contents of the images written
+OUTPUT_PARAMETERS = (
+    'output_formats',
+)
+
+
+def detection_parameters(detection_scale, low_memory=False):
+    parameters = {p: getattr(config.defaults, p) for p in DETECTION_PARAMETERS}
+    parameters['detection_scale'] = detection_scale
+    if low_memory:
+        # the level detection runs on then also depends on the budget
+        parameters['memory_budget'] = config.defaults.memory_budget
+
+    return parameters
+
+
+def pairing_parameters():
+    return {p: getattr(config.defaults, p) for p in PAIRING_PARAMETERS}
+
+
+def output_parameters():
+    return {p: getattr(config.defaults, p) for p in OUTPUT_PARAMETERS}
+
+
+class ResultCache(object):
+    '''JSON entries in `directory`, one file per key. Reading an entry marks
+    it as recently used; once the entries take up more than `max_bytes`, the
+    least recently used ones are evicted.
+
+    The size of the entries is counted as they are written, and the
+    directory is only listed again once the count exceeds `max_bytes`. The
+    count misses what other processes write in the meantime, so the cache
+    may outgrow `max_bytes` by as much until it is next listed.
+    '''
+    def __init__(self, directory, max_bytes):
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self.hashes = {}
+        self.hashes_lock = threading.Lock()
+        self.size = None
+        self.size_lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_config(cls):
+        '''The configured ResultCache, shared by every caller in a process'''
+        return open_cache(directory=config.defaults.cache_directory,
+                          max_bytes=config.defaults.cache_size)
+
+    @staticmethod
+    def key(*parts):
+        encoded = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def content_hash(self, source):
+        '''SHA-256 of a scan given as a path, encoded bytes, decoded array or
+        ScannedImage. Hashes of files are remembered for as long as the file's
+        size and modification time do not change.
+        '''
+        path = getattr(source, 'path', source)
+        if isinstance(path, (str, os.PathLike)):
+            path = pathlib.Path(path).resolve()
+            stat = path.stat()
+            signature = (path, stat.st_size, stat.st_mtime_ns)
+            with self.hashes_lock:
+                if signature in self.hashes:
+                    return self.hashes[signature]
+
+            digest = hashlib.sha256()
+            with open(str(path), 'rb') as f:
+                for chunk in iter(lambda: f.read(2**20), b''):
+                    digest.update(chunk)
+
+            with self.hashes_lock:
+                self.hashes[signature] = digest.hexdigest()
+
+            return digest.hexdigest()
+
+        pixels = getattr(source, 'pixels', source)
+        digest = hashlib.sha256()
+        if isinstance(pixels, numpy.ndarray):
+            digest.update(str((pixels.shape, pixels.dtype.str)).encode())
+            digest.update(numpy.ascontiguousarray(pixels).data)
+        else:
+            digest.update(pixels)
+
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return self.directory / '{0}.json'.format(key)
+
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(str(path)) as f:
+                value = json.load(f)
+            os.utime(str(path))
+        except (OSError, ValueError):
+            return None
+
+        logger.debug('Cache hit: %s', key)
+        return value
+
+    def put(self, key, value):
+        path = self.entry_path(key)
+        try:
+            replaced = path.stat().st_size
+        except OSError:
+            replaced = 0
+
+        # concurrent workers never read a partially written entry
+        with files.atomic_write(path) as f:
+            json.dump(value, f)
+            written = f.tell()
+
+        with self.size_lock:
+            if self.size is not None:
+                self.size += written - replaced
+
+            full = self.size is None or self.size > self.max_bytes
+
+        if full:
+            self.evict()
+
+    def evict(self):
+        '''List the entries, evicting the least recently used ones while they
+        take up more than `max_bytes`'''
+        entries = []
+        total = 0
+        for path in self.directory.glob('*.json'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        while total > self.max_bytes and entries:
+            _, size, path = entries.pop(0)
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+            total -= size
+            logger.debug('Evicted %s from the cache', path.name)
+
+        with self.size_lock:
+            self.size = total
+
+
+@functools.lru_cache()
+def open_cache(directory, max_bytes):
+    '''The ResultCache of `directory`, opened once per process'''
+    return ResultCache(directory=directory, max_bytes=max_bytes)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Subcommands of the command line, one module each"""
+
+import config
+from ..utilities.image import stages
+
+
+def add_pipeline_arguments(subcommand):
+    '''Add the command-line arguments of the splitting pipeline shared by
+    every subcommand that splits scans, read back by pipeline_options()
+    '''
+    subcommand.add_argument(
+        '--no-crops',
+        help='do not write the individual split images to disk',
+        dest='save_crops',
+        action='store_false',
+    )
+    subcommand.add_argument(
+        '--detection-scale',
+        help='fraction of the scan resolution at which to detect coins/bars, '
+             'e.g. 0.5 or 0.25',
+        default=config.defaults.detection_scale,
+        type=float
+    )
+    subcommand.add_argument(
+        '--low-memory',
+        help='memory-map uncompressed TIFF/PNM scans and detect on a level '
+             'small enough to stay within {0} MiB'.format(
+                 config.defaults.memory_budget // 2**20),
+        action='store_true',
+        default=config.defaults.low_memory,
+    )
+    subcommand.add_argument(
+        '--archive-intermediates',
+        help='intermediate detection images to archive into {0} for '
+             'debugging: "all" or a comma separated list of stages ({1})'
+             .format(config.defaults.intermediate_archival_directory,
+                     ', '.join(stages.STAGES)),
+        dest='archival_stages',
+        default=config.defaults.intermediate_archival_stages,
+        type=stages.parse_stages
+    )
+    subcommand.add_argument(
+        '--no-cache',
+        help='split scans again even if they are unchanged since they were '
+             'last split',
+        dest='use_cache',
+        action='store_false',
+    )
+
+
+def pipeline_options(args):
+    '''The keyword arguments of splitter.split_pair given on the command line
+    by the arguments of add_pipeline_arguments()'''
+    return {
+        'save_crops': args.save_crops,
+        'detection_scale': args.detection_scale,
+        'low_memory': args.low_memory,
+        'archival_stages': args.archival_stages,
+        'use_cache': args.use_cache,
+    }
+
+
+def extraction_options(args):
+    '''The keyword arguments of splitter.extract_ingots given on the command
+    line by the arguments of add_pipeline_arguments(), for subcommands that
+    split each scan as soon as it is scanned'''
+    from .. import cache
+
+    return {
+        'detection_scale': args.detection_scale,
+        'low_memory': args.low_memory,
+        'archival_stages': args.archival_stages,
+        'cache': cache.ResultCache.from_config() if args.use_cache else None,
+    }
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Split and merge every obverse/reverse scan pair in a directory, in
+parallel"""
+
+import concurrent.futures
+import contextlib
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import pathlib
+
+import config
+from .. import instrumentation
+from .. import naming
+from ..utilities import exceptions
+from . import add_pipeline_arguments
+from . import pipeline_options
+
+logger = logging.getLogger(__name__)
+package_logger = logging.getLogger(__name__.partition('.')[0])
+
+
+def cli(subcommand):
+    '''Add command-line arguments to this subcommand
+    '''
+    subcommand.add_argument(
+        '-i', '--input-directory',
+        help='directory containing "... - N - obverse.tiff" and '
+             '"... - N - reverse.tiff" scans',
+        required=True,
+        type=pathlib.Path
+    )
+    subcommand.add_argument(
+        '-o', '--output-directory',
+        help='directory into which to output split and merged images',
+        default=config.defaults.output_directory,
+        type=pathlib.Path
+    )
+    subcommand.add_argument(
+        '-j', '--jobs',
+        help='number of scan pairs to process at the same time',
+        default=os.cpu_count(),
+        type=int
+    )
+    add_pipeline_arguments(subcommand)
+    subcommand.set_defaults(func=main)
+
+
+def main(args):
+    pairs = naming.find_pairs(args.input_directory)
+    logger.info('%d scan pairs found in %s', len(pairs),
+                args.input_directory)
+
+    total = 0
+    failed = []
+    with worker_logs() as log_records, \
+            concurrent.futures.ProcessPoolExecutor(
+                max_workers=args.jobs,
+                initializer=initialize_worker,
+                initargs=(instrumentation.directory(), log_records)) \
+            as executor:
+        futures = {
+            executor.submit(process_pair,
+                            obverse=obverse,
+                            reverse=reverse,
+                            output_directory=args.output_directory,
+                            **pipeline_options(args)): obverse
+            for obverse, reverse in pairs
+        }
+
+        for future in concurrent.futures.as_completed(futures):
+            obverse = futures[future]
+            name = naming.pair_name(obverse.stem)
+            try:
+                merged_images = future.result()
+            except exceptions.UnreadableImageException as e:
+                logger.error(e)
+                failed.append(name)
+                continue
+
+            except Exception:
+                # one broken pair never stops the rest of the batch
+                logger.exception('Unable to split %s', name)
+                failed.append(name)
+                continue
+
+            total += len(merged_images)
+            logger.info('%s: %d merged images created', name,
+                        len(merged_images))
+
+    logger.info('%d merged images created from %d scan pairs', total,
+                len(pairs) - len(failed))
+    if failed:
+        logger.error('%d scan pairs failed: %s', len(failed),
+                     ', '.join(sorted(failed)))
+        return 1
+
+
+def process_pair(**kwargs):
+    from .. import splitter
+    from ..utilities.image import archive
+
+    merged_images = splitter.split_pair(**kwargs)
+    # worker processes exit without running atexit handlers, so archived
+    #  intermediate images have to be written before handing back the result
+    archive.flush()
+    return merged_images
+
+
+def initialize_worker(trace_directory=None, log_records=None):
+    # each worker already runs alongside `jobs` others, so keep OpenCV from
+    #  spawning a thread per core inside every one of them
+    import cv2
+    cv2.setNumThreads(1)
+
+    # a forked worker inherits handlers queueing records for a listener that
+    #  only runs in the parent, so its records are sent there instead
+    if log_records is not None:
+        records, level = log_records
+        for handler in list(package_logger.handlers):
+            package_logger.removeHandler(handler)
+
+        package_logger.addHandler(logging.handlers.QueueHandler(records))
+        package_logger.setLevel(level)
+
+    # workers that are spawned rather than forked start with tracing off
+    if trace_directory is not None:
+        instrumentation.enable(trace_directory)
+
+
+class ForwardingHandler(logging.Handler):
+    '''Handles the records of worker processes with the loggers of this
+    process, as if they were logged here'''
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+@contextlib.contextmanager
+def worker_logs():
+    '''Queue for worker processes to send their log records through, and the
+    level to log them at. Records are handled as they arrive until the block
+    exits, by which point the workers must have exited.'''
+    records = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(records, ForwardingHandler())
+    listener.start()
+    try:
+        yield records, package_logger.getEffectiveLevel()
+    finally:
+        listener.stop()
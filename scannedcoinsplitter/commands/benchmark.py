@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark the splitting pipeline on synthetic scans, writing one JSON
+record per run"""
+
+import collections
+import contextlib
+import datetime
+import json
+import logging
+import pathlib
+import resource
+import subprocess
+import sys
+import tempfile
+
+import config
+
+logger = logging.getLogger(__name__)
+
+def cli(subcommand):
+    '''Add command-line arguments to this subcommand
+    '''
+    subcommand.add_argument(
+        '--dpi',
+        help='resolutions at which to generate synthetic scans',
+        nargs='+',
+        default=[300, 600, 1200],
+        type=int
+    )
+    subcommand.add_argument(
+        '--bars',
+        help='number of rectangular bars in each synthetic scan',
+        default=8,
+        type=int
+    )
+    subcommand.add_argument(
+        '--coins',
+        help='number of round coins in each synthetic scan',
+        default=8,
+        type=int
+    )
+    subcommand.add_argument(
+        '--repeat',
+        help='number of runs at each resolution',
+        default=3,
+        type=int
+    )
+    subcommand.add_argument(
+        '--seed',
+        help='seed of the first synthetic scan, incremented for every run',
+        default=0,
+        type=int
+    )
+    subcommand.add_argument(
+        '--detection-scale',
+        help='fraction of the scan resolution at which to detect coins/bars',
+        default=config.defaults.detection_scale,
+        type=float
+    )
+    subcommand.add_argument(
+        '--low-memory',
+        help='memory-map the scans and detect within the memory budget, as '
+             'the pipeline does in low-memory mode',
+        action='store_true',
+        default=config.defaults.low_memory,
+    )
+    subcommand.add_argument(
+        '-o', '--output',
+        help='file to append the JSON lines results to, "-" for stdout',
+        default='-',
+    )
+    subcommand.set_defaults(func=main)
+
+
+def main(args):
+    import multiprocessing
+
+    commit = current_commit()
+    runs = [
+        dict(dpi=dpi, bars=args.bars, coins=args.coins, seed=args.seed + i,
+             detection_scale=args.detection_scale,
+             low_memory=args.low_memory)
+        for dpi in args.dpi
+        for i in range(args.repeat)
+    ]
+
+    with contextlib.ExitStack() as stack:
+        if args.output == '-':
+            output = sys.stdout
+        else:
+            output = stack.enter_context(open(args.output, 'a'))
+
+        directory = stack.enter_context(tempfile.TemporaryDirectory())
+        # every run gets a fresh process, so that its peak RSS is its own, and
+        #  its scans are generated beforehand in another fresh process, so
+        #  that the generator's memory is not counted as the pipeline's.
+        # Workers are forked from a fork server rather than from this
+        #  process, whose threads may hold locks at the time of the fork.
+        pool = stack.enter_context(
+            multiprocessing.get_context('forkserver').Pool(
+                processes=1, maxtasksperchild=1))
+        for parameters in runs:
+            parameters['directory'] = directory
+            parameters['ground_truth'] = pool.apply(write_scans, (parameters,))
+            result = pool.apply(run, (parameters,))
+            for side in ('obverse', 'reverse'):
+                scan_path(parameters, side).unlink()
+
+            result['commit'] = commit
+            output.write(json.dumps(result, sort_keys=True) + '\n')
+            output.flush()
+            logger.info('%d dpi: %.3fs, %.0f%% paired correctly',
+                        result['dpi'], result['total_seconds'],
+                        100 * result['pairing_accuracy'])
+
+
+def write_scans(parameters):
+    '''Generate the synthetic scans of a run into its directory, returning
+    their ground truth'''
+    import cv2
+    from .. import synthetic
+
+    pair = synthetic.generate(dpi=parameters['dpi'],
+                              bars=parameters['bars'],
+                              coins=parameters['coins'],
+                              seed=parameters['seed'])
+    for side, pixels in (('obverse', pair.obverse),
+                         ('reverse', pair.reverse)):
+        # uncompressed, as scanimage writes them
+        cv2.imwrite(str(scan_path(parameters, side)), pixels,
+                    [cv2.IMWRITE_TIFF_COMPRESSION, 1])
+
+    return pair.ground_truth()
+
+
+def scan_path(parameters, side):
+    return pathlib.Path(parameters['directory']) / '{0}-{1}-{2}.tiff'.format(
+        parameters['dpi'], parameters['seed'], side)
+
+
+def run(parameters):
+    # the pipeline is only imported inside the worker process that runs it
+    from .. import cache
+    from .. import instrumentation
+    from .. import pairing
+    from .. import splitter
+
+    # SciPy is imported lazily, on first use, and would otherwise be timed
+    #  as part of pairing
+    pairing.scipy_solver()
+    # the reverse of a synthetic pair is the whole tray flipped over, and
+    #  nothing is fingerprinted that another run could match
+    config.defaults.pairing_mirror = 'horizontal'
+    config.defaults.fingerprint_index = None
+
+    dpi = parameters['dpi']
+    detection_scale = parameters['detection_scale']
+    low_memory = parameters['low_memory']
+    pair = parameters['ground_truth']
+
+    with tempfile.TemporaryDirectory() as directory:
+        # the stages are timed by the pipeline's own instrumentation
+        traces = pathlib.Path(directory) / 'traces'
+        instrumentation.enable(traces)
+        obverse, reverse = (
+            splitter.extract_ingots(scan_path(parameters, side),
+                                    detection_scale=detection_scale,
+                                    archival_stages=(),
+                                    low_memory=low_memory)
+            for side in ('obverse', 'reverse'))
+        splitter.merge_pair(obverse, reverse, output_directory=directory,
+                            save_crops=False)
+        timings, encoded_bytes = stage_seconds(traces)
+
+    pairs = obverse.pair(reverse, mirror=config.defaults.pairing_mirror)
+    total = sum(timings.values())
+    megapixels = 2 * pair.shape[0] * pair.shape[1] / 1e6
+    return {
+        'timestamp': datetime.datetime.now().isoformat(),
+        'dpi': dpi,
+        'seed': parameters['seed'],
+        'detection_scale': detection_scale,
+        'low_memory': low_memory,
+        'config': cache.detection_parameters(detection_scale,
+                                             low_memory=low_memory),
+        'objects': len(pair.objects),
+        'detected': [len(obverse), len(reverse)],
+        'paired': len(pairs),
+        'megapixels': megapixels,
+        'stage_seconds': timings,
+        'total_seconds': total,
+        'megapixels_per_second': megapixels / total,
+        'objects_per_second': 2 * len(pair.objects) / total,
+        'encoded_bytes': encoded_bytes,
+        'peak_rss_bytes': peak_rss(),
+        'pairing_accuracy': pairing_accuracy(pair, obverse, reverse, pairs),
+    }
+
+
+def stage_seconds(traces):
+    '''Seconds spent in each stage of the pipeline over every trace written
+    into the `traces` directory, and the bytes of output written'''
+    timings = collections.OrderedDict()
+    written = 0
+    for path in sorted(traces.glob('*.trace.jsonl')):
+        with open(str(path)) as f:
+            for record in map(json.loads, f):
+                if record['stage'] == 'total':
+                    continue
+
+                timings[record['stage']] = timings.get(record['stage'], 0.0) \
+                    + record['seconds']
+                written += record.get('bytes_written', 0)
+
+    return timings, written
+
+
+def pairing_accuracy(pair, obverse, reverse, pairs):
+    '''Fraction of the synthetic objects whose obverse and reverse crops were
+    paired with each other'''
+    from .. import pairing
+
+    if not pair.objects:
+        return 1.0
+
+    # which synthetic object each detected box is nearest to
+    obverse_truth = pairing.distance_matrix(
+        obverse.centroids(), pair.centroids('obverse')).argmin(axis=1)
+    reverse_truth = pairing.distance_matrix(
+        reverse.centroids(), pair.centroids('reverse')).argmin(axis=1)
+
+    correct = sum(obverse_truth[i] == reverse_truth[j] for i, j in pairs)
+    return correct / len(pair.objects)
+
+
+def peak_rss():
+    maximum = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return maximum if sys.platform == 'darwin' else maximum * 1024
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=str(pathlib.Path(__file__).resolve().parent),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
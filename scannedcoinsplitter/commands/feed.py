@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Scan page after page through a document feeder, pairing consecutive
+pages as obverse and reverse, and split every page while the next one is
+being scanned"""
+import concurrent.futures
+import datetime
+import logging
+import pathlib
+
+import config
+from . import add_pipeline_arguments
+from . import extraction_options
+
+logger = logging.getLogger(__name__)
+
+
+def cli(subcommand):
+    '''Add command-line arguments to this subcommand
+    '''
+    subcommand.add_argument(
+        '-d', '--device',
+        help='SANE device URI of the scanner',
+        default=config.defaults.scanner,
+    )
+    subcommand.add_argument(
+        '--source',
+        help='scan source of the document feeder, as listed by '
+             '`scanimage --help --device-name DEVICE`, e.g. ADF',
+    )
+    subcommand.add_argument(
+        '--resolution',
+        help='resolution at which to scan, in dpi',
+        default=config.defaults.resolution,
+        type=int
+    )
+    subcommand.add_argument(
+        '--pages',
+        help='number of pages to scan, by default until the feeder is empty',
+        type=int
+    )
+    subcommand.add_argument(
+        '-o', '--output-directory',
+        help='directory into which to output scans',
+        default=config.defaults.output_directory,
+        type=pathlib.Path
+    )
+    subcommand.add_argument(
+        '-n', '--image-name',
+        help='name to give scans',
+        default=datetime.datetime.today().strftime('%Y-%m-%d')
+    )
+    subcommand.add_argument(
+        '-j', '--jobs',
+        help='number of pages to split at the same time',
+        default=2,
+        type=int
+    )
+    add_pipeline_arguments(subcommand)
+    subcommand.set_defaults(func=main)
+
+
+def main(args):
+    from .. import station
+
+    scanner = station.Scanner(device=args.device,
+                              resolution=args.resolution,
+                              output_directory=args.output_directory)
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=args.jobs,
+            thread_name_prefix='split-worker') as executor:
+        station.FeederSession(scanner=scanner,
+                              executor=executor,
+                              image_name=args.image_name,
+                              save_crops=args.save_crops,
+                              **extraction_options(args),
+                              pages=args.pages,
+                              source=args.source).run()
+
+    if scanner.error is not None:
+        logger.error('%s failed: %s', scanner, scanner.error)
+
+    if scanner.failed:
+        logger.error('%d scan pairs failed: %s', len(scanner.failed),
+                     ', '.join(scanner.failed))
+
+    logger.info('%d merged images created', len(scanner.merged))
+    # like a batch, feeding fails when the scanner or any pair did
+    if scanner.error is not None or scanner.failed:
+        return 1
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Find the fingerprinted images that given images look like, e.g. to tell
+whether a bar is already in the inventory, and optionally fingerprint the
+given images too"""
+
+import logging
+import pathlib
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# extensions of the formats output images may be written in
+IMAGE_EXTENSIONS = ('.png', '.webp', '.jpg', '.tiff')
+
+
+def cli(subcommand):
+    '''Add command-line arguments to this subcommand
+    '''
+    subcommand.add_argument(
+        'images',
+        help='images to look up, or directories to look up every image in',
+        nargs='+',
+        type=pathlib.Path
+    )
+    subcommand.add_argument(
+        '--add',
+        help='fingerprint the images after looking them up, named after '
+             'their filenames, and forget those no longer on disk',
+        action='store_true',
+    )
+    subcommand.add_argument(
+        '--kind',
+        help='only match images of this kind',
+        choices=('merged', 'crop'),
+    )
+    subcommand.add_argument(
+        '-d', '--distance',
+        help='bits the hashes of two images may differ by for them to match',
+        default=config.defaults.duplicate_distance,
+        type=int
+    )
+    subcommand.add_argument(
+        '--index',
+        help='fingerprint database',
+        default=config.defaults.fingerprint_index,
+        type=pathlib.Path
+    )
+    subcommand.set_defaults(func=main)
+
+
+def main(args):
+    import cv2
+    from .. import fingerprints
+
+    if args.index is None:
+        logger.error('Fingerprinting is disabled in the configuration; set '
+                     'fingerprint_index, or give --index')
+        return 1
+
+    index = fingerprints.open_index(args.index)
+    for path in images_in(args.images):
+        image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if image is None:
+            logger.error('Unable to read %s', path)
+            continue
+
+        path = path.resolve()
+        fingerprint = fingerprints.fingerprint(image)
+        for match in index.matches(fingerprint, max_distance=args.distance,
+                                   kind=args.kind, exclude={str(path)}):
+            print('{0}\t{1}\t{2}\t{3}'.format(path, match.distance,
+                                              match.name, match.path))
+
+        if args.add:
+            kind = 'merged' if path.parent.name == \
+                config.defaults.merged_output_directory else 'crop'
+            index.add(path, kind, fingerprint)
+
+    if args.add:
+        forgotten = index.prune()
+        logger.info('%d fingerprints indexed, %d of missing images '
+                    'forgotten', len(index), forgotten)
+
+
+def images_in(paths):
+    for path in paths:
+        if path.is_dir():
+            yield from sorted(
+                image for image in path.glob('**/*')
+                if image.suffix in IMAGE_EXTENSIONS)
+
+        else:
+            yield path
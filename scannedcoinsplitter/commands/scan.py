@@ -2,18 +2,18 @@
 # -*- coding: utf-8 -*-
 """Split the given images into individual coins/bars and merge corresponding
 obverse and reverse images"""
+import concurrent.futures
 import datetime
 import logging
-import os
-import subprocess
 import pathlib
 import termcolor
 
 logger = logging.getLogger(__name__)
 
 import config
-from .. import splitter
-from ..utilities import exceptions
+from .. import naming
+from . import add_pipeline_arguments
+from . import extraction_options
 
 
 def cli(subcommand):
@@ -30,88 +30,71 @@ def cli(subcommand):
         help='name to give scans',
         default=datetime.datetime.today().strftime('%Y-%m-%d')
     )
+    add_pipeline_arguments(subcommand)
     subcommand.set_defaults(func=main)
 
 
 def main(args):
+    # OpenCV and NumPy are only imported once a scan is actually split
+    from .. import manifest
+    from .. import splitter
+
     # create output directory if it doesn't exist
     args.output_directory.mkdir(parents=True, exist_ok=True)
 
-    cropped_output_directory = args.output_directory / config.defaults.cropped_output_directory
-    cropped_output_directory.mkdir(parents=True, exist_ok=True)
-
-    merged_output_directory = args.output_directory / config.defaults.merged_output_directory
-    merged_output_directory.mkdir(parents=True, exist_ok=True)
-
-    # find a unique name for this image
-    filename_template = '{name} - {number_field} - obverse.tiff'.format(
-        name=args.image_name,
-        number_field='{index}',
-    )
-    obverse_image_file_path = generate_unique_filename(
+    # claim a unique name for this image
+    obverse_image_file_path = naming.claim_scan_path(
         directory=args.output_directory,
-        filename_template=filename_template,
-        field_name='index'
-    )
-
-    # begin scan of obverse image
-    obverse = start_scan(path=obverse_image_file_path)
-
-    # wait for the user to flip the coins/bars on the scanner
-    input('Press Enter after flipping coins/bars on scanner... ')
-
-    reverse_image_file_path = args.output_directory/obverse.name.replace(
-        'obverse', 'reverse'
-    )
-    reverse = start_scan(path=reverse_image_file_path)
-
-    obverse = splitter.extract_ingots(raw_scanned_image_path=obverse,
-                                      output_directory=cropped_output_directory)
-    reverse = splitter.extract_ingots(raw_scanned_image_path=reverse,
-                                      output_directory=cropped_output_directory)
-
-    merged_images = splitter.merge(
-        obverse, reverse,
-        merged_output_directory
+        name=args.image_name,
     )
-    logger.info("{0} merged images created".format(len(merged_images)))
+    session = manifest.Manifest(obverse_path=obverse_image_file_path,
+                                output_directory=args.output_directory)
+
+    options = extraction_options(args)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        # begin scan of obverse image, and split it while the coins/bars are
+        #  being flipped and the reverse is being scanned
+        with session.timed('obverse_scan'):
+            obverse = start_scan(path=obverse_image_file_path)
+        obverse_split = executor.submit(
+            session.timer('obverse_split', splitter.extract_ingots),
+            raw_scanned_image=obverse, **options)
+
+        # wait for the user to flip the coins/bars on the scanner
+        input('Press Enter after flipping coins/bars on scanner... ')
+
+        reverse_image_file_path = naming.reverse_of(obverse.path)
+        with session.timed('reverse_scan'):
+            reverse = start_scan(path=reverse_image_file_path)
+        reverse_split = executor.submit(
+            session.timer('reverse_split', splitter.extract_ingots),
+            raw_scanned_image=reverse, **options)
+
+        obverse_split = obverse_split.result()
+        reverse_split = reverse_split.result()
+
+    with session.timed('merge'):
+        merged_images, crops, duplicates = splitter.merge_pair(
+            obverse=obverse_split,
+            reverse=reverse_split,
+            output_directory=args.output_directory,
+            save_crops=args.save_crops,
+        )
+    session.record(obverse_split, reverse_split, merged_images, crops,
+                   duplicates)
+    session.save()
+    logger.info("%d merged images created", len(merged_images))
     logger.info("\n".join(merged_images))
 
 
 def start_scan(path):
-    logger.info('Beginning scan')
-    with open(str(path), 'w') as scanned_file:
-        return_code = subprocess.call([
-            "scanimage",
-            "--device-name", config.defaults.scanner,
-            # "--device", config.defaults.scanner,
-            "--resolution", "300",
-            "--format=tiff",
-        ], stdout=scanned_file)
-
-    if return_code != 0:
-        os.remove(path)
-        raise exceptions.MissingScannerException(config.defaults.scanner)
+    from .. import acquisition
 
-    logger.info('Scanning complete: {file}'.format(
-        file=termcolor.colored(path, 'green', attrs=['bold'])
-    ))
-
-    return path
-
-
-def generate_unique_filename(directory, filename_template, field_name):
-    index = 0
-    while True: # increment until a file of the given template is not found
-        filename = filename_template.format(**{field_name: index})
+    logger.info('Beginning scan')
+    scan = acquisition.stream_scan(path=path)
 
-        if not (directory / filename).is_file():
-            break
+    logger.info('Scanning complete: %s',
+                termcolor.colored(path, 'green', attrs=['bold']))
 
-        else:
-            index += 1
+    return scan
 
-    logger.debug('Unique filename found: {filename}'.format(
-        filename=termcolor.colored(filename, 'cyan')
-    ))
-    return directory/filename
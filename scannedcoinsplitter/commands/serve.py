@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Keep a warm pool of split workers running, accepting split jobs over a
+Unix domain socket"""
+
+import logging
+import pathlib
+
+import config
+from . import add_pipeline_arguments
+from . import pipeline_options
+
+logger = logging.getLogger(__name__)
+
+
+def cli(subcommand):
+    '''Add command-line arguments to this subcommand
+    '''
+    subcommand.add_argument(
+        '-s', '--socket',
+        help='Unix domain socket on which to accept jobs',
+        default=config.defaults.service_socket,
+        type=pathlib.Path
+    )
+    subcommand.add_argument(
+        '-j', '--workers',
+        help='number of scan pairs to split at the same time',
+        default=config.defaults.service_workers,
+        type=int
+    )
+    subcommand.add_argument(
+        '--queue-size',
+        help='number of jobs to hold waiting for a worker before clients '
+             'are turned away as busy',
+        default=config.defaults.service_queue_size,
+        type=int
+    )
+    subcommand.add_argument(
+        '-o', '--output-directory',
+        help='directory into which to output split and merged images, for '
+             'jobs that do not name one',
+        default=config.defaults.output_directory,
+        type=pathlib.Path
+    )
+    add_pipeline_arguments(subcommand)
+    subcommand.set_defaults(func=main)
+
+
+def main(args):
+    from .. import service
+
+    try:
+        service.serve(
+            socket_path=args.socket,
+            workers=args.workers,
+            queue_size=args.queue_size,
+            # options jobs do not give are taken from the command line
+            defaults=dict(pipeline_options(args),
+                          output_directory=args.output_directory),
+        )
+    except FileExistsError as e:
+        logger.error(e)
+        return 1
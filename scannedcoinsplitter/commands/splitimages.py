@@ -7,7 +7,8 @@ import logging
 import pathlib
 
 import config
-from .. import splitter
+from . import add_pipeline_arguments
+from . import pipeline_options
 
 logger = logging.getLogger(__name__)
 
@@ -29,25 +30,19 @@ def cli(subcommand):
         default=config.defaults.output_directory,
         type=pathlib.Path
     )
+    add_pipeline_arguments(subcommand)
     subcommand.set_defaults(func=main)
 
 
 def main(args):
-    cropped_output_directory = args.output_directory / config.defaults.cropped_output_directory
-    cropped_output_directory.mkdir(parents=True, exist_ok=True)
-
-    merged_output_directory = args.output_directory / config.defaults.merged_output_directory
-    merged_output_directory.mkdir(parents=True, exist_ok=True)
-
-    # open obverse and reverse images
-    obverse = splitter.extract_ingots(raw_scanned_image_path=args.obverse_image,
-                                      output_directory=cropped_output_directory)
-    reverse = splitter.extract_ingots(raw_scanned_image_path=args.reverse_image,
-                                      output_directory=cropped_output_directory)
-
-    merged_images = splitter.merge(
-        obverse, reverse,
-        merged_output_directory
+    # OpenCV and NumPy are only imported once a scan is actually split
+    from .. import splitter
+
+    merged_images = splitter.split_pair(
+        obverse=args.obverse_image,
+        reverse=args.reverse_image,
+        output_directory=args.output_directory,
+        **pipeline_options(args)
     )
-    logger.info("{0} merged images created".format(len(merged_images)))
+    logger.info("%d merged images created", len(merged_images))
     logger.info("\n".join(merged_images))
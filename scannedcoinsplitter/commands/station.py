@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Scan with several scanners at the same time, splitting and merging the
+scans of every scanner on one shared pool of workers"""
+import concurrent.futures
+import datetime
+import logging
+import pathlib
+
+import config
+from . import add_pipeline_arguments
+from . import extraction_options
+
+logger = logging.getLogger(__name__)
+
+
+def cli(subcommand):
+    '''Add command-line arguments to this subcommand
+    '''
+    subcommand.add_argument(
+        '-d', '--device',
+        help='SANE device URI of a scanner to use, instead of the configured '
+             'scanners; can be given several times',
+        dest='devices',
+        action='append',
+    )
+    subcommand.add_argument(
+        '-o', '--output-directory',
+        help='directory into which to output scans, for scanners not '
+             'configured with their own',
+        default=config.defaults.output_directory,
+        type=pathlib.Path
+    )
+    subcommand.add_argument(
+        '-n', '--image-name',
+        help='name to give scans',
+        default=datetime.datetime.today().strftime('%Y-%m-%d')
+    )
+    subcommand.add_argument(
+        '-r', '--rounds',
+        help='number of obverse/reverse pairs to scan on every scanner',
+        default=1,
+        type=int
+    )
+    subcommand.add_argument(
+        '--pause',
+        help='seconds to wait between scans for coins/bars to be flipped or '
+             'replaced, instead of waiting for Enter to be pressed',
+        type=float
+    )
+    subcommand.add_argument(
+        '-j', '--jobs',
+        help='number of scans to split at the same time, by default two per '
+             'scanner',
+        type=int
+    )
+    add_pipeline_arguments(subcommand)
+    subcommand.set_defaults(func=main)
+
+
+def main(args):
+    from .. import station
+
+    scanners = station.configured_scanners(
+        devices=args.devices, output_directory=args.output_directory)
+
+    # OpenCV releases the GIL, so the scans of every scanner are split on
+    #  threads of this one process
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=args.jobs or 2 * len(scanners),
+            thread_name_prefix='split-worker') as executor:
+        station.Station(scanners=scanners,
+                        executor=executor,
+                        image_name=args.image_name,
+                        rounds=args.rounds,
+                        save_crops=args.save_crops,
+                        pause=args.pause,
+                        **extraction_options(args)).run()
+
+    for scanner in scanners:
+        if scanner.error is not None:
+            logger.error('%s failed: %s', scanner, scanner.error)
+
+        else:
+            logger.info('%s: %d merged images created', scanner,
+                        len(scanner.merged))
+
+        if scanner.failed:
+            logger.error('%s: %d scan pairs failed: %s', scanner,
+                         len(scanner.failed), ', '.join(scanner.failed))
+
+    # like a batch, a station fails when any of its scanners or pairs did
+    if any(scanner.error is not None or scanner.failed
+           for scanner in scanners):
+        return 1
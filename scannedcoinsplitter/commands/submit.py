@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Submit an obverse/reverse scan pair to a running split service, and print
+its JSON response"""
+
+import json
+import logging
+import os
+import pathlib
+import sys
+
+import config
+from .. import naming
+from .. import service
+
+logger = logging.getLogger(__name__)
+
+
+def cli(subcommand):
+    '''Add command-line arguments to this subcommand
+    '''
+    subcommand.add_argument(
+        '-f', '--obverse-image',
+        help='input obverse image',
+        required=True,
+        type=pathlib.Path
+    )
+    subcommand.add_argument(
+        '-b', '--reverse-image',
+        help='input reverse image',
+        required=True,
+        type=pathlib.Path
+    )
+    subcommand.add_argument(
+        '-s', '--socket',
+        help='Unix domain socket of the split service',
+        default=config.defaults.service_socket,
+        type=pathlib.Path
+    )
+    subcommand.add_argument(
+        '-o', '--output-directory',
+        help='directory into which to output split and merged images, '
+             'instead of the service\'s own',
+        type=pathlib.Path
+    )
+    subcommand.add_argument(
+        '--send-images',
+        help='send the contents of the scans rather than their paths, for a '
+             'service that cannot read them',
+        action='store_true',
+    )
+    subcommand.add_argument(
+        '--no-crops',
+        help='do not write the individual split images to disk',
+        dest='save_crops',
+        action='store_false',
+        default=None,
+    )
+    subcommand.add_argument(
+        '--detection-scale',
+        help='fraction of the scan resolution at which to detect coins/bars, '
+             'instead of the service\'s own',
+        type=float
+    )
+    subcommand.add_argument(
+        '--no-cache',
+        help='split scans again even if they are unchanged since they were '
+             'last split',
+        dest='use_cache',
+        action='store_false',
+        default=None,
+    )
+    subcommand.add_argument(
+        '--timeout',
+        help='seconds to wait for the service to respond',
+        type=float
+    )
+    subcommand.set_defaults(func=main)
+
+
+def main(args):
+    request = {'id': os.getpid()}
+    if args.send_images:
+        request.update(
+            name=naming.pair_name(args.obverse_image.name.split('.')[0]),
+            obverse_data=service.encode_image(args.obverse_image),
+            reverse_data=service.encode_image(args.reverse_image),
+        )
+
+    else:
+        request.update(obverse=str(args.obverse_image.resolve()),
+                       reverse=str(args.reverse_image.resolve()))
+
+    for key, value in (('output_directory', args.output_directory),
+                       ('save_crops', args.save_crops),
+                       ('detection_scale', args.detection_scale),
+                       ('use_cache', args.use_cache)):
+        if value is not None:
+            # paths are resolved here, as the service runs elsewhere
+            request[key] = str(value.resolve()) \
+                if isinstance(value, pathlib.Path) else value
+
+    response = service.submit(request, socket_path=args.socket,
+                              timeout=args.timeout)
+    json.dump(response, sys.stdout)
+    sys.stdout.write('\n')
+
+    if 'error' in response:
+        logger.error('Job failed: %s', response['error'])
+        return 1
+
+    else:
+        logger.info('%d merged images created', len(response['merged']))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Watch a directory, splitting and merging obverse/reverse scan pairs as
+they land in it"""
+
+import concurrent.futures
+import functools
+import logging
+import os
+import pathlib
+
+import config
+from .. import instrumentation
+from .. import naming
+from .. import watcher
+from ..utilities import exceptions
+from . import add_pipeline_arguments
+from . import batch
+from . import pipeline_options
+
+logger = logging.getLogger(__name__)
+
+
+def cli(subcommand):
+    '''Add command-line arguments to this subcommand
+    '''
+    subcommand.add_argument(
+        '-i', '--input-directory',
+        help='directory into which "... - N - obverse.tiff" and '
+             '"... - N - reverse.tiff" scans are dropped',
+        required=True,
+        type=pathlib.Path
+    )
+    subcommand.add_argument(
+        '-o', '--output-directory',
+        help='directory into which to output split and merged images',
+        default=config.defaults.output_directory,
+        type=pathlib.Path
+    )
+    subcommand.add_argument(
+        '-j', '--jobs',
+        help='number of scan pairs to process at the same time',
+        default=os.cpu_count(),
+        type=int
+    )
+    subcommand.add_argument(
+        '--settle-time',
+        help='seconds both scans of a pair must stop changing before they '
+             'are split',
+        default=config.defaults.watch_settle_time,
+        type=float
+    )
+    subcommand.add_argument(
+        '--incomplete-timeout',
+        help='seconds a scan may wait for the other side of its pair before '
+             'it is reported',
+        default=config.defaults.watch_incomplete_timeout,
+        type=float
+    )
+    subcommand.add_argument(
+        '--poll',
+        help='poll the directory instead of relying on inotify, e.g. for '
+             'network shares written to by other machines',
+        action='store_true',
+    )
+    add_pipeline_arguments(subcommand)
+    subcommand.set_defaults(func=main)
+
+
+def main(args):
+    progress = watcher.Progress(
+        args.input_directory / config.defaults.watch_progress_filename)
+    tracker = watcher.PairTracker(args.input_directory,
+                                  settle=args.settle_time,
+                                  incomplete_timeout=args.incomplete_timeout,
+                                  progress=progress)
+    poll_interval = config.defaults.watch_poll_interval
+    directory_watcher = watcher.watcher_for(args.input_directory,
+                                            poll_interval=poll_interval,
+                                            polling=args.poll)
+    logger.info('Watching %s for scan pairs', args.input_directory)
+
+    running = {}
+    with batch.worker_logs() as log_records, \
+            concurrent.futures.ProcessPoolExecutor(
+                max_workers=args.jobs,
+                initializer=batch.initialize_worker,
+                initargs=(instrumentation.directory(), log_records)) \
+            as executor:
+        try:
+            while True:
+                for obverse, reverse in tracker.update():
+                    logger.info('Splitting %s',
+                                naming.pair_name(obverse.stem))
+                    future = executor.submit(
+                        batch.process_pair,
+                        obverse=obverse,
+                        reverse=reverse,
+                        output_directory=args.output_directory,
+                        **pipeline_options(args)
+                    )
+                    running[future] = (obverse, reverse)
+
+                for future in [f for f in running if f.done()]:
+                    finish(future, *running.pop(future), progress=progress)
+
+                # without inotify events to wake up on, wait no longer than
+                #  the poll interval for scans to settle or pairs to finish
+                busy = running or tracker.pending()
+                directory_watcher.wait(poll_interval if busy else None)
+
+        except KeyboardInterrupt:
+            logger.info('Stopped watching %s', args.input_directory)
+
+        finally:
+            directory_watcher.close()
+
+
+def finish(future, obverse, reverse, progress):
+    name = naming.pair_name(obverse.stem)
+    try:
+        merged_images = future.result()
+    except exceptions.UnreadableImageException as e:
+        logger.error(e)
+        record = functools.partial(progress.record_failure, error=e.message)
+
+    except Exception as e:
+        # one broken pair never stops the watcher
+        logger.exception('Unable to split %s', name)
+        record = functools.partial(progress.record_failure, error=repr(e))
+
+    else:
+        logger.info('%s: %d merged images created', name,
+                    len(merged_images))
+        record = functools.partial(progress.record, merged=merged_images)
+
+    # a failed pair is retried as soon as either scan is written again
+    try:
+        record(obverse, reverse)
+    except FileNotFoundError:
+        logger.warning('%s was removed while it was being split', name)
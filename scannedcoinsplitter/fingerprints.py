@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Perceptual hashes of crops and merged images, indexed by Hamming distance
+so that an item scanned again, in this session or a past one, is recognized
+without comparing any images"""
+import collections
+import functools
+import logging
+import pathlib
+import sqlite3
+import threading
+
+import cv2
+import numpy
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# side of the downscaled image whose DCT the pHash is taken from, and of the
+#  block of lowest frequencies that make up the hash
+PHASH_SIZE = 32
+PHASH_FREQUENCIES = 8
+
+Fingerprint = collections.namedtuple('Fingerprint', ['dhash', 'phash'])
+Match = collections.namedtuple('Match', ['path', 'kind', 'name', 'distance'])
+
+
+def dct_matrix(size):
+    '''Orthonormal DCT-II matrix, so that D @ X @ D.T is the 2D DCT of X'''
+    k = numpy.arange(size)[:, numpy.newaxis]
+    n = numpy.arange(size)[numpy.newaxis, :]
+    matrix = numpy.cos(numpy.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= numpy.sqrt(2)
+    return (matrix * numpy.sqrt(2 / size)).astype(numpy.float32)
+
+
+# only the rows of the lowest frequencies are ever needed
+DCT = dct_matrix(PHASH_SIZE)[:PHASH_FREQUENCIES]
+
+
+def small_gray(image, width, height):
+    # shrunk before the color conversion, as only a few pixels are kept
+    small = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    return small
+
+
+def to_int(bits):
+    return int.from_bytes(numpy.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def dhash(image):
+    '''64-bit difference hash: whether each pixel of a 9x8 thumbnail is
+    brighter than the one to its left'''
+    small = small_gray(image, 9, 8).astype(numpy.int16)
+    return to_int(small[:, 1:] > small[:, :-1])
+
+
+def phash(image):
+    '''64-bit DCT hash: whether each of the 8x8 lowest frequencies of a 32x32
+    thumbnail is above their median'''
+    small = small_gray(image, PHASH_SIZE, PHASH_SIZE).astype(numpy.float32)
+    frequencies = DCT @ small @ DCT.T
+    # the DC term only measures overall brightness
+    return to_int(frequencies > numpy.median(frequencies.ravel()[1:]))
+
+
+def fingerprint(image):
+    return Fingerprint(dhash=dhash(image), phash=phash(image))
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree(object):
+    '''Hashes arranged by their Hamming distance to each other, so that the
+    hashes near a given one are found while comparing it with only a few of
+    them. Each node is [hash, items, {distance: child}].
+    '''
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+
+            node = child
+
+    def search(self, value, max_distance):
+        '''(distance, item) of every item within `max_distance` of `value`,
+        nearest first'''
+        found = []
+        pending = [] if self.root is None else [self.root]
+        while pending:
+            node = pending.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, item) for item in node[1])
+
+            # by the triangle inequality, nothing further from the node than
+            #  this can be within reach
+            for child_distance, child in node[2].items():
+                if abs(child_distance - distance) <= max_distance:
+                    pending.append(child)
+
+        found.sort()
+        return found
+
+
+class FingerprintIndex(object):
+    '''Fingerprints of crops and merged images in an SQLite database, shared
+    by every process splitting scans. Lookups go through a BK-tree of the
+    pHashes, loaded from the database and topped up with the rows other
+    processes added since.
+    '''
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            path TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            dhash TEXT NOT NULL,
+            phash TEXT NOT NULL
+        );
+    '''
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(self.path), timeout=30,
+                                          check_same_thread=False)
+        with self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.executescript(self.SCHEMA)
+
+        self.tree = BKTree()
+        self.last_rowid = 0
+
+    def refresh(self):
+        rows = self.connection.execute(
+            'SELECT rowid, phash FROM fingerprints WHERE rowid > ? '
+            'ORDER BY rowid', (self.last_rowid,)).fetchall()
+        for rowid, value in rows:
+            self.tree.add(int(value, 16), rowid)
+            self.last_rowid = rowid
+
+    def add(self, path, kind, fingerprint, name=None):
+        '''Index the fingerprint of an image, replacing any previous one of
+        the same path. Paths are stored resolved, so that the index means the
+        same from any working directory.'''
+        path = str(pathlib.Path(path).resolve())
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)',
+                (path, kind, name or pathlib.Path(path).stem,
+                 '{0:016x}'.format(fingerprint.dhash),
+                 '{0:016x}'.format(fingerprint.phash)))
+
+    def matches(self, fingerprint, max_distance=None, kind=None, exclude=None):
+        '''Indexed images whose pHash and dHash are both within
+        `max_distance` bits (config.defaults.duplicate_distance if not given)
+        of `fingerprint`, nearest first. Images of `exclude` paths are left
+        out.'''
+        if max_distance is None:
+            max_distance = config.defaults.duplicate_distance
+
+        if exclude is not None:
+            exclude = {str(pathlib.Path(path).resolve()) for path in exclude}
+
+        with self.lock:
+            self.refresh()
+            # replaced rows are still in the tree, but no longer in the table
+            candidates = {
+                rowid: distance for distance, rowid
+                in self.tree.search(fingerprint.phash, max_distance)}
+            rows = self.connection.execute(
+                'SELECT rowid, path, kind, name, dhash FROM fingerprints '
+                'WHERE rowid IN ({0})'.format(','.join('?' * len(candidates))),
+                list(candidates)).fetchall() if candidates else []
+
+        found = []
+        for rowid, path, row_kind, name, value in rows:
+            if kind is not None and row_kind != kind:
+                continue
+
+            if exclude is not None and path in exclude:
+                continue
+
+            if hamming(int(value, 16), fingerprint.dhash) > max_distance:
+                continue
+
+            found.append(Match(path=path, kind=row_kind, name=name,
+                               distance=candidates[rowid]))
+
+        found.sort(key=lambda match: (match.distance, match.path))
+        return found
+
+    def prune(self):
+        '''Forget the images that no longer exist, returning how many'''
+        with self.lock:
+            paths = [path for (path,) in self.connection.execute(
+                'SELECT path FROM fingerprints')]
+            # paths indexed relative to an unknown working directory cannot
+            #  be told apart from missing ones, so they are left alone
+            missing = [(path,) for path in paths
+                       if pathlib.Path(path).is_absolute()
+                       and not pathlib.Path(path).resolve().is_file()]
+            with self.connection:
+                self.connection.executemany(
+                    'DELETE FROM fingerprints WHERE path = ?', missing)
+
+        return len(missing)
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM fingerprints').fetchone()[0]
+
+
+@functools.lru_cache()
+def open_index(path):
+    '''The FingerprintIndex of `path`, opened once per process'''
+    return FingerprintIndex(path)
+
+
+def from_config():
+    '''The configured FingerprintIndex, or None if fingerprinting is off'''
+    if config.defaults.fingerprint_index is None:
+        return None
+
+    return open_index(pathlib.Path(config.defaults.fingerprint_index))
+
+
+def index_pair(index, obverse, reverse, merged, fingerprints):
+    '''Flag the merged images of a pair that look like images indexed
+    before, then index them and the pair's written crops. Returns the
+    matches of each merged image that has any.'''
+    duplicates = {}
+    for path, merged_fingerprint in zip(merged, fingerprints):
+        found = index.matches(merged_fingerprint, kind='merged',
+                              exclude={path})
+        if found:
+            duplicates[path] = [match._asdict() for match in found]
+            logger.warning('%s looks like %s', path, ', '.join(
+                '{0} ({1} bits apart)'.format(match.path, match.distance)
+                for match in found))
+
+        index.add(path, 'merged', merged_fingerprint)
+
+    for split in (obverse, reverse):
+        for image in split:
+            if image.url is not None:
+                index.add(image.url, 'crop', image.fingerprint())
+
+    return duplicates
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Per-stage timings and counters of the splitting pipeline, exported as a
+JSON-lines trace per scan. Disabled until enable() is called: until then,
+every stage() is a shared do-nothing context manager."""
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_directory = None
+_current = threading.local()
+
+
+def enable(directory):
+    '''Write a trace of every scan processed from now on into `directory`'''
+    global _directory
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    _directory = directory
+
+
+def directory():
+    return _directory
+
+
+class NullStage(object):
+    '''Stand-in for Stage and Trace while instrumentation is disabled'''
+    __slots__ = ()
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def count(self, **counters):
+        pass
+
+    def rename(self, name):
+        pass
+
+
+NULL = NullStage()
+
+
+class Trace(object):
+    '''Records of the stages run for one scan (or scan pair) on the current
+    thread, appended to `{name}.trace.jsonl` when the trace is closed'''
+    enabled = True
+
+    def __init__(self, name, directory):
+        self.name = name
+        self.directory = directory
+        self.records = []
+
+    def rename(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.parent = getattr(_current, 'trace', None)
+        _current.trace = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _current.trace = self.parent
+        self.records.append({
+            'stage': 'total',
+            'seconds': time.perf_counter() - self.start,
+            'failed': exc_type is not None,
+        })
+
+        path = self.directory / '{0}.trace.jsonl'.format(self.name)
+        with open(str(path), 'a') as f:
+            for record in self.records:
+                record.update(scan=self.name, pid=os.getpid())
+                f.write(json.dumps(record, default=str) + '\n')
+
+        return False
+
+
+class Stage(object):
+    enabled = True
+
+    def __init__(self, trace, name, counters):
+        self.trace = trace
+        self.record = dict(stage=name, **counters)
+
+    def count(self, **counters):
+        self.record.update(counters)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.record['seconds'] = time.perf_counter() - self.start
+        self.trace.records.append(self.record)
+        return False
+
+
+def scan(name):
+    '''Trace the stages run on this thread until the returned context exits'''
+    if _directory is None:
+        return NULL
+
+    return Trace(name=name, directory=_directory)
+
+
+def stage(name, **counters):
+    '''Time a stage of the scan currently traced on this thread. Counters can
+    be passed here or added with count() on the returned context.'''
+    trace = getattr(_current, 'trace', None)
+    if trace is None:
+        return NULL
+
+    return Stage(trace=trace, name=name, counters=counters)
+
+
+def shape_of(image):
+    return {'height': image.shape[0], 'width': image.shape[1]}
+
+
+def size_of(path):
+    try:
+        return os.path.getsize(str(path))
+    except OSError:
+        return None
+
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+
+@contextlib.contextmanager
+def profiler(path, kind='cprofile'):
+    '''Profile the enclosed code into `path`: cProfile stats loadable with
+    pstats/snakeviz, or a pyinstrument HTML report'''
+    if path is None:
+        yield
+        return
+
+    if kind == 'pyinstrument':
+        import pyinstrument
+        profile = pyinstrument.Profiler()
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            with open(str(path), 'w') as f:
+                f.write(profile.output_html())
+
+    else:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(str(path))
+
+    logger.info('Profile written to %s', path)
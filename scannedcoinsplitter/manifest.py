@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A JSON manifest of every scanned pair, recording its scans, the boxes
+detected in them, the crops and merged images made from them, and the
+configuration and timings they were made with. Tools downstream can read
+the manifests instead of walking and stat'ing the output directories."""
+import contextlib
+import datetime
+import functools
+import json
+import logging
+import pathlib
+import time
+
+import config
+from . import cache
+from . import naming
+from .utilities import files
+
+logger = logging.getLogger(__name__)
+
+
+class Manifest(object):
+    '''Manifest of the pair whose obverse scan is `obverse_path`, saved as
+    "{pair name}.json" in the manifest directory of `output_directory`'''
+    def __init__(self, obverse_path, output_directory, resolution=None):
+        self.obverse_path = pathlib.Path(obverse_path)
+        self.reverse_path = naming.reverse_of(self.obverse_path)
+        self.name = naming.pair_name(self.obverse_path.name.split('.')[0])
+        self.directory = pathlib.Path(output_directory) \
+            / config.defaults.manifest_directory
+        self.resolution = resolution or config.defaults.resolution
+        self.started = datetime.datetime.now()
+        self.timings = {}
+        self.contents = {}
+
+    def scan_path(self, side):
+        if side == naming.OBVERSE:
+            return self.obverse_path
+
+        return self.reverse_path
+
+    @contextlib.contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = time.perf_counter() - start
+
+    def timer(self, stage, function):
+        '''`function`, recording how long each call of it takes as `stage`'''
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            with self.timed(stage):
+                return function(*args, **kwargs)
+
+        return timed_function
+
+    def record(self, obverse, reverse, merged, crops, duplicates=None):
+        '''Record what was made of the pair's SplitScans'''
+        self.contents.update(
+            boxes={
+                naming.OBVERSE: obverse.boxes.table().tolist(),
+                naming.REVERSE: reverse.boxes.table().tolist(),
+            },
+            merged=merged,
+            crops=crops,
+            duplicates=duplicates or {},
+        )
+
+    def save(self):
+        manifest = {
+            'name': self.name,
+            'started': self.started.isoformat(),
+            'finished': datetime.datetime.now().isoformat(),
+            'scans': {
+                naming.OBVERSE: str(self.obverse_path),
+                naming.REVERSE: str(self.reverse_path),
+            },
+            'config': dict(
+                cache.detection_parameters(config.defaults.detection_scale),
+                resolution=self.resolution,
+                **cache.pairing_parameters(),
+                **cache.output_parameters()),
+            'timings': self.timings,
+        }
+        manifest.update(self.contents)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / '{0}.json'.format(self.name)
+        # a manifest is never read half written
+        with files.atomic_write(path) as f:
+            json.dump(manifest, f, indent=1, default=str)
+
+        logger.debug('Manifest written to %s', path)
+        return path
+
+
+def manifests(output_directory):
+    '''Every manifest saved in `output_directory`, oldest first'''
+    directory = pathlib.Path(output_directory) \
+        / config.defaults.manifest_directory
+    loaded = []
+    for path in directory.glob('*.json'):
+        with open(str(path)) as f:
+            loaded.append(json.load(f))
+
+    loaded.sort(key=lambda manifest: manifest['started'])
+    return loaded
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Naming convention shared by the scan, split and merge stages, i.e.
+
+    {name} - {index} - obverse.tiff
+    {name} - {index} - reverse.tiff
+"""
+import fcntl
+import logging
+import os
+import pathlib
+import re
+
+import termcolor
+
+logger = logging.getLogger(__name__)
+
+OBVERSE = 'obverse'
+REVERSE = 'reverse'
+SEPARATOR = ' - '
+# next index of the pairs named {name}, kept alongside their scans
+COUNTER_FILENAME = '.{name}.index'
+
+
+def scan_filename_template(name, extension='tiff'):
+    return '{name}{sep}{{index}}{sep}{side}.{extension}'.format(
+        name=name,
+        sep=SEPARATOR,
+        side=OBVERSE,
+        extension=extension,
+    )
+
+
+def claim_scan_path(directory, name, extension='tiff'):
+    '''Path of the obverse scan of a new pair named `name` in `directory`,
+    "{name} - {index} - obverse.tiff", with an index no other process gets.
+
+    The next index is kept in a counter file, locked while it is read and
+    incremented, so that no existing scans have to be looked up. The obverse
+    file is then created exclusively, and indices already taken by scans
+    the counter does not know about, e.g. copied in by hand, are skipped.
+    '''
+    directory = pathlib.Path(directory)
+    template = scan_filename_template(name=name, extension=extension)
+    counter_path = directory / COUNTER_FILENAME.format(name=name)
+
+    descriptor = os.open(str(counter_path), os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(descriptor, 'r+') as counter:
+        fcntl.flock(counter, fcntl.LOCK_EX)
+        content = counter.read().strip()
+        index = int(content) if content else next_index(directory, name)
+
+        while True:
+            path = directory / template.format(index=index)
+            try:
+                os.close(os.open(str(path),
+                                 os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+                break
+            except FileExistsError:
+                index += 1
+
+        counter.seek(0)
+        counter.truncate()
+        counter.write(str(index + 1))
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Unique filename found: %s',
+                     termcolor.colored(path.name, 'cyan'))
+    return path
+
+
+def next_index(directory, name):
+    '''Index after the highest of the pairs named `name` in `directory`,
+    found with a single listing of the directory'''
+    pattern = re.compile(r'{0}{1}(\d+){1}'.format(re.escape(name),
+                                                 re.escape(SEPARATOR)))
+    indices = [int(found.group(1)) for found in map(pattern.match,
+                                                     os.listdir(str(directory)))
+               if found is not None]
+    return max(indices) + 1 if indices else 0
+
+
+def reverse_of(obverse_path):
+    '''Path of the reverse scan belonging to the given obverse scan'''
+    return other_side(obverse_path, side=OBVERSE, other=REVERSE)
+
+
+def obverse_of(reverse_path):
+    '''Path of the obverse scan belonging to the given reverse scan'''
+    return other_side(reverse_path, side=REVERSE, other=OBVERSE)
+
+
+def other_side(path, side, other):
+    path = pathlib.Path(path)
+    stem, _, extension = path.name.rpartition('.')
+    head, found, tail = stem.rpartition(side)
+    if not found:
+        raise ValueError('{0} is not named like an {1} scan'.format(
+            path, side))
+
+    return path.with_name('{0}{1}{2}.{3}'.format(
+        head, other, tail, extension))
+
+
+def side_of(path):
+    '''OBVERSE or REVERSE for a scan following the naming convention, None
+    for any other file'''
+    stem = pathlib.Path(path).name.rpartition('.')[0]
+    for side in (OBVERSE, REVERSE):
+        if stem.endswith(SEPARATOR + side):
+            return side
+
+    return None
+
+
+def pair_name(scan_name):
+    '''Strip the obverse/reverse suffix from a scan's name, leaving the part
+    shared by both sides of the pair, e.g. "2018-06-01 - 3"
+    '''
+    for side in (OBVERSE, REVERSE):
+        suffix = SEPARATOR + side
+        if scan_name.endswith(suffix):
+            return scan_name[:-len(suffix)]
+
+    return scan_name
+
+
+def find_pairs(directory):
+    '''Every complete (obverse, reverse) pair of scans in `directory`, sorted
+    by filename. Obverse scans without a reverse are logged and skipped.
+    '''
+    pairs = []
+    for obverse_path in sorted(pathlib.Path(directory).glob(
+            '*{0}{1}.*'.format(SEPARATOR, OBVERSE))):
+        reverse_path = reverse_of(obverse_path)
+        if not reverse_path.is_file():
+            logger.warning('No reverse scan found for %s', obverse_path)
+            continue
+
+        pairs.append((obverse_path, reverse_path))
+
+    return pairs
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Optimal pairing of the coins/bars split from an obverse scan with those
+split from the reverse scan, by the distance between their centroids"""
+import functools
+import logging
+import numpy
+
+logger = logging.getLogger(__name__)
+
+# how the coins/bars are expected to move between the obverse and reverse
+#  scans. 'none': each one is flipped in place. 'horizontal': the whole tray
+#  is flipped left to right, mirroring every position. 'auto': whichever of
+#  the two pairs the scans at the lowest cost.
+MIRROR_MODES = ('none', 'horizontal', 'auto')
+
+
+class Pairing(object):
+    def __init__(self, obverse_indices, reverse_indices, costs,
+                 unmatched_obverse, unmatched_reverse, mirrored):
+        self.obverse_indices = obverse_indices
+        self.reverse_indices = reverse_indices
+        self.costs = costs
+        self.unmatched_obverse = unmatched_obverse
+        self.unmatched_reverse = unmatched_reverse
+        self.mirrored = mirrored
+
+    @property
+    def total_cost(self):
+        return float(self.costs.sum())
+
+    @property
+    def mean_cost(self):
+        return self.total_cost / len(self) if len(self) else 0.0
+
+    def __iter__(self):
+        return zip(self.obverse_indices.tolist(),
+                   self.reverse_indices.tolist())
+
+    def __len__(self):
+        return len(self.costs)
+
+
+def pair(obverse_centroids, reverse_centroids, width=None, mirror='none',
+         max_distance=None):
+    '''Pair obverse and reverse centroids, each an (n, 2) array of x, y
+    coordinates, so that the sum of the distances between paired centroids is
+    minimal. Mirroring requires the `width` of the scans. Pairs further apart
+    than `max_distance` and any surplus centroids of the larger scan are
+    reported as unmatched.
+    '''
+    obverse_centroids = as_centroids(obverse_centroids)
+    reverse_centroids = as_centroids(reverse_centroids)
+
+    if mirror not in MIRROR_MODES:
+        raise ValueError('Unknown mirror mode {0!r}, expected one of {1}'
+                         .format(mirror, ', '.join(MIRROR_MODES)))
+
+    if mirror == 'none':
+        return assign(obverse_centroids, reverse_centroids,
+                      max_distance=max_distance, mirrored=False)
+
+    if width is None:
+        raise ValueError('The scan width is required to model mirroring')
+
+    mirrored = assign(obverse_centroids,
+                      mirror_horizontally(reverse_centroids, width),
+                      max_distance=max_distance, mirrored=True)
+    if mirror == 'horizontal':
+        return mirrored
+
+    unmirrored = assign(obverse_centroids, reverse_centroids,
+                        max_distance=max_distance, mirrored=False)
+    best = min(unmirrored, mirrored,
+               key=lambda p: (-len(p), p.mean_cost))
+    logger.debug('Mean pairing cost %.1f unmirrored, %.1f mirrored',
+                 unmirrored.mean_cost, mirrored.mean_cost)
+    return best
+
+
+def assign(obverse_centroids, reverse_centroids, max_distance, mirrored):
+    distances = distance_matrix(obverse_centroids, reverse_centroids)
+    if distances.size:
+        obverse_indices, reverse_indices = solve(distances)
+    else:
+        obverse_indices = reverse_indices = numpy.empty(0, dtype=numpy.intp)
+
+    costs = distances[obverse_indices, reverse_indices]
+    if max_distance is not None:
+        close_enough = costs <= max_distance
+        obverse_indices = obverse_indices[close_enough]
+        reverse_indices = reverse_indices[close_enough]
+        costs = costs[close_enough]
+
+    return Pairing(
+        obverse_indices=obverse_indices,
+        reverse_indices=reverse_indices,
+        costs=costs,
+        unmatched_obverse=numpy.setdiff1d(
+            numpy.arange(len(obverse_centroids)), obverse_indices),
+        unmatched_reverse=numpy.setdiff1d(
+            numpy.arange(len(reverse_centroids)), reverse_indices),
+        mirrored=mirrored,
+    )
+
+
+def as_centroids(centroids):
+    return numpy.asarray(centroids, dtype=numpy.float64).reshape(-1, 2)
+
+
+def mirror_horizontally(centroids, width):
+    mirrored = centroids.copy()
+    mirrored[:, 0] = width - mirrored[:, 0]
+    return mirrored
+
+
+def distance_matrix(a, b):
+    '''Euclidean distance between every row of `a` and every row of `b`'''
+    difference = a[:, numpy.newaxis, :] - b[numpy.newaxis, :, :]
+    return numpy.hypot(difference[..., 0], difference[..., 1])
+
+
+def solve(cost):
+    '''Minimum cost assignment of the rows to the columns of a (possibly
+    rectangular) cost matrix. Returns the assigned row and column indices,
+    ordered by row.
+    '''
+    linear_sum_assignment = scipy_solver()
+    if linear_sum_assignment is not None:
+        return linear_sum_assignment(cost)
+
+    return hungarian(cost)
+
+
+@functools.lru_cache(maxsize=None)
+def scipy_solver():
+    # imported on first use, as SciPy alone takes longer to import than
+    #  everything else a short invocation of the command line needs
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        return None
+
+    return linear_sum_assignment
+
+
+def hungarian(cost):
+    '''Hungarian algorithm (shortest augmenting paths with potentials),
+    O(n^2 m) with the inner loop over columns vectorized. Used when SciPy is
+    not installed.
+    '''
+    cost = numpy.asarray(cost, dtype=numpy.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+
+    n, m = cost.shape
+    # 1-based rows and columns; column 0 is a virtual column holding the row
+    #  currently being inserted
+    u = numpy.zeros(n + 1)
+    v = numpy.zeros(m + 1)
+    row_of_column = numpy.zeros(m + 1, dtype=numpy.intp)
+    way = numpy.zeros(m + 1, dtype=numpy.intp)
+
+    for row in range(1, n + 1):
+        row_of_column[0] = row
+        column = 0
+        minimum = numpy.full(m + 1, numpy.inf)
+        used = numpy.zeros(m + 1, dtype=bool)
+
+        while True:
+            used[column] = True
+            current_row = row_of_column[column]
+            free = ~used
+            reduced = cost[current_row - 1] - u[current_row] - v[1:]
+
+            improved = free[1:] & (reduced < minimum[1:])
+            minimum[1:][improved] = reduced[improved]
+            way[1:][improved] = column
+
+            candidates = numpy.where(free, minimum, numpy.inf)
+            next_column = int(numpy.argmin(candidates))
+            delta = candidates[next_column]
+
+            u[row_of_column[used]] += delta
+            v[used] -= delta
+            minimum[free] -= delta
+
+            column = next_column
+            if row_of_column[column] == 0:
+                break
+
+        # augment along the path that was found
+        while column:
+            previous_column = way[column]
+            row_of_column[column] = row_of_column[previous_column]
+            column = previous_column
+
+    columns = numpy.nonzero(row_of_column[1:])[0]
+    rows = row_of_column[1:][columns] - 1
+    if transposed:
+        rows, columns = columns, rows
+
+    order = numpy.argsort(rows)
+    return rows[order], columns[order]
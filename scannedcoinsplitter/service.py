@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A long-lived split worker reachable over a Unix domain socket. Clients
+send one JSON request per line, and get one JSON response per line back:
+
+    {"id": 1, "obverse": "/scans/a - 0 - obverse.tiff",
+              "reverse": "/scans/a - 0 - reverse.tiff",
+              "output_directory": "/srv/bullion"}
+
+Scans can be sent inline instead, base64 encoded as "obverse_data" and
+"reverse_data" along with a "name" for the pair. "save_crops",
+"detection_scale" and "use_cache" are optional, as for splitimages.
+
+A response echoes the request's id and holds either the pair's "name", the
+(x, y, w, h, area) "obverse_boxes" and "reverse_boxes", the "merged" and
+"crops" paths and the "duplicates" of merged images already fingerprinted,
+or an "error". Errors with "busy" set mean the job queue stayed full, and the
+request can be retried later.
+"""
+import base64
+import concurrent.futures
+import json
+import logging
+import os
+import pathlib
+import socket
+import socketserver
+import stat
+import threading
+import time
+
+import config
+from . import naming
+from .utilities import exceptions
+
+logger = logging.getLogger(__name__)
+
+
+class SplitService(object):
+    '''Splits scan pairs on a pool of threads that stays warm between jobs.
+    At most `workers` jobs run and `queue_size` more wait; a job that finds
+    no room within `queue_timeout` seconds is turned away as busy.
+    '''
+    def __init__(self, workers=None, queue_size=None, queue_timeout=None,
+                 defaults=None):
+        # the whole pipeline is imported once, up front, rather than per job
+        from . import splitter
+        self.splitter = splitter
+
+        workers = workers or config.defaults.service_workers
+        if queue_size is None:
+            queue_size = config.defaults.service_queue_size
+
+        self.queue_timeout = queue_timeout or config.defaults.service_queue_timeout
+        self.defaults = defaults or {}
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='split-worker')
+
+        self.lock = threading.Lock()
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pending = 0
+        self.completed = 0
+
+    def warm_up(self):
+        '''Run a blank scan through the pipeline on every worker thread, so
+        that OpenCV is initialized before the first job arrives'''
+        import numpy
+        blank = numpy.full((400, 400, 3), 255, numpy.uint8)
+        list(self.executor.map(
+            lambda _: self.splitter.extract_ingots(blank, name='warm-up'),
+            range(self.workers)))
+
+    def handle(self, request):
+        '''Response to one decoded request'''
+        response = {'id': request.get('id')}
+        if request.get('op', 'split') == 'status':
+            with self.lock:
+                response.update(pending=self.pending,
+                                completed=self.completed,
+                                workers=self.workers,
+                                queue_size=self.queue_size)
+            return response
+
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            response.update(error='job queue is full', busy=True)
+            return response
+
+        with self.lock:
+            self.pending += 1
+
+        try:
+            future = self.executor.submit(self.split, request)
+        except RuntimeError:
+            self.release()
+            response.update(error='service is shutting down', busy=True)
+            return response
+
+        future.add_done_callback(lambda _: self.release())
+        try:
+            response.update(future.result())
+        except (exceptions.UnreadableImageException,
+                KeyError, ValueError, TypeError, OSError) as e:
+            logger.error('Job %s failed: %s', response['id'], e)
+            response['error'] = str(e)
+
+        except Exception as e:
+            # a client always gets a response, whatever went wrong
+            logger.exception('Job %s failed', response['id'])
+            response['error'] = '{0}: {1}'.format(type(e).__name__, e)
+
+        return response
+
+    def release(self):
+        with self.lock:
+            self.pending -= 1
+            self.completed += 1
+
+        self.slots.release()
+
+    def split(self, request):
+        start = time.perf_counter()
+        options = dict(self.defaults)
+        options.update((key, request[key])
+                       for key in ('output_directory', 'save_crops',
+                                   'detection_scale', 'use_cache', 'name')
+                       if key in request)
+
+        if 'obverse_data' in request or 'reverse_data' in request:
+            if not options.get('name'):
+                raise ValueError('a name is required for inline scans')
+
+            obverse = base64.b64decode(request['obverse_data'])
+            reverse = base64.b64decode(request['reverse_data'])
+
+        else:
+            obverse = pathlib.Path(request['obverse'])
+            reverse = pathlib.Path(request['reverse'])
+
+        if options.get('output_directory') is None:
+            options['output_directory'] = config.defaults.output_directory
+
+        report = self.splitter.split_pair_report(obverse, reverse, **options)
+        name = naming.pair_name(report['name'])
+        logger.info('%s: %d merged images created', name,
+                    len(report['merged']))
+
+        return {
+            'name': name,
+            'obverse_boxes': report['obverse'],
+            'reverse_boxes': report['reverse'],
+            'merged': report['merged'],
+            'crops': report['crops'],
+            'duplicates': report.get('duplicates', {}),
+            'seconds': time.perf_counter() - start,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    '''Answers the requests of one connection, in order'''
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line.decode('utf-8'))
+                if not isinstance(request, dict):
+                    raise ValueError('request is not a JSON object')
+
+            except ValueError as e:
+                response = {'id': None, 'error': 'malformed request: {0}'
+                            .format(e)}
+
+            else:
+                response = self.server.service.handle(request)
+
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class UnixSplitServer(socketserver.ThreadingMixIn,
+                      socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        super().server_bind()
+        # jobs write wherever they ask to, so only the user running the
+        #  service may submit them. Clients cannot connect before listen().
+        os.chmod(self.server_address, 0o600)
+
+
+def serve(socket_path=None, workers=None, queue_size=None, defaults=None):
+    '''Accept jobs on `socket_path` until interrupted'''
+    socket_path = pathlib.Path(socket_path or config.defaults.service_socket)
+    if is_listening(socket_path):
+        logger.error('A split service is already listening on %s',
+                     socket_path)
+        return
+
+    try:
+        mode = socket_path.lstat().st_mode
+    except FileNotFoundError:
+        pass
+
+    else:
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError('{0} exists and is not a socket'.format(
+                socket_path))
+
+        # left behind by a service that did not shut down cleanly
+        socket_path.unlink()
+
+    service = SplitService(workers=workers, queue_size=queue_size,
+                           defaults=defaults)
+    service.warm_up()
+
+    with UnixSplitServer(str(socket_path), RequestHandler) as server:
+        server.service = service
+        logger.info('Split service listening on %s with %d workers',
+                    socket_path, service.workers)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info('Split service shutting down')
+        finally:
+            service.shutdown()
+            socket_path.unlink()
+
+
+def is_listening(socket_path):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(socket_path))
+    except OSError:
+        return False
+
+    return True
+
+
+def submit(request, socket_path=None, timeout=None):
+    '''Send one request to the split service and wait for its response'''
+    socket_path = socket_path or config.defaults.service_socket
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(str(socket_path))
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        raise exceptions.ServiceUnavailableException(socket_path)
+
+    with client, client.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+        return json.loads(stream.readline().decode('utf-8'))
+
+
+def encode_image(path):
+    '''Contents of an image file, as sent inline to the split service'''
+    with open(str(path), 'rb') as f:
+        return base64.b64encode(f.read()).decode('ascii')
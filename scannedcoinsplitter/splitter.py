@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import concurrent.futures
 import logging
+import math
+import os
+import pathlib
 import cv2
 import numpy
 
@@ -8,111 +12,461 @@ logger = logging.getLogger(__name__)
 
 import config
 from .utilities.image import archive
+from .utilities.image import boxes
 from .utilities.image import crop
+from .utilities.image import mapped
+from .utilities.image import output
+from .utilities.image import source
+from . import cache as resultcache
+from . import fingerprints
+from . import instrumentation
+from . import naming
 from . import utilities
+from .utilities import exceptions
 
 
-def extract_ingots(raw_scanned_image_path, output_directory):
-    raw_scanned_image = cv2.imread(str(raw_scanned_image_path))
-    archiver = archive.IntermediateImageArchiver(
-        original_image_path=raw_scanned_image_path,
-        archival_directory=config.defaults.intermediate_archival_directory
-    )
+def extract_ingots(raw_scanned_image, name=None, detection_scale=None,
+                   archival_stages=None, cache=None, low_memory=None):
+    '''Detect and crop every coin/bar in a scan. `raw_scanned_image` may be a
+    path to the scan, its encoded bytes, an already decoded numpy array, or a
+    ScannedImage. The scan is decoded at most once, and the returned SplitScan
+    holds views into it; merge_pair() writes the crops to disk.
+
+    Detection runs on a copy of the scan shrunk by `detection_scale`
+    (config.defaults.detection_scale if not given), and the bounding boxes are
+    scaled back up to crop from the full resolution scan.
+
+    Intermediate images are only archived for the stages named in
+    `archival_stages` (config.defaults.intermediate_archival_stages if not
+    given), and are written on a background thread.
+
+    With a ResultCache given, the boxes detected in a scan are remembered,
+    and detection is skipped for a scan seen before with the same settings.
+
+    In `low_memory` mode (config.defaults.low_memory if not given), a path
+    to an uncompressed TIFF or PNM scan is memory-mapped instead of decoded,
+    and detection runs on a level reduced at least far enough to fit within
+    config.defaults.memory_budget. Its crops are then read from the file one
+    at a time, as they are merged or written, so no more of them are held
+    at once than the output writer queues.
+    '''
+    if detection_scale is None:
+        detection_scale = config.defaults.detection_scale
+
+    if low_memory is None:
+        low_memory = config.defaults.low_memory
+
+    if archival_stages is None:
+        archival_stages = config.defaults.intermediate_archival_stages
+
+    if not 0 < detection_scale <= 1:
+        raise ValueError('Detection scale must be in (0, 1], not {0}'.format(
+            detection_scale))
+
+    with instrumentation.scan(name or 'scan') as trace:
+        cache_key = None
+        cached = None
+        if cache is not None:
+            cache_key = cache.key('boxes',
+                                  cache.content_hash(raw_scanned_image),
+                                  resultcache.detection_parameters(
+                                      detection_scale, low_memory=low_memory))
+            cached = cache.get(cache_key)
+
+        with instrumentation.stage('decode') as stage:
+            scan = load_scan(raw_scanned_image, name=name,
+                             low_memory=low_memory)
+            if stage.enabled:
+                stage.count(bytes_read=encoded_size(raw_scanned_image),
+                            **instrumentation.shape_of(scan))
+        trace.rename(scan.name)
+
+        if cached is not None:
+            with instrumentation.stage('cached_boxes'):
+                ingots = boxes.BoxSet.from_table(cached['boxes'])
+
+        else:
+            archiver = archive.IntermediateImageArchiver(
+                original_image_name=scan.name,
+                archival_directory=config.defaults.intermediate_archival_directory,
+                stages=archival_stages,
+                preview_scale=config.defaults.intermediate_archival_preview_scale,
+            )
+            ingots = detect(scan, detection_scale=detection_scale,
+                            archiver=archiver)
+
+            if cache is not None:
+                cache.put(cache_key, {'boxes': ingots.table().tolist()})
+
+        cropper = crop.ImageCropper(source=scan)
+        split = crop.SplitScan(name=scan.name,
+                               boxes=ingots,
+                               images=cropper.cropAll(ingots),
+                               width=scan.shape[1])
+
+    logger.info("Number of detected objects: %d", len(split))
+
+    return split
+
+
+def load_scan(raw_scanned_image, name=None, low_memory=False):
+    '''A ScannedImage, or in low memory mode a MappedScan for uncompressed
+    scan files that can be mapped'''
+    if low_memory and isinstance(raw_scanned_image, (str, os.PathLike)):
+        try:
+            return mapped.MappedScan.open(raw_scanned_image, name=name)
+        except exceptions.UnmappableImageException as e:
+            logger.warning('%s, decoding it instead', e.message)
+
+    return source.ScannedImage.load(raw_scanned_image, name=name)
+
 
+def encoded_size(raw_scanned_image):
+    '''Bytes read to decode a scan, if it was decoded from a file or bytes'''
+    if isinstance(raw_scanned_image, (bytes, bytearray)):
+        return len(raw_scanned_image)
+
+    if isinstance(raw_scanned_image, memoryview):
+        return raw_scanned_image.nbytes
+
+    if isinstance(raw_scanned_image, (str, pathlib.Path)):
+        return instrumentation.size_of(raw_scanned_image)
+
+    return None
+
+
+def detect(scan, detection_scale, archiver):
+    '''Bounding boxes of the coins/bars in a ScannedImage, in full resolution
+    scan coordinates'''
+    if isinstance(scan, mapped.MappedScan):
+        # the reduced level is built by a whole factor, large enough for
+        #  detection to stay within the memory budget
+        detection_scale = 1 / mapped.reduction_factor(
+            scan.shape, detection_scale, config.defaults.memory_budget)
+
+    with instrumentation.stage('gray') as stage:
+        gray_scanned_image = grayscale(scan, detection_scale)
+        stage.count(detection_scale=detection_scale)
+    archiver.archive_image(opencv_image=gray_scanned_image, image_name='gray')
+
+    with instrumentation.stage('threshold') as stage:
+        if config.defaults.thresholding == 'adaptive':
+            threshold = adaptive_threshold(gray_scanned_image)
+
+        else:
+            # Otsu's thresholding after Gaussian filtering
+            threshold = otsu_threshold(blur(gray_scanned_image, detection_scale))
+        stage.count(method=config.defaults.thresholding)
+
+    archiver.archive_image(opencv_image=threshold, image_name='threshold')
+
+    with instrumentation.stage('opening'):
+        opening = open_image(threshold, detection_scale)
+    archiver.archive_image(opencv_image=opening, image_name="opening")
+
+    with instrumentation.stage('negate'):
+        negated = cv2.bitwise_not(opening)
+    archiver.archive_image(opencv_image=negated, image_name="negated")
+
+    with instrumentation.stage('contours') as stage:
+        detected, contours = boxes.from_binary_image(negated)
+        ingots = to_scan_coordinates(detected, scan, detection_scale)
+        # objects dropped for being smaller than the minimum coin area
+        stage.count(detected=len(detected), kept=len(ingots),
+                    rejected=len(detected) - len(ingots))
+
+    # debugging canvases are only allocated when they are to be archived
+    if archiver.wants('contours'):
+        blank_image_contours = numpy.zeros(negated.shape + (3,), numpy.uint8)
+        cv2.drawContours(blank_image_contours, contours, -1, (255, 0, 0), 5)
+        archiver.archive_image(opencv_image=blank_image_contours,
+                               image_name="contours")
+
+    if archiver.wants('bounding_boxes') and \
+            isinstance(scan, mapped.MappedScan):
+        logger.warning('Bounding boxes are not archived for memory-mapped '
+                       'scans, as they would take a full resolution canvas')
+
+    elif archiver.wants('bounding_boxes'):
+        blank_image = numpy.zeros(scan.shape, numpy.uint8)
+        for x, y, w, h, _ in ingots.table().tolist():
+            cv2.rectangle(
+                blank_image, (x, y), (x + w, y + h),
+                utilities.random_color(),
+                10
+            )
+        archiver.archive_image(opencv_image=blank_image,
+                               image_name="bounding_boxes")
+
+    return ingots
+
+
+def grayscale(scan, detection_scale):
+    '''Grayscale copy of the scan, without its border and shrunk to the
+    detection scale'''
     scan_border_reduction = config.defaults.scan_border_reduction
-    border_width = config.defaults.border_reduction
-    reduced_border_image = raw_scanned_image[
+    if isinstance(scan, mapped.MappedScan):
+        # read band by band, using no more than a quarter of the budget
+        return scan.reduced_gray(border=scan_border_reduction,
+                                 factor=int(round(1 / detection_scale)),
+                                 band_bytes=config.defaults.memory_budget // 4)
+
+    reduced_border_image = scan.pixels[
         scan_border_reduction:-scan_border_reduction,
         scan_border_reduction:-scan_border_reduction
     ]
 
-    gray_scanned_image = cv2.cvtColor(
+    if detection_scale != 1:
+        # shrink before the color conversion so that no full resolution
+        #  intermediate image is ever allocated
+        reduced_border_image = cv2.resize(
+            reduced_border_image, None,
+            fx=detection_scale, fy=detection_scale,
+            interpolation=cv2.INTER_AREA
+        )
+
+    return cv2.cvtColor(
         reduced_border_image,
         cv2.COLOR_BGR2GRAY
     )
-    archiver.archive_image(opencv_image=gray_scanned_image, image_name='gray')
 
-    # Otsu's thresholding after Gaussian filtering
-    blurred_gray_image = cv2.GaussianBlur(gray_scanned_image, (5, 5), 0)
+
+def blur(gray_scanned_image, detection_scale):
+    blur_size = scale_kernel_size(config.defaults.blur_kernel_size,
+                                  detection_scale, odd=True)
+    return cv2.GaussianBlur(gray_scanned_image, (blur_size, blur_size), 0)
+
+
+def otsu_threshold(blurred_gray_image):
     ret3, threshold = cv2.threshold(
         blurred_gray_image, 0, 255,
         cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return threshold
 
-    # threshold = cv2.adaptiveThreshold(
-    #     gray_scanned_image,
-    #     255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
-    #     11, 2
-    # )
-    archiver.archive_image(opencv_image=threshold, image_name='threshold')
 
-    kernel = numpy.ones((8, 8), numpy.uint8)
-    opening = cv2.morphologyEx(threshold, cv2.MORPH_OPEN, kernel)
-    archiver.archive_image(opencv_image=opening, image_name="opening")
+def adaptive_threshold(gray_scanned_image):
+    return cv2.adaptiveThreshold(
+        gray_scanned_image,
+        255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+        11, 2
+    )
 
-    negated = cv2.bitwise_not(opening)
-    archiver.archive_image(opencv_image=negated, image_name="negated")
 
-    _, contours, hierarchy = cv2.findContours(
-        negated, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE
-    )
+def open_image(threshold, detection_scale):
+    kernel_size = scale_kernel_size(config.defaults.opening_kernel_size,
+                                    detection_scale)
+    kernel = numpy.ones((kernel_size, kernel_size), numpy.uint8)
+    return cv2.morphologyEx(threshold, cv2.MORPH_OPEN, kernel)
 
-    blank_image_contours = numpy.zeros(raw_scanned_image.shape, numpy.uint8)
-    blank_image = numpy.zeros(raw_scanned_image.shape, numpy.uint8)
 
-    cropper = crop.ImageCropper(
-        original_file_path=raw_scanned_image_path,
-        dest=output_directory,
-    )
-    split = crop.SplitScan()
-
-    next_countour_indices = hierarchy[0, :, 0]
-    next_index = 0
-    while next_index != -1:
-        c = contours[next_index]
-        cv2.drawContours(blank_image_contours, c, -1, (255, 0, 0), 5)
-        x, y, w, h = cv2.boundingRect(c)
-        box = crop.CroppingBox(x=x, y=y, w=w, h=h)
-
-        # scale up these coordinates to their original size
-        if box.area() > config.defaults.minimum_coin_area:
-            box = box.expand(border_width, offset=scan_border_reduction)
-            logger.debug(box)
-
-            img = cropper.crop(**box.getCorners())
-            split.add(box=box, img=img)
-
-            upper_left = box.x, box.y
-            lower_right = box.x + box.w, box.y + box.h
-            cv2.rectangle(
-                blank_image, upper_left, lower_right,
-                utilities.random_color(),
-                10
-            )
+def to_scan_coordinates(detected, scan, detection_scale):
+    '''Drop the boxes of objects too small to be a coin/bar, and scale and
+    pad the rest to crop from the full resolution scan'''
+    minimum_area = config.defaults.minimum_coin_area * detection_scale**2
+    # a pixel at the detection scale covers several pixels of the scan, so
+    #  pad boxes by that much more to not lose the edges of an object
+    rounding_padding = int(math.ceil(1 / detection_scale)) - 1
 
-        next_index = next_countour_indices[next_index]
+    # scale up these coordinates to their original size
+    ingots = detected.larger_than(minimum_area)\
+        .rescale(1 / detection_scale)\
+        .expand(padding=config.defaults.border_reduction + rounding_padding,
+                offset=config.defaults.scan_border_reduction,
+                shape=scan.shape)
+    logger.debug("%d of %d detected objects are larger than %s pixels",
+                 len(ingots), len(detected), minimum_area)
+    return ingots
 
-    archiver.archive_image(opencv_image=blank_image_contours, image_name="contours")
-    archiver.archive_image(opencv_image=blank_image, image_name="bounding_boxes")
 
-    logger.info("Number of detected objects: {0}".format(len(split)))
+def scale_kernel_size(size, scale, odd=False):
+    size = max(1, int(round(size * scale)))
+    if odd and size % 2 == 0:
+        size += 1
+
+    return size
 
-    return split
 
+def merge(obverse, reverse, merger):
+  with instrumentation.stage('pair') as stage:
+    pairs = obverse.pair(reverse,
+                         mirror=config.defaults.pairing_mirror,
+                         max_distance=config.defaults.pairing_max_distance)
+    if stage.enabled:
+      stage.count(obverse=len(obverse), reverse=len(reverse),
+                  paired=len(pairs), total_cost=float(pairs.total_cost),
+                  mean_cost=float(pairs.mean_cost),
+                  mirrored=bool(pairs.mirrored),
+                  unmatched_obverse=len(pairs.unmatched_obverse),
+                  unmatched_reverse=len(pairs.unmatched_reverse))
+  logger.debug("Pairing cost: %.1f total, %.1f mean%s",
+               pairs.total_cost, pairs.mean_cost,
+               " (mirrored)" if pairs.mirrored else "")
 
-def merge(obverse, reverse, destination):
-  merger = crop.CroppedImageMerger(destination)
+  merged_images = merger.mergeAll(obverse, reverse, pairs)
+  # the records of every pair are skipped outright when not debugging
+  if logger.isEnabledFor(logging.DEBUG):
+    for (i, j), cost, merged in zip(pairs, pairs.costs, merged_images):
+      logger.debug("%s and %s => %s", obverse[i], reverse[j], merged)
+      logger.debug("%.1f distance between\n\t%s and\n\t%s",
+                   cost, obverse[i].box, reverse[j].box)
 
-  obverse.reorderByMinimumDistance(reverse)
+  for i in pairs.unmatched_obverse:
+    logger.error("No reverse found for obverse %s", obverse[i])
 
-  for ingot1, ingot2 in zip(obverse, reverse):
-    merged = merger.merge(ingot1, ingot2)
-    logger.info("{0} and {1} => {2}".format(ingot1.url, ingot2.url, merged))
+  for j in pairs.unmatched_reverse:
+    logger.error("No obverse found for reverse %s", reverse[j])
 
   if len(obverse) != len(reverse):
     logger.error(
       "For the two scans, the number of split images is not equal "
-      "({0} vs {1})".format(
-        len(obverse), len(reverse)
-    ))
+      "(%d vs %d)", len(obverse), len(reverse))
+
+  return merger.results
+
+
+def merge_pair(obverse, reverse, output_directory, save_crops=True):
+    '''Merge the crops of two SplitScans into the merged output directory
+    and, optionally, write the crops themselves into the cropped output
+    directory. Returns the paths of the merged images and of the crops, and
+    the previously fingerprinted images each merged image looks like.
+    '''
+    output_directory = pathlib.Path(output_directory)
+    cropped_output_directory = output_directory / config.defaults.cropped_output_directory
+    merged_output_directory = output_directory / config.defaults.merged_output_directory
+    index = fingerprints.from_config()
+
+    with instrumentation.scan(naming.pair_name(obverse.name)):
+        merger = crop.CroppedImageMerger(merged_output_directory,
+                                         name=naming.pair_name(obverse.name),
+                                         fingerprint=index is not None)
+        merged_images = merge(obverse, reverse, merger)
+
+        crops = []
+        futures = list(merger.futures)
+        if save_crops:
+            writer = crop.CroppedImageWriter(cropped_output_directory)
+            crops += writer.write(obverse)
+            crops += writer.write(reverse)
+            futures += writer.futures
+
+        # the images are encoded in the background, and only waited for once
+        #  every one of them has been handed over
+        with instrumentation.stage('write_outputs') as stage:
+            encoding_seconds, bytes_written = output.wait(futures)
+            stage.count(objects=len(futures),
+                        encoding_seconds=encoding_seconds,
+                        bytes_written=bytes_written)
+
+        duplicates = {}
+        if index is not None:
+            with instrumentation.stage('index_fingerprints') as stage:
+                duplicates = fingerprints.index_pair(index, obverse, reverse,
+                                                     merged_images,
+                                                     merger.fingerprints)
+                stage.count(duplicates=len(duplicates))
+
+    return merged_images, crops, duplicates
+
+
+def split_pair(obverse, reverse, output_directory, save_crops=True,
+               detection_scale=None, archival_stages=None, use_cache=True,
+               name=None, low_memory=None):
+    '''Split the obverse and reverse scans of a pair concurrently and merge
+    the matching crops. Returns the paths of the merged images.
+    '''
+    return split_pair_report(obverse, reverse, output_directory,
+                             save_crops=save_crops,
+                             detection_scale=detection_scale,
+                             archival_stages=archival_stages,
+                             use_cache=use_cache,
+                             name=name,
+                             low_memory=low_memory)['merged']
+
+
+def split_pair_report(obverse, reverse, output_directory, save_crops=True,
+                      detection_scale=None, archival_stages=None,
+                      use_cache=True, name=None, low_memory=None):
+    '''Split the obverse and reverse scans of a pair concurrently and merge
+    the matching crops. Returns the name of the pair, the (x, y, w, h, area)
+    box table of each scan, the paths of the merged images and crops, and
+    the previously fingerprinted images each merged image looks like.
+
+    Scans given as bytes or arrays are named after `name`, as if they had
+    been scanned into "{name} - obverse.tiff" and "{name} - reverse.tiff".
+
+    Unless `use_cache` is false, a pair whose scans and settings are
+    unchanged since it was last split, and whose outputs still exist, is not
+    split again.
+    '''
+    if detection_scale is None:
+        detection_scale = config.defaults.detection_scale
+
+    if low_memory is None:
+        low_memory = config.defaults.low_memory
+
+    output_directory = pathlib.Path(output_directory)
+
+    cache = None
+    if use_cache:
+        cache = resultcache.ResultCache.from_config()
+        cache_key = cache.key(
+            'pair',
+            cache.content_hash(obverse),
+            cache.content_hash(reverse),
+            resultcache.detection_parameters(detection_scale,
+                                             low_memory=low_memory),
+            resultcache.pairing_parameters(),
+            resultcache.output_parameters(),
+            str(output_directory.resolve()),
+            save_crops,
+            name,
+        )
+        cached = cache.get(cache_key)
+        if cached is not None and all(
+                pathlib.Path(p).is_file()
+                for p in cached['merged'] + cached['crops']):
+            logger.info('%s is unchanged since it was last split',
+                        naming.pair_name(cached['name']))
+            return cached
+
+    obverse_name = reverse_name = None
+    if name is not None:
+        obverse_name = naming.SEPARATOR.join((name, naming.OBVERSE))
+        reverse_name = naming.SEPARATOR.join((name, naming.REVERSE))
+
+    # OpenCV releases the GIL, so both sides are detected at the same time,
+    #  unless each is to stay within the memory budget on its own
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=1 if low_memory else 2) as executor:
+        obverse = executor.submit(extract_ingots,
+                                  raw_scanned_image=obverse,
+                                  name=obverse_name,
+                                  detection_scale=detection_scale,
+                                  archival_stages=archival_stages,
+                                  cache=cache,
+                                  low_memory=low_memory)
+        reverse = executor.submit(extract_ingots,
+                                  raw_scanned_image=reverse,
+                                  name=reverse_name,
+                                  detection_scale=detection_scale,
+                                  archival_stages=archival_stages,
+                                  cache=cache,
+                                  low_memory=low_memory)
+        obverse, reverse = obverse.result(), reverse.result()
+
+    merged_images, crops, duplicates = merge_pair(obverse, reverse,
+                                                  output_directory,
+                                                  save_crops=save_crops)
+
+    report = {
+        'name': obverse.name,
+        'obverse': obverse.boxes.table().tolist(),
+        'reverse': reverse.boxes.table().tolist(),
+        'merged': merged_images,
+        'crops': crops,
+        'duplicates': duplicates,
+    }
+    if cache is not None:
+        cache.put(cache_key, report)
 
-  return merger.results
\ No newline at end of file
+    return report
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Scanning sessions driven from an asyncio event loop: a station of several
+scanners scanning at once, or one scanner feeding page after page through a
+document feeder. Every finished scan is handed to a pool of split workers,
+so scans are split while others are still being scanned."""
+import abc
+import asyncio
+import functools
+import logging
+import os
+import pathlib
+
+import config
+from . import acquisition
+from . import manifest
+from . import naming
+from .utilities import exceptions
+
+logger = logging.getLogger(__name__)
+
+
+class Scanner(object):
+    '''One scanner of the station, and where its scans and their split and
+    merged images go. A scanner that fails is left out of the rest of the
+    session, without stopping the others. Pairs that could not be split are
+    listed in `failed`.'''
+    def __init__(self, device, name=None, resolution=None,
+                 output_directory=None):
+        self.device = device
+        self.name = name
+        self.resolution = resolution or config.defaults.resolution
+        self.output_directory = pathlib.Path(
+            output_directory or config.defaults.output_directory).expanduser()
+        self.error = None
+        self.merged = []
+        self.failed = []
+
+    def __str__(self):
+        return self.name or self.device
+
+
+def configured_scanners(devices=None, output_directory=None):
+    '''Scanners of the given SANE device URIs, or else of
+    config.defaults.scanners, or else just config.defaults.scanner'''
+    if devices:
+        settings = [{'device': device} for device in devices]
+
+    else:
+        settings = config.defaults.scanners or [
+            {'device': config.defaults.scanner}]
+
+    scanners = []
+    for n, setting in enumerate(settings):
+        setting = dict(setting)
+        setting.setdefault('output_directory', output_directory)
+        if len(settings) > 1:
+            # scanners sharing an output directory never share filenames
+            setting.setdefault('name', 'scanner {0}'.format(n))
+
+        scanners.append(Scanner(**setting))
+
+    return scanners
+
+
+class Session(object, metaclass=abc.ABCMeta):
+    '''Splits scans on `executor` as they are scanned, and merges each
+    pair there as soon as both of its sides are split. The `extraction`
+    keyword arguments (detection_scale, archival_stages, cache, low_memory)
+    are passed on to splitter.extract_ingots for every scan.'''
+    def __init__(self, executor, image_name, save_crops=True, **extraction):
+        # the pipeline is imported once, and only once there is a session
+        from . import splitter
+        self.splitter = splitter
+
+        self.executor = executor
+        self.image_name = image_name
+        self.save_crops = save_crops
+        self.extraction = extraction
+
+    def run(self):
+        asyncio.run(self.session())
+
+    @abc.abstractmethod
+    async def session(self):
+        '''Scan, split and merge until the session is over'''
+
+    def claim(self, scanner):
+        '''Manifest of a new pair scanned by `scanner`, whose scan paths are
+        claimed for it'''
+        name = self.image_name
+        if scanner.name is not None:
+            name = naming.SEPARATOR.join((name, scanner.name))
+
+        obverse_path = naming.claim_scan_path(
+            directory=scanner.output_directory, name=name)
+        return manifest.Manifest(obverse_path=obverse_path,
+                                 output_directory=scanner.output_directory,
+                                 resolution=scanner.resolution)
+
+    def split(self, pair, side):
+        '''Start splitting one side of a pair, returning the future of the
+        split'''
+        return self.loop.run_in_executor(
+            self.executor,
+            functools.partial(
+                pair.timer(side + '_split', self.splitter.extract_ingots),
+                raw_scanned_image=pair.scan_path(side),
+                **self.extraction))
+
+    async def merge(self, scanner, pair, obverse, reverse):
+        try:
+            # gathered, so the error of either side is never left unretrieved
+            obverse, reverse = await asyncio.gather(obverse, reverse)
+            merged, crops, duplicates = await self.loop.run_in_executor(
+                self.executor,
+                functools.partial(pair.timer('merge', self.splitter.merge_pair),
+                                  obverse=obverse,
+                                  reverse=reverse,
+                                  output_directory=scanner.output_directory,
+                                  save_crops=self.save_crops))
+        except exceptions.UnreadableImageException as e:
+            logger.error('%s: %s', scanner, e.message)
+            scanner.failed.append(pair.name)
+            return
+
+        except Exception:
+            # one broken pair never stops the rest of the session
+            logger.exception('%s: unable to split %s', scanner, pair.name)
+            scanner.failed.append(pair.name)
+            return
+
+        pair.record(obverse, reverse, merged, crops, duplicates)
+        pair.save()
+        scanner.merged += merged
+        logger.info('%s: %d merged images created from %s', scanner,
+                    len(merged), naming.pair_name(obverse.name))
+
+
+class Station(Session):
+    '''Scans `rounds` obverse/reverse pairs on every scanner at once, each
+    round scanned while the pairs of the round before are still merged.
+
+    Between scans, the user is prompted to flip or replace the coins/bars
+    on every scanner, unless `pause` gives the seconds to wait instead.
+    '''
+    def __init__(self, scanners, executor, image_name, rounds=1,
+                 save_crops=True, pause=None, **extraction):
+        super().__init__(executor=executor, image_name=image_name,
+                         save_crops=save_crops, **extraction)
+        self.scanners = scanners
+        self.rounds = rounds
+        self.pause = pause
+
+    async def session(self):
+        self.loop = asyncio.get_running_loop()
+        for scanner in self.scanners:
+            scanner.output_directory.mkdir(parents=True, exist_ok=True)
+
+        merges = []
+        for n in range(self.rounds):
+            if n > 0:
+                await self.wait_for_user('Press Enter after placing the next '
+                                         'coins/bars on every scanner... ')
+
+            merges += await self.scan_round()
+
+        await asyncio.gather(*merges)
+
+    async def scan_round(self):
+        '''Scan both sides of a pair on every working scanner, returning the
+        tasks merging each pair'''
+        scanners = [scanner for scanner in self.scanners
+                    if scanner.error is None]
+        pairs = [self.claim(scanner) for scanner in scanners]
+        obverse_splits = await asyncio.gather(*(
+            self.acquire(scanner, pair, naming.OBVERSE)
+            for scanner, pair in zip(scanners, pairs)))
+
+        if not any(split is not None for split in obverse_splits):
+            return []
+
+        await self.wait_for_user('Press Enter after flipping coins/bars on '
+                                 'every scanner... ')
+
+        scanned = [(scanner, pair, split) for scanner, pair, split
+                   in zip(scanners, pairs, obverse_splits)
+                   if split is not None]
+        reverse_splits = await asyncio.gather(*(
+            self.acquire(scanner, pair, naming.REVERSE)
+            for scanner, pair, _ in scanned))
+
+        return [
+            asyncio.ensure_future(self.merge(scanner, pair, obverse, reverse))
+            for (scanner, pair, obverse), reverse
+            in zip(scanned, reverse_splits)
+            if reverse is not None
+        ]
+
+    async def acquire(self, scanner, pair, side):
+        '''Scan one side of a pair, and start splitting the scan. Returns the
+        future of the split, or None if the scanner failed.'''
+        path = pair.scan_path(side)
+        logger.info('%s: scanning %s', scanner, path.name)
+        try:
+            with pair.timed(side + '_scan'):
+                await acquisition.scan_to_file(path, device=scanner.device,
+                                               resolution=scanner.resolution)
+        except (exceptions.MissingScannerException,
+                exceptions.ScanTimeoutException) as e:
+            scanner.error = e.message
+            logger.error('%s: %s', scanner, e.message)
+            return None
+
+        except Exception as e:
+            # the scanner is left out, while the others carry on
+            scanner.error = repr(e)
+            logger.exception('%s: unable to scan %s', scanner, path.name)
+            return None
+
+        logger.info('%s: scanned %s', scanner, path.name)
+        return self.split(pair, side)
+
+    async def wait_for_user(self, prompt):
+        if self.pause is not None:
+            await asyncio.sleep(self.pause)
+            return
+
+        # on the loop's own executor, as the split workers may all be busy
+        await self.loop.run_in_executor(None, input, prompt)
+
+
+class FeederSession(Session):
+    '''Scans page after page through a document feeder, or tray after tray,
+    with one long-running `scanimage --batch`. Consecutive pages are the
+    obverse and reverse of a pair. Each page is renamed after the scan
+    naming convention and split as soon as it is scanned, while the next
+    one is being scanned.
+    '''
+    def __init__(self, scanner, executor, image_name, save_crops=True,
+                 pages=None, source=None, **extraction):
+        super().__init__(executor=executor, image_name=image_name,
+                         save_crops=save_crops, **extraction)
+        self.scanner = scanner
+        self.pages = pages
+        self.source = source
+
+    async def session(self):
+        self.loop = asyncio.get_running_loop()
+        scanner = self.scanner
+        scanner.output_directory.mkdir(parents=True, exist_ok=True)
+        # hidden, and so ignored by `watch`, until renamed into a pair
+        pattern = scanner.output_directory / '.{0}-page%d.tiff'.format(
+            self.image_name.replace('%', '%%'))
+
+        merges = []
+        pair = obverse = None
+        last_page = self.loop.time()
+        pages = acquisition.scan_batch(pattern,
+                                       device=scanner.device,
+                                       resolution=scanner.resolution,
+                                       pages=self.pages,
+                                       source=self.source)
+        try:
+            async for page, path in pages:
+                if pair is None:
+                    pair = self.claim(scanner)
+                    side = naming.OBVERSE
+                else:
+                    side = naming.REVERSE
+
+                scan_path = pair.scan_path(side)
+                os.replace(str(path), str(scan_path))
+                logger.info('%s: page %d scanned into %s', scanner, page,
+                            scan_path.name)
+                # the feeder scans a page as soon as the one before is done
+                pair.timings[side + '_scan'] = self.loop.time() - last_page
+                last_page = self.loop.time()
+
+                if side == naming.OBVERSE:
+                    obverse = self.split(pair, side)
+
+                else:
+                    merges.append(asyncio.ensure_future(self.merge(
+                        scanner, pair, obverse, self.split(pair, side))))
+                    pair = obverse = None
+
+        except (exceptions.MissingScannerException,
+                exceptions.ScanTimeoutException) as e:
+            scanner.error = e.message
+            logger.error('%s: %s', scanner, e.message)
+
+        except Exception as e:
+            # the pages scanned so far are still split and merged
+            scanner.error = repr(e)
+            logger.exception('%s: feeding stopped', scanner)
+
+        if obverse is not None:
+            logger.warning('%s was the last page, and has no reverse',
+                           pair.obverse_path.name)
+            try:
+                await obverse
+            except exceptions.UnreadableImageException as e:
+                logger.error('%s: %s', scanner, e.message)
+                scanner.failed.append(pair.name)
+
+            except Exception:
+                logger.exception('%s: unable to split %s', scanner,
+                                 pair.obverse_path.name)
+                scanner.failed.append(pair.name)
+
+        await asyncio.gather(*merges)
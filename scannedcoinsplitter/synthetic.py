@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Synthetic scanner-bed images of bars and coins with known positions, for
+benchmarking the splitting pipeline against ground truth"""
+import cv2
+import numpy
+
+import config
+
+BAR = 'bar'
+COIN = 'coin'
+
+
+class SyntheticScanPair(object):
+    '''Obverse and reverse scans of the same objects, with the reverse
+    mirrored left to right as if the whole tray had been flipped. `objects`
+    holds one (id, kind, x, y, w, h) row per object, in obverse coordinates.
+    '''
+    def __init__(self, obverse, reverse, objects, dpi, shape=None):
+        self.obverse = obverse
+        self.reverse = reverse
+        self.objects = objects
+        self.dpi = dpi
+        self.shape = obverse.shape[:2] if shape is None else shape
+
+    def ground_truth(self):
+        '''The same pair without its images, e.g. to hand back from the
+        process that generated and wrote them'''
+        return SyntheticScanPair(obverse=None, reverse=None,
+                                 objects=self.objects, dpi=self.dpi,
+                                 shape=self.shape)
+
+    def centroids(self, side='obverse'):
+        centroids = numpy.array(
+            [(x + w / 2, y + h / 2) for _, _, x, y, w, h in self.objects],
+            dtype=numpy.float64
+        ).reshape(-1, 2)
+        if side == 'reverse':
+            centroids[:, 0] = self.shape[1] - centroids[:, 0]
+
+        return centroids
+
+
+def generate(dpi=300, bars=8, coins=8, seed=0, scan_area=None):
+    '''Lay out `bars` rectangular bars and `coins` round coins on a grid over
+    a light scanner bed of `scan_area` inches (config.defaults.scan_area if
+    not given), each jittered within its cell and sized randomly
+    '''
+    random = numpy.random.default_rng(seed)
+    width, height = scan_area or config.defaults.scan_area
+    width, height = int(width * dpi), int(height * dpi)
+
+    # every cell fits the largest object plus a quarter inch gap, inside a
+    #  half inch margin that the scan border reduction will cut away
+    cell = int(1.85 * dpi)
+    gap = dpi // 4
+    margin = dpi // 2
+    columns = (width - 2 * margin) // cell
+    rows = (height - 2 * margin) // cell
+    count = bars + coins
+    if count > columns * rows:
+        raise ValueError('{0} objects do not fit on a {1}x{2} grid'.format(
+            count, columns, rows))
+
+    kinds = [BAR] * bars + [COIN] * coins
+    random.shuffle(kinds)
+    cells = random.choice(columns * rows, size=count, replace=False)
+
+    obverse = bed(height, width, random)
+    reverse = bed(height, width, random)
+    objects = []
+    for object_id, (kind, index) in enumerate(zip(kinds, cells.tolist())):
+        if kind == BAR:
+            w = int(random.uniform(0.5, 0.9) * dpi)
+            h = int(random.uniform(1.0, 1.6) * dpi)
+            if random.random() < 0.5:
+                w, h = h, w
+        else:
+            w = h = int(random.uniform(0.6, 1.2) * dpi)
+
+        row, column = divmod(index, columns)
+        x = margin + column * cell + int(random.integers(0, cell - gap - w))
+        y = margin + row * cell + int(random.integers(0, cell - gap - h))
+        objects.append((object_id, kind, x, y, w, h))
+
+        draw(obverse, kind, x, y, w, h, random)
+        draw(reverse, kind, width - x - w, y, w, h, random)
+
+    return SyntheticScanPair(obverse=obverse, reverse=reverse,
+                             objects=objects, dpi=dpi)
+
+
+def bed(height, width, random):
+    image = numpy.full((height, width, 3), 236, numpy.uint8)
+    noise = random.integers(-6, 7, size=(height, width, 1), dtype=numpy.int16)
+    return numpy.clip(image + noise, 0, 255).astype(numpy.uint8)
+
+
+def draw(image, kind, x, y, w, h, random):
+    metal = tuple(int(c) for c in random.integers(60, 150, size=3))
+    detail = tuple(min(255, c + 70) for c in metal)
+    if kind == BAR:
+        cv2.rectangle(image, (x, y), (x + w - 1, y + h - 1), metal, -1)
+        # stamped lettering and a rim, lighter than the metal
+        cv2.rectangle(image, (x + w // 8, y + h // 8),
+                      (x + w - w // 8, y + h - h // 8), detail, max(1, w // 60))
+        cv2.putText(image, '999', (x + w // 4, y + h // 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, w / 300, detail,
+                    max(1, w // 100))
+    else:
+        center = (x + w // 2, y + h // 2)
+        cv2.circle(image, center, w // 2, metal, -1)
+        cv2.circle(image, center, int(w * 0.42), detail, max(1, w // 80))
+        cv2.circle(image, center, w // 6, detail, -1)
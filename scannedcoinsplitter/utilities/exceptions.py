@@ -4,8 +4,52 @@
 import termcolor
 
 
-class MissingScannerException(Exception):
+class SplitterException(Exception):
+    '''Exceptions raised in a worker process are pickled back to the parent,
+    which rebuilds them by calling their class again. They are rebuilt from
+    the arguments they were raised with, not from their message.'''
+    def __init__(self, message, *arguments):
+        super().__init__(message)
+        self.message = message
+        self.arguments = arguments
+
+    def __reduce__(self):
+        return type(self), self.arguments
+
+
+class MissingScannerException(SplitterException):
     def __init__(self, scanner_uri):
-        self.message = 'Scanner missing! Cannot find {scanner}'.format(
+        super().__init__('Scanner missing! Cannot find {scanner}'.format(
             scanner=termcolor.colored(scanner_uri, 'yellow', attrs=['bold'])
-        )
+        ), scanner_uri)
+
+
+class ScanTimeoutException(SplitterException):
+    def __init__(self, scanner_uri, timeout):
+        super().__init__(('Scanner {scanner} did not finish scanning within '
+                          '{timeout} seconds').format(
+            scanner=termcolor.colored(scanner_uri, 'yellow', attrs=['bold']),
+            timeout=timeout,
+        ), scanner_uri, timeout)
+
+
+class ServiceUnavailableException(SplitterException):
+    def __init__(self, socket_path):
+        super().__init__('No split service is listening on {socket}'.format(
+            socket=termcolor.colored(str(socket_path), 'yellow', attrs=['bold'])
+        ), socket_path)
+
+
+class UnmappableImageException(SplitterException):
+    def __init__(self, image, reason):
+        super().__init__('Unable to memory-map image {image}: {reason}'.format(
+            image=termcolor.colored(str(image), 'yellow', attrs=['bold']),
+            reason=reason,
+        ), image, reason)
+
+
+class UnreadableImageException(SplitterException):
+    def __init__(self, image):
+        super().__init__('Unable to decode image {image}'.format(
+            image=termcolor.colored(str(image), 'yellow', attrs=['bold'])
+        ), image)
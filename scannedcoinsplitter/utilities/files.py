@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Writing files so that they are never seen half written"""
+import contextlib
+import os
+import pathlib
+import tempfile
+
+# os.umask() can only be read by setting it, which is not safe once other
+#  threads may be creating files, so it is read once, on import
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w'):
+    '''File object to write the contents of `path` into. They are written to
+    a hidden temporary file beside `path` and renamed into place once the
+    block exits, so that a crash or a concurrent reader never sees a
+    partially written file. If the block raises, the temporary file is
+    removed and `path` is left as it was. The file gets the permissions that
+    open() would have given it, rather than mkstemp()'s owner-only ones.
+    '''
+    path = pathlib.Path(path)
+    descriptor, temporary_path = tempfile.mkstemp(
+        dir=str(path.parent), prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, mode) as f:
+            os.fchmod(f.fileno(), 0o666 & ~UMASK)
+            yield f
+        os.replace(temporary_path, str(path))
+
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temporary_path)
+        raise
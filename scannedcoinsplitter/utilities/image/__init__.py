@@ -2,9 +2,37 @@
 # -*- coding: utf-8 -*-
 
 
+import numpy
+
+
 class ImageFromScan(object):
-    def __init__(self, box, img):
-        self.url = img
+    __slots__ = ('box', 'pixels', 'url', 'h', 'w', '_fingerprint')
+
+    def __init__(self, box, img, url=None):
+        self.pixels = img
+        self.url = url
         self.box = box
-        self.h = box.h
-        self.w = box.w
+        self.h, self.w = img.shape[:2]
+        self._fingerprint = None
+
+    @property
+    def img(self):
+        '''The pixels of the crop. The crop of a memory-mapped scan is read
+        from the file every time, and so is only in memory while it is used.
+        '''
+        if isinstance(self.pixels, numpy.ndarray):
+            return self.pixels
+
+        return self.pixels.read()
+
+    def fingerprint(self):
+        '''Perceptual hashes of the crop, computed the first time they are
+        needed'''
+        if self._fingerprint is None:
+            from ... import fingerprints
+            self._fingerprint = fingerprints.fingerprint(self.img)
+
+        return self._fingerprint
+
+    def __str__(self):
+        return self.url if self.url is not None else str(self.box)
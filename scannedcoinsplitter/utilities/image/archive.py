@@ -1,35 +1,114 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import pathlib
+import atexit
+import logging
+import queue
+import threading
 import cv2
 
+import config
+from .stages import STAGES
+from .stages import parse_stages
+
+logger = logging.getLogger(__name__)
+
 
 class IntermediateImageArchiver(object):
-    def __init__(self, original_image_path, archival_directory, scale=None):
-        archival_directory.mkdir(parents=True, exist_ok=True)
+    def __init__(self, original_image_name, archival_directory, stages=None,
+                 scale=None, preview_scale=None):
+        self.stages = parse_stages(stages)
+        if self.stages:
+            archival_directory.mkdir(parents=True, exist_ok=True)
 
-        original_image_filename = pathlib.Path(original_image_path).name
-        self.archived_filename_prefix = original_image_filename.split(".")[0]
+        self.archived_filename_prefix = original_image_name
         self.archival_directory = archival_directory
         self.scale = scale
+        self.preview_scale = preview_scale
 
-        self.intermediate_image_number = 1
+    def wants(self, image_name):
+        return image_name in self.stages
 
     def archive_image(self, opencv_image, image_name):
-        scaled_image = self.scale_image(opencv_image)
+        if not self.wants(image_name):
+            return
 
         archived_image_path \
             = self.archival_directory / '{prefix}_{index}_{name}.png'.format(
                 prefix=self.archived_filename_prefix,
-                index=self.intermediate_image_number,
+                index=STAGES.index(image_name) + 1,
                 name=image_name)
-        cv2.imwrite(str(archived_image_path), scaled_image)
-        self.intermediate_image_number += 1
+
+        # scaling and encoding happen on the writer thread
+        writer().submit(path=archived_image_path,
+                        image=opencv_image,
+                        transform=self.scale_image)
 
     def scale_image(self, opencv_image):
         if self.scale is not None:
             for i in range(self.scale):
                 opencv_image = cv2.pyrUp(opencv_image)
 
+        if self.preview_scale is not None:
+            opencv_image = cv2.resize(
+                opencv_image, None,
+                fx=self.preview_scale, fy=self.preview_scale,
+                interpolation=cv2.INTER_AREA
+            )
+
         return opencv_image
+
+
+class BackgroundImageWriter(object):
+    '''Encodes and writes images on a background thread. The queue is bounded,
+    so a pipeline producing images faster than they can be written blocks
+    rather than piling up full resolution images in memory.
+    '''
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = threading.Thread(target=self.run,
+                                       name='intermediate-image-writer',
+                                       daemon=True)
+        self.thread.start()
+
+    def submit(self, path, image, transform=None):
+        self.queue.put((path, image, transform))
+
+    def run(self):
+        while True:
+            path, image, transform = self.queue.get()
+            try:
+                if transform is not None:
+                    image = transform(image)
+
+                cv2.imwrite(str(path), image)
+
+            except Exception:
+                logger.exception('Unable to archive %s', path)
+
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        self.queue.join()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = BackgroundImageWriter(
+                maxsize=config.defaults.intermediate_archival_queue_size)
+
+    return _writer
+
+
+@atexit.register
+def flush():
+    '''Block until every archived image has been written'''
+    if _writer is not None:
+        _writer.flush()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Bounding boxes of the objects detected in a scan, stored as a structure of
+arrays so that filtering, scaling, padding and pairing work on every box of a
+scan at once"""
+
+import cv2
+import numpy
+
+COLUMNS = ('x', 'y', 'w', 'h', 'area')
+
+
+class BoxSet(object):
+    '''Contiguous x, y, w, h, area, cx and cy arrays with one entry per box.
+    Indexing with an integer returns a lightweight Box view of one row, while
+    slices and boolean masks return a new BoxSet.
+    '''
+    __slots__ = ('x', 'y', 'w', 'h', 'area', 'cx', 'cy')
+
+    def __init__(self, x, y, w, h):
+        self.x = numpy.ascontiguousarray(x, dtype=numpy.int64)
+        self.y = numpy.ascontiguousarray(y, dtype=numpy.int64)
+        self.w = numpy.ascontiguousarray(w, dtype=numpy.int64)
+        self.h = numpy.ascontiguousarray(h, dtype=numpy.int64)
+        self.area = self.w * self.h
+        self.cx = self.x + self.w / 2
+        self.cy = self.y + self.h / 2
+
+    @classmethod
+    def empty(cls):
+        return cls(x=(), y=(), w=(), h=())
+
+    @classmethod
+    def from_corners(cls, min_x, min_y, max_x, max_y):
+        return cls(x=min_x, y=min_y, w=max_x - min_x, h=max_y - min_y)
+
+    @classmethod
+    def from_table(cls, table):
+        '''From an (n, 4+) table with rows of x, y, w, h[, area]'''
+        table = numpy.asarray(table)
+        if not table.size:
+            return cls.empty()
+
+        return cls(x=table[:, 0], y=table[:, 1], w=table[:, 2], h=table[:, 3])
+
+    def table(self):
+        return numpy.column_stack([getattr(self, c) for c in COLUMNS])
+
+    def centroids(self):
+        return numpy.column_stack((self.cx, self.cy))
+
+    def larger_than(self, minimum_area):
+        return self[self.area > minimum_area]
+
+    def rescale(self, factor):
+        '''Scale boxes by `factor`, rounding outwards so that no scaled box is
+        smaller than the region it covered'''
+        if factor == 1:
+            return self
+
+        return BoxSet.from_corners(
+            min_x=numpy.floor(self.x * factor),
+            min_y=numpy.floor(self.y * factor),
+            max_x=numpy.ceil((self.x + self.w) * factor),
+            max_y=numpy.ceil((self.y + self.h) * factor),
+        )
+
+    def expand(self, padding, offset, shape=None):
+        '''Pad every box by `padding` pixels on each side and shift it by
+        `offset` pixels right and down. With the (height, width) `shape` of
+        the image given, boxes are clipped to its edges.
+        '''
+        min_x = self.x + (offset - padding)
+        min_y = self.y + (offset - padding)
+        max_x = self.x + self.w + (offset + padding)
+        max_y = self.y + self.h + (offset + padding)
+        if shape is not None:
+            height, width = shape[:2]
+            min_x, min_y = numpy.maximum(min_x, 0), numpy.maximum(min_y, 0)
+            max_x = numpy.minimum(max_x, width)
+            max_y = numpy.minimum(max_y, height)
+
+        return BoxSet.from_corners(min_x=min_x, min_y=min_y,
+                                   max_x=max_x, max_y=max_y)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, numpy.integer)):
+            if not -len(self) <= index < len(self):
+                raise IndexError('box index out of range')
+
+            return Box(self, int(index) % len(self))
+
+        return BoxSet(x=self.x[index], y=self.y[index],
+                      w=self.w[index], h=self.h[index])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Box(self, i)
+
+    def __len__(self):
+        return len(self.x)
+
+
+class Box(object):
+    '''View of a single row of a BoxSet'''
+    __slots__ = ('boxes', 'index')
+
+    def __init__(self, boxes, index):
+        self.boxes = boxes
+        self.index = index
+
+    @property
+    def x(self):
+        return int(self.boxes.x[self.index])
+
+    @property
+    def y(self):
+        return int(self.boxes.y[self.index])
+
+    @property
+    def w(self):
+        return int(self.boxes.w[self.index])
+
+    @property
+    def h(self):
+        return int(self.boxes.h[self.index])
+
+    @property
+    def centroid(self):
+        return (float(self.boxes.cx[self.index]),
+                float(self.boxes.cy[self.index]))
+
+    def area(self):
+        return int(self.boxes.area[self.index])
+
+    def corners(self):
+        '''(min_x, max_x, min_y, max_y)'''
+        x, y = self.x, self.y
+        return x, x + self.w, y, y + self.h
+
+    def __str__(self):
+        return "<Box(area={0}, w={1}, h={2}, upper_left={3}, lower_right={4})>".format(
+            self.area(),
+            self.w,
+            self.h,
+            (self.x, self.y),
+            (self.x + self.w, self.y + self.h),
+        )
+
+
+def from_binary_image(binary_image):
+    '''Bounding boxes of the outermost white objects in a binary image.
+    Returns a BoxSet and the outer contours themselves.
+    '''
+    # the contours are the second to last value returned by every OpenCV
+    #  version (OpenCV 3 returns three values, OpenCV 2 and 4 return two)
+    contours = cv2.findContours(
+        binary_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+    )[-2]
+    if not contours:
+        return BoxSet.empty(), contours
+
+    # one reduction over the points of all contours, segmented per contour
+    lengths = numpy.fromiter(map(len, contours), dtype=numpy.intp,
+                             count=len(contours))
+    starts = numpy.concatenate(([0], numpy.cumsum(lengths[:-1])))
+    points = numpy.concatenate(contours).reshape(-1, 2)
+    lower = numpy.minimum.reduceat(points, starts, axis=0)
+    upper = numpy.maximum.reduceat(points, starts, axis=0) + 1
+
+    return BoxSet.from_corners(min_x=lower[:, 0], min_y=lower[:, 1],
+                               max_x=upper[:, 0], max_y=upper[:, 1]), contours
@@ -3,93 +3,88 @@
 
 import numpy
 import logging
-import cv2
 import pathlib
-from datetime import datetime
-from PIL import Image
 
 logger = logging.getLogger(__name__)
 
 from . import ImageFromScan
-
-
-class CroppingBox:
-    def __init__(self, x, y, w, h):
-        self.x = x
-        self.y = y
-        self.w = w
-        self.h = h
-        self.centroid = numpy.array([x + (w / 2), y + (h / 2)])
-
-    def area(self):
-        return self.w * self.h
-
-    def expand(self, padding, offset):
-        box = CroppingBox(
-            x=self.x + offset - padding,
-            y=self.y + offset - padding,
-            w=self.w + (2*padding),
-            h=self.h + (2*padding),
-        )
-        logger.debug("Expanding borders of {0} by {1} pixels".format(self, padding))
-        return box
-
-    def getCorners(self):
-        return {
-            "min_x": self.x,
-            "max_x": self.x + self.w,
-            "min_y": self.y,
-            "max_y": self.y + self.h,
-        }
-
-    def __str__(self):
-        return "<CroppingBox(area={0}, w={1}, h={2}, upper_left={3}, lower_right={4})>".format(
-            self.area(),
-            self.w,
-            self.h,
-            (self.x, self.y),
-            (self.x + self.w, self.y + self.h),
-        )
+from . import output
+from ... import instrumentation
+from ... import pairing
 
 
 class ImageCropper(object):
-    def __init__(self, original_file_path, dest):
+    def __init__(self, source):
+        self.source = source
+
+    def cropAll(self, boxes):
+        # views into the decoded scan, nothing is copied or encoded here. The
+        #  regions of a memory-mapped scan are not even read yet.
+        view = self.source.view
+        with instrumentation.stage('crop', objects=len(boxes)):
+            return [
+                view(x, x + w, y, y + h)
+                for x, y, w, h in zip(boxes.x.tolist(), boxes.y.tolist(),
+                                      boxes.w.tolist(), boxes.h.tolist())
+            ]
+
+
+class CroppedImageWriter(object):
+    '''Optional sink that writes the crops of a SplitScan to disk. Crops are
+    written in the background, and are only all on disk once wait() returns.
+    '''
+    def __init__(self, dest):
         self.dest = pathlib.Path(dest)
-        self.filename = pathlib.Path(original_file_path)\
-            .name.split(".")[0]
-        self.img = cv2.imread(str(original_file_path))
-        self.n = 0
+        self.futures = []
 
         self.dest.mkdir(exist_ok=True, parents=True)
 
-    def crop(self, min_x, max_x, min_y, max_y):
-        cropped_img = self.img[min_y:max_y, min_x:max_x]
-        cropped_img_url = self.dest / "{0}_{1}.png".format(
-            self.n, self.filename)
-        cv2.imwrite(str(cropped_img_url), cropped_img)
-        self.n += 1
-        return str(cropped_img_url)
+    def write(self, split):
+        urls = []
+        submit = output.writer().submit
+        with instrumentation.stage('write_crops', split=split.name) as stage:
+            for n, img in enumerate(split):
+                cropped_img_url = output.output_path(
+                    self.dest, "{0}_{1}".format(n, split.name), 'crop')
+                self.futures.append(submit(cropped_img_url, img.img, 'crop'))
+                img.url = str(cropped_img_url)
+                urls.append(img.url)
+
+            stage.count(objects=len(urls))
+
+        return urls
+
+    def wait(self):
+        return output.wait(self.futures)
 
 
 class SplitScan(object):
-    def __init__(self):
-        self.split_imgs = []
-
-    def add(self, box, img):
-        self.split_imgs.append(ImageFromScan(box=box, img=img))
-
-    def reorderByMinimumDistance(self, other_split_scan):
-        original_images = list(self.split_imgs)
-        reordered_images = []
-        for img in other_split_scan:
-            distance = lambda i: numpy.linalg.norm(i.box.centroid - img.box.centroid)
-            i = min(original_images, key=distance)
-            logger.debug("{0} distance between\n\t{1} and\n\t {2}".format(
-                distance(i), img.box, i.box
-            ))
-            reordered_images.append(i)
-            original_images.remove(i)
-        self.split_imgs = reordered_images
+    '''The crops split from one scan, along with the BoxSet they were cropped
+    by. The i-th image is the crop of the i-th box.
+    '''
+    def __init__(self, name, boxes, images, width=None):
+        self.name = name
+        self.width = width
+        self.boxes = boxes
+        self.split_imgs = [
+            ImageFromScan(box=box, img=img)
+            for box, img in zip(boxes, images)
+        ]
+
+    def centroids(self):
+        return self.boxes.centroids()
+
+    def pair(self, other_split_scan, mirror='none', max_distance=None):
+        return pairing.pair(
+            obverse_centroids=self.centroids(),
+            reverse_centroids=other_split_scan.centroids(),
+            width=other_split_scan.width,
+            mirror=mirror,
+            max_distance=max_distance,
+        )
+
+    def __getitem__(self, index):
+        return self.split_imgs[index]
 
     def __iter__(self):
         for i in self.split_imgs:
@@ -102,53 +97,86 @@ class SplitScan(object):
 class CroppedImageMerger(object):
     WHITE = (255, 255, 255)
 
-    def __init__(self, dest):
+    def __init__(self, dest, name, fingerprint=False):
         self.n = 0
+        self.name = name
         self.results = []
+        self.futures = []
+        # perceptual hashes of the merged images, if `fingerprint` is set
+        self.fingerprint = fingerprint
+        self.fingerprints = []
         self.dest = pathlib.Path(dest)
 
         self.dest.mkdir(exist_ok=True, parents=True)
 
-    def merge(self, img1, img2):
+    def mergeAll(self, obverse, reverse, pairs):
+        '''Merge every (obverse index, reverse index) pair of two SplitScans'''
+        vertical = self.isVertical(obverse.boxes.h, obverse.boxes.w).tolist()
+        return [
+            self.merge(obverse[i], reverse[j], vertical=vertical[i])
+            for i, j in pairs
+        ]
+
+    @staticmethod
+    def isVertical(h, w):
         # If the aspect ratio of one of the images is less than 1, with some wiggle
         #  room, then the two files will be vertically merged. Otherwise, horizontal
         #  merging.
-        if (img1.h / float(img1.w)) < 0.95:
-            result = self.verticalMerge(img1, img2)
+        return (h / w) < 0.95
 
-        else:
-            result = self.horizontalMerge(img1, img2)
+    def merge(self, img1, img2, vertical=None):
+        with instrumentation.stage('compose') as stage:
+            result = self.compose(img1, img2, vertical=vertical)
+            if stage.enabled:
+                stage.count(**instrumentation.shape_of(result))
+
+        if self.fingerprint:
+            from ... import fingerprints
+            with instrumentation.stage('fingerprint'):
+                self.fingerprints.append(fingerprints.fingerprint(result))
 
-        url_safe_datetime = datetime.now().strftime("%Y-%m-%d %H-%M-%S")
-        merged_url = str(self.dest / f'{url_safe_datetime}_{self.n}.png')
+        # named after the scan pair, so that parallel workers never collide
+        #  and re-running a pair overwrites its previous results
+        merged_url = str(output.output_path(self.dest, f'{self.name}_{self.n}',
+                                            'merged'))
 
         self.n += 1
-        result.save(merged_url)
+        # encoded in the background while the next pair is composed
+        self.futures.append(
+            output.writer().submit(merged_url, result, 'merged'))
 
         self.results.append(merged_url)
         return merged_url
 
+    def wait(self):
+        '''Block until every merged image is on disk'''
+        return output.wait(self.futures)
+
+    def compose(self, img1, img2, vertical=None):
+        if vertical is None:
+            vertical = self.isVertical(img1.h, float(img1.w))
+
+        if vertical:
+            return self.verticalMerge(img1, img2)
+
+        else:
+            return self.horizontalMerge(img1, img2)
+
     def verticalMerge(self, img1, img2):
-        logger.info("Vertical merging of {0} and {1}".format(img1.url, img2.url))
-        max_width = max(img1.w, img2.w)
-        concatenated_height = img1.h + img2.h
-        result = Image.new(
-            "RGBA",
-            (max_width, concatenated_height),
-            color=self.WHITE
-        )
-        result.paste(Image.open(img1.url), (0, 0))
-        result.paste(Image.open(img2.url), (0, img1.h))
+        logger.debug("Vertical merging of %s and %s", img1, img2)
+        result = self.canvas(height=img1.h + img2.h,
+                             width=max(img1.w, img2.w))
+        result[:img1.h, :img1.w] = img1.img
+        result[img1.h:, :img2.w] = img2.img
         return result
 
     def horizontalMerge(self, img1, img2):
-        logger.info("Horizontal merging of {0} and {1}".format(img1.url, img2.url))
-        max_height = max(img1.h, img2.h)
-        concatenated_width = img1.w + img2.w
-        result = Image.new(
-            "RGBA",
-            (concatenated_width, max_height),
-            color=self.WHITE)
-        result.paste(Image.open(img1.url), (0, 0))
-        result.paste(Image.open(img2.url), (img1.w, 0))
+        logger.debug("Horizontal merging of %s and %s", img1, img2)
+        result = self.canvas(height=max(img1.h, img2.h),
+                             width=img1.w + img2.w)
+        result[:img1.h, :img1.w] = img1.img
+        result[:img2.h, img1.w:] = img2.img
         return result
+
+    def canvas(self, height, width):
+        return numpy.full((height, width, 3), self.WHITE, numpy.uint8)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Scans read straight from uncompressed TIFF or binary PNM files instead of
+being decoded into memory, for scans too large to hold several copies of"""
+import logging
+import mmap
+import pathlib
+import struct
+
+import cv2
+import numpy
+
+from ..exceptions import UnmappableImageException
+
+logger = logging.getLogger(__name__)
+
+# images of the reduced level's size that detection holds at once: the
+#  grayscale level, blurred, thresholded, opened and negated copies, and the
+#  contours found in it
+DETECTION_COPIES = 6
+
+# baseline TIFF tags, and the struct formats of the field types they use
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+PHOTOMETRIC_INTERPRETATION = 262
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+STRIP_BYTE_COUNTS = 279
+PLANAR_CONFIGURATION = 284
+TIFF_TYPES = {1: 'B', 3: 'H', 4: 'I'}
+
+
+class MappedScan(object):
+    '''An uncompressed 8-bit RGB or grayscale scan, memory-mapped rather
+    than decoded. Crops are read from the map, so only the parts of the file
+    they cover are ever read; detection reads the file in bands of bounded
+    size (see reduced_gray()).
+    '''
+    def __init__(self, path, offset, height, width, channels, name=None):
+        self.path = pathlib.Path(path)
+        self.name = name or self.path.name.split(".")[0]
+        self.offset = offset
+        self.channels = channels
+        self.map = numpy.memmap(str(self.path), dtype=numpy.uint8, mode='r',
+                                offset=offset,
+                                shape=(height, width, channels))
+
+    @classmethod
+    def open(cls, path, name=None):
+        path = pathlib.Path(path)
+        with open(str(path), 'rb') as f:
+            magic = f.read(4)
+            f.seek(0)
+            if magic in (b'II*\x00', b'MM\x00*'):
+                layout = read_tiff_layout(f, path)
+            elif magic[:2] in (b'P5', b'P6'):
+                layout = read_pnm_layout(f, path)
+            else:
+                raise UnmappableImageException(path, 'not a TIFF or PNM file')
+
+        return cls(path=path, name=name, **layout)
+
+    @property
+    def shape(self):
+        # as the BGR image it stands in for
+        return self.map.shape[:2] + (3,)
+
+    def view(self, min_x, max_x, min_y, max_y):
+        '''A region of the scan, which is only read once its pixels are
+        needed. The crops of a scan are thus read one at a time, as they are
+        merged or written, rather than all at once.'''
+        return MappedRegion(self, min_x, max_x, min_y, max_y)
+
+    def read(self, min_x, max_x, min_y, max_y):
+        '''A BGR copy of a region of the scan. A view into the map would keep
+        every page of the file it touches resident, i.e. whole rows of the
+        scan, whereas the pages read for a copy are released right away.
+        '''
+        region = self.map[min_y:max_y, min_x:max_x]
+        if self.channels == 1:
+            region = cv2.cvtColor(region[..., 0], cv2.COLOR_GRAY2BGR)
+        else:
+            # stored as RGB
+            region = numpy.ascontiguousarray(region[..., ::-1])
+
+        self.release(min_y, max_y)
+        return region
+
+    def release(self, min_y, max_y):
+        '''Drop the pages holding rows `min_y` to `max_y` from this process,
+        so they no longer count towards its resident memory'''
+        mapping = getattr(self.map, '_mmap', None)
+        if mapping is None or not hasattr(mapping, 'madvise'):
+            return
+
+        stride = self.map.shape[1] * self.channels
+        # numpy maps the file from the allocation boundary before the offset
+        start = self.offset % mmap.ALLOCATIONGRANULARITY + min_y * stride
+        start -= start % mmap.PAGESIZE
+        end = min(len(mapping),
+                  self.offset % mmap.ALLOCATIONGRANULARITY + max_y * stride)
+        if end > start:
+            mapping.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def reduced_gray(self, border, factor, band_bytes):
+        '''Grayscale copy of the scan without its border, shrunk by the
+        integer `factor`. The file is read in bands of at most `band_bytes`
+        (but at least `factor` rows), so the whole scan is never in memory.
+        A few rows and columns that do not fill a whole `factor` are dropped
+        from the bottom and right edges.
+        '''
+        height, width = self.map.shape[:2]
+        rows = (height - 2 * border) // factor * factor
+        columns = (width - 2 * border) // factor * factor
+        stride = width * self.channels
+        band_rows = max(factor, band_bytes // stride // factor * factor)
+
+        reduced = numpy.empty((rows // factor, columns // factor), numpy.uint8)
+        buffer = bytearray(band_rows * stride)
+        with open(str(self.path), 'rb', buffering=0) as f:
+            for top in range(0, rows, band_rows):
+                count = min(band_rows, rows - top)
+                f.seek(self.offset + (border + top) * stride)
+                if f.readinto(memoryview(buffer)[:count * stride]) \
+                        != count * stride:
+                    raise UnmappableImageException(self.path, 'truncated')
+
+                band = numpy.frombuffer(buffer, numpy.uint8, count * stride)\
+                    .reshape(count, width, self.channels)[
+                        :, border:border + columns]
+                if self.channels == 1:
+                    gray = band[..., 0]
+                else:
+                    gray = cv2.cvtColor(band, cv2.COLOR_RGB2GRAY)
+
+                if factor != 1:
+                    gray = cv2.resize(gray, (columns // factor, count // factor),
+                                      interpolation=cv2.INTER_AREA)
+
+                reduced[top // factor:(top + count) // factor] = gray
+
+        return reduced
+
+    def __str__(self):
+        return str(self.path)
+
+
+class MappedRegion(object):
+    '''A region of a MappedScan, read from the file each time read() is
+    called'''
+    __slots__ = ('scan', 'bounds', 'shape')
+
+    def __init__(self, scan, min_x, max_x, min_y, max_y):
+        self.scan = scan
+        self.bounds = (min_x, max_x, min_y, max_y)
+        self.shape = (max_y - min_y, max_x - min_x, 3)
+
+    def read(self):
+        return self.scan.read(*self.bounds)
+
+
+def reduction_factor(shape, detection_scale, budget):
+    '''Smallest whole factor, no less than 1 / `detection_scale`, to shrink a
+    scan of `shape` by for the images detection holds at once to fit in half
+    of the `budget` bytes'''
+    height, width = shape[:2]
+    factor = max(1, int(round(1 / detection_scale)))
+    while DETECTION_COPIES * (height // factor) * (width // factor) \
+            > budget // 2:
+        factor += 1
+
+    return factor
+
+
+def read_tiff_layout(f, path):
+    '''Where the pixels of a single image, uncompressed, 8-bit, chunky TIFF
+    are, provided its strips are stored back to back'''
+    header = f.read(8)
+    order = '<' if header[:2] == b'II' else '>'
+    (ifd_offset,) = struct.unpack(order + 'I', header[4:8])
+
+    f.seek(ifd_offset)
+    (count,) = struct.unpack(order + 'H', f.read(2))
+    tags = {}
+    for _ in range(count):
+        tag, field_type, values, data = struct.unpack(order + 'HHI4s',
+                                                      f.read(12))
+        if field_type not in TIFF_TYPES:
+            continue
+
+        fmt = order + TIFF_TYPES[field_type] * values
+        size = struct.calcsize(fmt)
+        if size > 4:
+            position = f.tell()
+            (offset,) = struct.unpack(order + 'I', data)
+            f.seek(offset)
+            data = f.read(size)
+            f.seek(position)
+
+        tags[tag] = struct.unpack(fmt, data[:size])
+
+    def tag(number, default=None):
+        values = tags.get(number, default)
+        if values is None:
+            raise UnmappableImageException(path, 'missing TIFF tag {0}'.format(
+                number))
+
+        return values
+
+    channels = tag(SAMPLES_PER_PIXEL, (1,))[0]
+    if tag(COMPRESSION, (1,))[0] != 1:
+        raise UnmappableImageException(path, 'compressed')
+
+    if set(tag(BITS_PER_SAMPLE, (1,))) != {8}:
+        raise UnmappableImageException(path, 'not 8 bits per sample')
+
+    if channels not in (1, 3) or \
+            tag(PLANAR_CONFIGURATION, (1,))[0] != 1 or \
+            tag(PHOTOMETRIC_INTERPRETATION)[0] not in (1, 2):
+        raise UnmappableImageException(path, 'not RGB or grayscale')
+
+    offsets = tag(STRIP_OFFSETS)
+    counts = tag(STRIP_BYTE_COUNTS)
+    if any(offsets[i] + counts[i] != offsets[i + 1]
+           for i in range(len(offsets) - 1)):
+        raise UnmappableImageException(path, 'strips are not contiguous')
+
+    return dict(offset=offsets[0],
+                height=tag(IMAGE_LENGTH)[0],
+                width=tag(IMAGE_WIDTH)[0],
+                channels=channels)
+
+
+def read_pnm_layout(f, path):
+    '''Where the pixels of a binary PGM (P5) or PPM (P6) file are'''
+    magic = f.read(2)
+    fields = []
+    while len(fields) < 3:
+        token = b''
+        character = f.read(1)
+        while character.isspace():
+            character = f.read(1)
+
+        while character and not character.isspace():
+            if character == b'#':
+                f.readline()
+                break
+
+            token += character
+            character = f.read(1)
+
+        if not character and not token:
+            raise UnmappableImageException(path, 'truncated header')
+
+        if token:
+            fields.append(int(token))
+
+    width, height, maximum = fields
+    if maximum > 255:
+        raise UnmappableImageException(path, 'not 8 bits per sample')
+
+    return dict(offset=f.tell(),
+                height=height,
+                width=width,
+                channels=3 if magic == b'P6' else 1)
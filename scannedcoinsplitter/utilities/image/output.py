@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Encoding and writing of the crops and merged images, in the format
+configured for each class of output, on a pool of threads"""
+import concurrent.futures
+import logging
+import pathlib
+import threading
+import time
+
+import cv2
+
+import config
+from .. import files
+
+logger = logging.getLogger(__name__)
+
+# TIFF compression schemes, as numbered by libtiff
+TIFF_COMPRESSION = {
+    'none': 1,
+    'lzw': 5,
+    'deflate': 8,
+}
+
+
+def encoding(output_class):
+    '''File extension and OpenCV encoder parameters of an output class, as
+    configured in config.defaults.output_formats'''
+    settings = dict(config.defaults.output_formats[output_class])
+    image_format = settings.pop('format')
+    if image_format == 'png':
+        return '.png', [cv2.IMWRITE_PNG_COMPRESSION, settings.get('level', 1)]
+
+    if image_format == 'webp':
+        # any quality above 100 is lossless
+        return '.webp', [cv2.IMWRITE_WEBP_QUALITY,
+                         settings.get('quality', 101)]
+
+    if image_format == 'jpeg':
+        return '.jpg', [cv2.IMWRITE_JPEG_QUALITY, settings.get('quality', 95)]
+
+    if image_format == 'tiff':
+        return '.tiff', [cv2.IMWRITE_TIFF_COMPRESSION,
+                         TIFF_COMPRESSION[settings.get('compression',
+                                                       'deflate')]]
+
+    raise ValueError('Unknown format {0} for {1} images'.format(
+        image_format, output_class))
+
+
+def output_path(directory, stem, output_class):
+    return pathlib.Path(directory) / (stem + encoding(output_class)[0])
+
+
+def encode(image, output_class):
+    extension, parameters = encoding(output_class)
+    encoded, data = cv2.imencode(extension, image, parameters)
+    if not encoded:
+        raise OSError('Unable to encode a {0} image as {1}'.format(
+            output_class, extension))
+
+    return data
+
+
+def write(path, image, output_class):
+    '''Encode `image` into `path`, atomically. Returns the seconds spent
+    encoding and the number of bytes written.
+    '''
+    start = time.perf_counter()
+    data = encode(image, output_class)
+    seconds = time.perf_counter() - start
+
+    with files.atomic_write(path, 'wb') as f:
+        f.write(data)
+
+    return seconds, data.nbytes
+
+
+class OutputWriter(object):
+    '''Encodes and writes images on `threads` threads, which run in parallel
+    as OpenCV's encoders release the GIL. Once `queue_size` more images wait
+    to be written, submit() blocks, so images are never piled up in memory
+    faster than they can be written.
+    '''
+    def __init__(self, threads, queue_size):
+        self.slots = threading.BoundedSemaphore(threads + queue_size)
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix='output-writer')
+
+    def submit(self, path, image, output_class):
+        '''Write `image` into `path` in the background. The returned future
+        holds what write() returns.'''
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(write, path, image, output_class)
+        except BaseException:
+            self.slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = OutputWriter(
+                threads=config.defaults.output_writer_threads,
+                queue_size=config.defaults.output_writer_queue_size)
+
+    return _writer
+
+
+def wait(futures):
+    '''Block until every write is done, raising the first error. Returns the
+    total seconds spent encoding and bytes written.'''
+    concurrent.futures.wait(futures)
+    seconds = written = 0
+    for future in futures:
+        encoding_seconds, bytes_written = future.result()
+        seconds += encoding_seconds
+        written += bytes_written
+
+    return seconds, written
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pathlib
+import cv2
+import numpy
+
+from ..exceptions import UnreadableImageException
+
+
+class ScannedImage(object):
+    '''A decoded scan. The pixel array is decoded exactly once and owned by
+    this object; cropping, archiving and merging all work on views into it.
+    '''
+    def __init__(self, pixels, name, path=None):
+        if pixels.ndim == 2:
+            pixels = cv2.cvtColor(pixels, cv2.COLOR_GRAY2BGR)
+
+        self.pixels = pixels
+        self.name = name
+        self.path = path
+
+    @classmethod
+    def load(cls, source, name=None, path=None):
+        '''Wrap `source` in a ScannedImage. `source` may already be a
+        ScannedImage, a decoded BGR (or grayscale) numpy array, the encoded
+        bytes of an image file, or a path to an image file. For in-memory
+        sources, `path` records where the scan has been archived, if anywhere.
+        '''
+        if isinstance(source, cls):
+            return source
+
+        if isinstance(source, numpy.ndarray):
+            return cls(pixels=source, name=name or 'scan', path=path)
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            encoded = numpy.frombuffer(source, dtype=numpy.uint8)
+            pixels = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+            if pixels is None:
+                raise UnreadableImageException(name or '<in-memory image>')
+
+            return cls(pixels=pixels, name=name or 'scan', path=path)
+
+        path = pathlib.Path(source)
+        pixels = cv2.imread(str(path))
+        if pixels is None:
+            raise UnreadableImageException(path)
+
+        return cls(pixels=pixels,
+                   name=name or path.name.split(".")[0],
+                   path=path)
+
+    @property
+    def shape(self):
+        return self.pixels.shape
+
+    def view(self, min_x, max_x, min_y, max_y):
+        return self.pixels[min_y:max_y, min_x:max_x]
+
+    def __str__(self):
+        return str(self.path) if self.path is not None else self.name
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Names of the intermediate detection images, kept apart from the archiver
+so that the command line can offer them without importing OpenCV"""
+
+# every intermediate image that extract_ingots() can archive, in the order in
+#  which they are produced
+STAGES = (
+    'gray',
+    'threshold',
+    'opening',
+    'negated',
+    'contours',
+    'bounding_boxes',
+)
+
+
+def parse_stages(stages):
+    '''Normalize a debug level into the set of stages to archive. `stages` may
+    be None (archive nothing), 'all', or a comma separated string or
+    collection of stage names.
+    '''
+    if not stages:
+        return frozenset()
+
+    if isinstance(stages, str):
+        if stages == 'all':
+            return frozenset(STAGES)
+
+        stages = stages.split(',')
+
+    stages = frozenset(stage.strip() for stage in stages)
+    unknown = stages.difference(STAGES)
+    if unknown:
+        raise ValueError('Unknown intermediate image stages: {0}'.format(
+            ', '.join(sorted(unknown))))
+
+    return stages
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Watching a directory for obverse/reverse scan pairs that have finished
+being written"""
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import pathlib
+import select
+import threading
+import time
+
+from . import naming
+from .utilities import files
+
+logger = logging.getLogger(__name__)
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+
+class InotifyWatcher(object):
+    '''Wakes up when files in a directory are created, written or moved in.
+    Events are only used as a wake-up call; the directory is rescanned
+    after each one.'''
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        self.descriptor = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.descriptor < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        watch = libc.inotify_add_watch(self.descriptor,
+                                       os.fsencode(str(directory)),
+                                       self.MASK)
+        if watch < 0:
+            error = ctypes.get_errno()
+            os.close(self.descriptor)
+            raise OSError(error, os.strerror(error), str(directory))
+
+    def wait(self, timeout=None):
+        '''Block until something changes or `timeout` seconds pass. Returns
+        whether anything changed.'''
+        readable, _, _ = select.select([self.descriptor], [], [], timeout)
+        if not readable:
+            return False
+
+        # drain every queued event, they are all handled by one rescan
+        try:
+            while os.read(self.descriptor, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+        return True
+
+    def close(self):
+        os.close(self.descriptor)
+
+
+class PollingWatcher(object):
+    '''Stand-in for InotifyWatcher where inotify is unavailable, e.g. on
+    network shares or other operating systems'''
+    def __init__(self, directory, interval):
+        self.interval = interval
+
+    def wait(self, timeout=None):
+        time.sleep(self.interval if timeout is None
+                   else min(timeout, self.interval))
+        return True
+
+    def close(self):
+        pass
+
+
+def watcher_for(directory, poll_interval, polling=False):
+    if not polling:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            logger.warning('Cannot watch %s with inotify (%s), polling '
+                           'every %s seconds instead', directory, e,
+                           poll_interval)
+
+    return PollingWatcher(directory, interval=poll_interval)
+
+
+class Progress(object):
+    '''Pairs already split, persisted as JSON so that a restarted watcher
+    does not split them again. A pair is split again if either of its scans
+    has been replaced since.'''
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.lock = threading.Lock()
+        try:
+            with open(str(self.path)) as f:
+                self.pairs = json.load(f)
+        except FileNotFoundError:
+            self.pairs = {}
+
+    @staticmethod
+    def signature(*paths):
+        signature = []
+        for path in paths:
+            stat = os.stat(str(path))
+            signature.append([stat.st_size, stat.st_mtime_ns])
+
+        return signature
+
+    def is_done(self, obverse, reverse):
+        entry = self.pairs.get(obverse.name)
+        try:
+            return entry is not None and \
+                entry['signature'] == self.signature(obverse, reverse)
+        except FileNotFoundError:
+            return False
+
+    def record(self, obverse, reverse, merged):
+        self.save(obverse, {
+            'signature': self.signature(obverse, reverse),
+            'merged': merged,
+        })
+
+    def record_failure(self, obverse, reverse, error):
+        '''Record that splitting a pair failed, so that it is not split again
+        until either of its scans is replaced'''
+        self.save(obverse, {
+            'signature': self.signature(obverse, reverse),
+            'error': error,
+        })
+
+    def save(self, obverse, entry):
+        with self.lock:
+            self.pairs[obverse.name] = entry
+            # a crash never leaves the progress file half written
+            with files.atomic_write(self.path) as f:
+                json.dump(self.pairs, f, indent=1, sort_keys=True)
+
+
+class PairTracker(object):
+    '''Tracks the scans in a directory until both sides of a pair have
+    stopped changing for `settle` seconds. A scan whose other side has not
+    appeared after `incomplete_timeout` seconds is reported, once.
+    '''
+    def __init__(self, directory, settle, incomplete_timeout, progress):
+        self.directory = pathlib.Path(directory)
+        self.settle = settle
+        self.incomplete_timeout = incomplete_timeout
+        self.progress = progress
+
+        # path => [(size, mtime), time that signature was first seen]
+        self.scans = {}
+        self.queued = set()
+        self.reported = set()
+
+    def update(self, now=None):
+        '''Rescan the directory, returning every newly completed
+        (obverse, reverse) pair'''
+        now = time.monotonic() if now is None else now
+        present = {}
+        with os.scandir(str(self.directory)) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_file():
+                    continue
+
+                if naming.side_of(entry.name) is None:
+                    continue
+
+                stat = entry.stat()
+                present[pathlib.Path(entry.path)] = (stat.st_size,
+                                                     stat.st_mtime_ns)
+
+        for path, signature in present.items():
+            previous = self.scans.get(path)
+            if previous is None or previous[0] != signature:
+                self.scans[path] = [signature, now]
+                self.queued.discard(path)
+
+        for path in set(self.scans).difference(present):
+            del self.scans[path]
+            self.queued.discard(path)
+
+        ready = []
+        for path, (_, changed) in self.scans.items():
+            if naming.side_of(path) != naming.OBVERSE:
+                continue
+
+            reverse = naming.reverse_of(path)
+            if reverse not in self.scans:
+                continue
+
+            # requeued when either scan of the pair is written again
+            if path in self.queued and reverse in self.queued:
+                continue
+
+            if now - max(changed, self.scans[reverse][1]) < self.settle:
+                continue
+
+            self.queued.update((path, reverse))
+            if self.progress.is_done(path, reverse):
+                logger.debug('%s was already split',
+                             naming.pair_name(path.stem))
+                continue
+
+            ready.append((path, reverse))
+
+        self.report_incomplete(now)
+        return ready
+
+    def report_incomplete(self, now):
+        for path, (_, changed) in self.scans.items():
+            side = naming.side_of(path)
+            other = naming.reverse_of(path) if side == naming.OBVERSE \
+                else naming.obverse_of(path)
+            if other in self.scans:
+                self.reported.discard(path)
+                continue
+
+            if path not in self.reported and \
+                    now - changed >= self.incomplete_timeout:
+                self.reported.add(path)
+                logger.warning('%s has been waiting for its %s scan for '
+                               'over %s seconds', path.name,
+                               naming.REVERSE if side == naming.OBVERSE
+                               else naming.OBVERSE,
+                               self.incomplete_timeout)
+
+    def pending(self):
+        '''Whether any scan is still waiting to settle or for its other
+        side, i.e. whether the directory needs rescanning without an event'''
+        return any(path not in self.queued and path not in self.reported
+                   for path in self.scans)
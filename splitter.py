@@ -28,9 +28,10 @@ LICENSE
 
 """
 import logging
-import progressbar
+import sys
 
 import cli
+from scannedcoinsplitter import instrumentation
 from scannedcoinsplitter.utilities import exceptions
 
 __appname__ = "scannedcoinsplitter"
@@ -39,21 +40,35 @@ __version__ = "0.0pre0"
 __license__ = "GNU GPLv3"
 __indevelopment__ = True        # change this to false when releases are ready
 
-
-progressbar.streams.wrap_stderr()
 logger = logging.getLogger('scannedcoinsplitter')
 
 
 def main(args):
     '''ADD DESCRIPTION HERE'''
+    # keep log lines from tearing through progress bars, but only once a
+    #  subcommand actually runs
+    import progressbar
+    progressbar.streams.wrap_stderr()
+
+    if args.trace:
+        instrumentation.enable(args.trace)
+
     try:
-        args.func(args=args)
-    except exceptions.MissingScannerException as e:
+        with instrumentation.profiler(args.profile, kind=args.profiler):
+            return args.func(args=args)
+    except (exceptions.MissingScannerException,
+            exceptions.ScanTimeoutException,
+            exceptions.ServiceUnavailableException,
+            exceptions.UnreadableImageException) as e:
         logger.error(e)
+        return 1
 
 
 if __name__ == '__main__':
     with cli.prepare(app='scannedcoinsplitter',
                      description=main.__doc__,
                      verbosity=__indevelopment__) as commandline:
-        main(args=commandline.arguments)
+        status = main(args=commandline.arguments)
+
+    # subcommands return a non-zero exit status when any of their work failed
+    sys.exit(status)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pathlib
+
+import cv2
+import numpy
+import pytest
+
+import config
+
+FAKE_SCANIMAGE = pathlib.Path(__file__).resolve().parent / 'fake_scanimage'
+
+
+@pytest.fixture
+def scan_image(tmp_path):
+    '''A small scan of a light scanner bed with one dark bar on it'''
+    image = numpy.full((400, 300, 3), 240, numpy.uint8)
+    image[100:300, 50:250] = 40
+    path = tmp_path / 'scan.tiff'
+    cv2.imwrite(str(path), image)
+    return path
+
+
+@pytest.fixture
+def fake_scanimage(monkeypatch, tmp_path, scan_image):
+    '''Scans through tests/fake_scanimage instead of a real scanner, with
+    every cache and index kept inside the test's temporary directory'''
+    monkeypatch.setattr(config.defaults, 'scanimage', str(FAKE_SCANIMAGE))
+    monkeypatch.setattr(config.defaults, 'cache_directory',
+                        tmp_path / 'cache')
+    monkeypatch.setattr(config.defaults, 'fingerprint_index',
+                        tmp_path / 'cache' / 'fingerprints.sqlite3')
+    monkeypatch.setenv('FAKE_SCANIMAGE_IMAGE', str(scan_image))
+    monkeypatch.delenv('FAKE_SCANIMAGE_DELAY', raising=False)
+    monkeypatch.delenv('FAKE_SCANIMAGE_PAGES', raising=False)
+    return FAKE_SCANIMAGE
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from scannedcoinsplitter import acquisition
+from scannedcoinsplitter.utilities import exceptions
+
+
+async def collect(pages):
+    return [page async for page in pages]
+
+
+def test_stream_scan_decodes_and_archives_the_scan(fake_scanimage,
+                                                    scan_image, tmp_path):
+    path = tmp_path / 'streamed - 0 - obverse.tiff'
+    scan = acquisition.stream_scan(path, device='fake', resolution=300)
+
+    assert scan.shape == (400, 300, 3)
+    assert scan.name == 'streamed - 0 - obverse'
+    assert path.read_bytes() == scan_image.read_bytes()
+
+
+def test_stream_scan_grows_a_buffer_that_is_too_small(fake_scanimage,
+                                                       scan_image, tmp_path,
+                                                       monkeypatch):
+    monkeypatch.setattr(acquisition, 'CHUNK_SIZE', 1024)
+    monkeypatch.setattr(acquisition, 'expected_scan_size',
+                        lambda resolution=None: 1000)
+    path = tmp_path / 'grown.tiff'
+    scan = acquisition.stream_scan(path, device='fake')
+
+    assert scan.shape == (400, 300, 3)
+    assert path.read_bytes() == scan_image.read_bytes()
+
+
+def test_stream_scan_times_out(fake_scanimage, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_SCANIMAGE_DELAY', '5')
+    path = tmp_path / 'slow.tiff'
+    with pytest.raises(exceptions.ScanTimeoutException):
+        acquisition.stream_scan(path, device='fake', timeout=0.5)
+
+    assert not path.exists()
+
+
+def test_stream_scan_of_a_missing_scanner(fake_scanimage, tmp_path):
+    path = tmp_path / 'missing.tiff'
+    with pytest.raises(exceptions.MissingScannerException):
+        acquisition.stream_scan(path, device='missing')
+
+    assert not path.exists()
+
+
+def test_scan_to_file(fake_scanimage, scan_image, tmp_path):
+    path = tmp_path / 'scanned.tiff'
+    assert asyncio.run(acquisition.scan_to_file(path, device='fake')) == path
+    assert path.read_bytes() == scan_image.read_bytes()
+
+
+def test_scan_to_file_runs_scanners_at_once(fake_scanimage, tmp_path,
+                                            monkeypatch):
+    monkeypatch.setenv('FAKE_SCANIMAGE_DELAY', '1')
+
+    async def scan_three():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(
+            acquisition.scan_to_file(tmp_path / '{0}.tiff'.format(n),
+                                     device='fake {0}'.format(n))
+            for n in range(3)))
+        return loop.time() - start
+
+    assert asyncio.run(scan_three()) < 2.5
+
+
+def test_scan_to_file_times_out(fake_scanimage, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_SCANIMAGE_DELAY', '5')
+    path = tmp_path / 'slow.tiff'
+    with pytest.raises(exceptions.ScanTimeoutException):
+        asyncio.run(acquisition.scan_to_file(path, device='fake',
+                                             timeout=0.5))
+
+    assert not path.exists()
+
+
+def test_scan_to_file_of_a_missing_scanner(fake_scanimage, tmp_path):
+    path = tmp_path / 'missing.tiff'
+    with pytest.raises(exceptions.MissingScannerException):
+        asyncio.run(acquisition.scan_to_file(path, device='missing'))
+
+    assert not path.exists()
+
+
+def test_scan_batch_until_the_feeder_is_empty(fake_scanimage, scan_image,
+                                              tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_SCANIMAGE_PAGES', '3')
+    pattern = tmp_path / 'page%d.tiff'
+    pages = asyncio.run(collect(acquisition.scan_batch(pattern,
+                                                       device='fake')))
+
+    assert pages == [(n, tmp_path / 'page{0}.tiff'.format(n))
+                     for n in (1, 2, 3)]
+    for _, path in pages:
+        assert path.read_bytes() == scan_image.read_bytes()
+
+
+def test_scan_batch_of_a_number_of_pages(fake_scanimage, tmp_path):
+    pattern = tmp_path / 'page%d.tiff'
+    pages = asyncio.run(collect(acquisition.scan_batch(pattern,
+                                                       device='fake',
+                                                       pages=4)))
+
+    assert [page for page, _ in pages] == [1, 2, 3, 4]
+
+
+def test_scan_batch_yields_each_page_as_it_is_scanned(fake_scanimage,
+                                                      tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_SCANIMAGE_DELAY', '0.5')
+    monkeypatch.setenv('FAKE_SCANIMAGE_PAGES', '3')
+
+    async def arrivals():
+        loop = asyncio.get_running_loop()
+        times = []
+        async for _, path in acquisition.scan_batch(tmp_path / 'page%d.tiff',
+                                                    device='fake'):
+            assert path.exists()
+            times.append(loop.time())
+
+        return times
+
+    first, second, third = asyncio.run(arrivals())
+    assert second - first >= 0.4
+    assert third - second >= 0.4
+
+
+def test_scan_batch_times_out_on_a_page(fake_scanimage, tmp_path,
+                                        monkeypatch):
+    monkeypatch.setenv('FAKE_SCANIMAGE_DELAY', '5')
+    with pytest.raises(exceptions.ScanTimeoutException):
+        asyncio.run(collect(acquisition.scan_batch(tmp_path / 'page%d.tiff',
+                                                   device='fake',
+                                                   timeout=0.5)))
+
+
+def test_scan_batch_of_a_missing_scanner(fake_scanimage, tmp_path):
+    with pytest.raises(exceptions.MissingScannerException):
+        asyncio.run(collect(acquisition.scan_batch(tmp_path / 'page%d.tiff',
+                                                   device='missing')))
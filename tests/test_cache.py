@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+
+import numpy
+
+from scannedcoinsplitter import cache
+
+
+def entry_size(tmp_path):
+    probe = cache.ResultCache(tmp_path / 'probe', max_bytes=2**20)
+    probe.put('probe', {'value': 'x' * 100})
+    return probe.entry_path('probe').stat().st_size
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    size = entry_size(tmp_path)
+    results = cache.ResultCache(tmp_path / 'cache', max_bytes=3 * size)
+    for n, key in enumerate('abc'):
+        results.put(key, {'value': key * 100})
+        # an hour apart, oldest first
+        os.utime(str(results.entry_path(key)), (n * 3600, n * 3600))
+
+    assert results.get('a') == {'value': 'a' * 100}
+    results.put('d', {'value': 'd' * 100})
+
+    assert results.get('b') is None
+    assert [results.get(key) is not None for key in 'acd'] == [True] * 3
+    assert results.size == 3 * size
+
+
+def test_the_directory_is_only_listed_once_full(tmp_path, monkeypatch):
+    size = entry_size(tmp_path)
+    results = cache.ResultCache(tmp_path / 'cache', max_bytes=3 * size)
+    results.put('a', {'value': 'a' * 100})
+
+    listings = []
+    evict = results.evict
+    monkeypatch.setattr(results, 'evict',
+                        lambda: listings.append(1) or evict())
+    results.put('b', {'value': 'b' * 100})
+    results.put('c', {'value': 'c' * 100})
+    # replacing an entry does not grow the cache
+    results.put('c', {'value': 'C' * 100})
+    assert listings == []
+
+    results.put('d', {'value': 'd' * 100})
+    assert listings == [1]
+    assert results.size == 3 * size
+
+
+def test_content_hash_follows_the_content_of_a_scan(tmp_path):
+    results = cache.ResultCache(tmp_path / 'cache', max_bytes=2**20)
+    path = tmp_path / 'scan.tiff'
+    path.write_bytes(b'first scan')
+    first = results.content_hash(path)
+    pixels = numpy.zeros((4, 4, 3), numpy.uint8)
+
+    assert results.content_hash(str(path)) == first
+    assert results.content_hash(b'first scan') == first
+    path.write_bytes(b'second scan!')
+    assert results.content_hash(path) != first
+    assert results.content_hash(pixels) != results.content_hash(pixels[:2])
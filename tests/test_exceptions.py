@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pickle
+
+import pytest
+
+from scannedcoinsplitter.utilities import exceptions
+
+
+@pytest.mark.parametrize('exception', [
+    exceptions.MissingScannerException('scanner'),
+    exceptions.ScanTimeoutException('scanner', 30),
+    exceptions.ServiceUnavailableException('/run/split.sock'),
+    exceptions.UnmappableImageException('scan.tiff', 'compressed'),
+    exceptions.UnreadableImageException('scan.tiff'),
+])
+def test_exceptions_survive_the_trip_back_from_a_worker(exception):
+    rebuilt = pickle.loads(pickle.dumps(exception))
+
+    assert type(rebuilt) is type(exception)
+    assert rebuilt.message == exception.message
+    assert str(rebuilt) == str(exception)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import stat
+
+import pytest
+
+from scannedcoinsplitter.utilities import files
+
+
+def mode(path):
+    return stat.S_IMODE(path.stat().st_mode)
+
+
+def test_atomic_write_gives_the_permissions_of_open(tmp_path):
+    expected = tmp_path / 'opened.txt'
+    expected.write_text('contents')
+    path = tmp_path / 'written.txt'
+    with files.atomic_write(path) as f:
+        f.write('contents')
+
+    assert path.read_text() == 'contents'
+    assert mode(path) == mode(expected) == 0o666 & ~files.UMASK
+
+
+def test_atomic_write_leaves_the_file_as_it_was_on_error(tmp_path):
+    path = tmp_path / 'written.txt'
+    path.write_text('before')
+    with pytest.raises(RuntimeError):
+        with files.atomic_write(path) as f:
+            f.write('after')
+            raise RuntimeError
+
+    assert path.read_text() == 'before'
+    assert list(tmp_path.iterdir()) == [path]
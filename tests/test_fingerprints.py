@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import cv2
+import numpy
+
+import config
+from scannedcoinsplitter import fingerprints
+
+
+def texture(seed):
+    '''An image with detail at every scale, like the face of a coin'''
+    random = numpy.random.default_rng(seed)
+    pixels = random.integers(0, 256, (24, 24, 3), numpy.uint8)
+    return cv2.resize(pixels, (240, 240), interpolation=cv2.INTER_CUBIC)
+
+
+def rescanned(image):
+    '''The same item scanned again: at another size, brighter, and saved as
+    a JPEG'''
+    image = cv2.resize(image, (216, 216), interpolation=cv2.INTER_AREA)
+    _, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    image = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+    return cv2.convertScaleAbs(image, alpha=1.05, beta=8)
+
+
+def test_fingerprinting_is_off_by_default():
+    assert config.defaults.fingerprint_index is None
+
+
+def test_duplicate_distance_tells_rescans_from_other_items(tmp_path):
+    index = fingerprints.FingerprintIndex(tmp_path / 'fingerprints.sqlite3')
+    images = [texture(seed) for seed in range(20)]
+    for n, image in enumerate(images):
+        index.add(tmp_path / '{0}.png'.format(n), 'merged',
+                  fingerprints.fingerprint(image))
+
+    for n, image in enumerate(images):
+        found = index.matches(fingerprints.fingerprint(rescanned(image)))
+        assert [match.name for match in found] == [str(n)]
+        assert found[0].distance <= config.defaults.duplicate_distance
+
+
+def test_bk_tree_finds_what_a_linear_search_finds():
+    random = numpy.random.default_rng(0)
+    values = [int(value) for value in random.integers(0, 2**63, 300)]
+    tree = fingerprints.BKTree()
+    for n, value in enumerate(values):
+        tree.add(value, n)
+
+    for value in values[:20]:
+        for max_distance in (0, 6, 30):
+            expected = sorted(
+                (fingerprints.hamming(value, other), n)
+                for n, other in enumerate(values)
+                if fingerprints.hamming(value, other) <= max_distance)
+            assert tree.search(value, max_distance) == expected
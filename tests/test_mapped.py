@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import cv2
+import numpy
+
+from scannedcoinsplitter.utilities.image import ImageFromScan
+from scannedcoinsplitter.utilities.image import mapped
+
+
+def uncompressed_scan(tmp_path):
+    random = numpy.random.default_rng(0)
+    pixels = random.integers(0, 256, (120, 90, 3), numpy.uint8)
+    path = tmp_path / 'scan.tiff'
+    cv2.imwrite(str(path), pixels, [cv2.IMWRITE_TIFF_COMPRESSION, 1])
+    return path, pixels
+
+
+def test_crops_of_a_mapped_scan_are_read_when_used(tmp_path):
+    path, pixels = uncompressed_scan(tmp_path)
+    scan = mapped.MappedScan.open(path)
+    region = scan.view(10, 40, 20, 70)
+
+    assert isinstance(region, mapped.MappedRegion)
+    crop = ImageFromScan(box=None, img=region)
+    assert (crop.h, crop.w) == (50, 30)
+    assert (crop.img == pixels[20:70, 10:40]).all()
+    # every use reads the crop again, rather than keeping it in memory
+    assert crop.img is not crop.img
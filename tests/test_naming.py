@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import concurrent.futures
+import multiprocessing
+
+from scannedcoinsplitter import naming
+
+
+def claim(directory):
+    return naming.claim_scan_path(directory=directory, name='coins').name
+
+
+def test_claims_count_up_from_the_counter(tmp_path):
+    names = [claim(tmp_path) for _ in range(3)]
+
+    assert names == ['coins - 0 - obverse.tiff', 'coins - 1 - obverse.tiff',
+                     'coins - 2 - obverse.tiff']
+    assert (tmp_path / '.coins.index').read_text() == '3'
+
+
+def test_claims_continue_after_existing_scans(tmp_path):
+    # scanned before the counter existed
+    (tmp_path / 'coins - 4 - obverse.tiff').touch()
+    (tmp_path / 'coins - 4 - reverse.tiff').touch()
+    (tmp_path / 'other - 9 - obverse.tiff').touch()
+
+    assert claim(tmp_path) == 'coins - 5 - obverse.tiff'
+
+
+def test_claims_skip_scans_the_counter_does_not_know(tmp_path):
+    claim(tmp_path)
+    # copied in by hand
+    (tmp_path / 'coins - 1 - obverse.tiff').touch()
+
+    assert claim(tmp_path) == 'coins - 2 - obverse.tiff'
+    assert (tmp_path / '.coins.index').read_text() == '3'
+
+
+def test_concurrent_claims_never_collide(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=4,
+                                                mp_context=context) as pool:
+        names = list(pool.map(claim, [tmp_path] * 40))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        names += list(pool.map(claim, [tmp_path] * 40))
+
+    assert sorted(names) == sorted(
+        'coins - {0} - obverse.tiff'.format(n) for n in range(80))
+
+
+def test_pair_names_and_sides():
+    obverse = 'tray - 3 - obverse.tiff'
+
+    assert naming.reverse_of(obverse).name == 'tray - 3 - reverse.tiff'
+    assert naming.side_of(obverse) == naming.OBVERSE
+    assert naming.side_of('tray - 3 - reverse.png') == naming.REVERSE
+    assert naming.side_of('notes.txt') is None
+    assert naming.pair_name('tray - 3 - obverse') == 'tray - 3'
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import stat
+
+import cv2
+import numpy
+
+from scannedcoinsplitter.utilities import files
+from scannedcoinsplitter.utilities.image import output
+
+
+def test_written_images_can_be_read_by_others(tmp_path):
+    image = numpy.full((20, 30, 3), 128, numpy.uint8)
+    path = output.output_path(tmp_path, 'coin', 'crop')
+    writer = output.OutputWriter(threads=1, queue_size=1)
+    output.wait([writer.submit(path, image, 'crop')])
+
+    assert (cv2.imread(str(path)) == image).all()
+    assert stat.S_IMODE(path.stat().st_mode) == 0o666 & ~files.UMASK
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import numpy
+import pytest
+
+from scannedcoinsplitter import pairing
+
+
+@pytest.mark.parametrize('shape', [(1, 1), (1, 5), (6, 6), (4, 9), (9, 4),
+                                   (20, 25), (25, 20)])
+def test_hungarian_agrees_with_scipy(shape):
+    optimize = pytest.importorskip('scipy.optimize')
+    random = numpy.random.default_rng(sum(shape))
+    for _ in range(10):
+        cost = random.uniform(0, 1000, shape)
+        rows, columns = pairing.hungarian(cost)
+        expected_rows, expected_columns = optimize.linear_sum_assignment(cost)
+
+        assert len(rows) == min(shape)
+        assert list(rows) == sorted(rows)
+        assert len(set(columns.tolist())) == len(columns)
+        assert cost[rows, columns].sum() == pytest.approx(
+            cost[expected_rows, expected_columns].sum())
+
+
+def test_pairing_without_scipy_reports_the_surplus(monkeypatch):
+    monkeypatch.setattr(pairing, 'scipy_solver', lambda: None)
+    obverse = [(100, 100), (500, 100), (100, 500)]
+    # a fourth reverse object, and the others shifted a little
+    reverse = [(505, 96), (900, 900), (98, 503), (103, 101)]
+    pairs = pairing.pair(obverse, reverse)
+
+    assert list(pairs) == [(0, 3), (1, 0), (2, 2)]
+    assert pairs.unmatched_obverse.tolist() == []
+    assert pairs.unmatched_reverse.tolist() == [1]
+
+
+def test_pairing_drops_pairs_too_far_apart():
+    pairs = pairing.pair([(100, 100), (500, 500)], [(102, 100), (900, 900)],
+                         max_distance=50)
+
+    assert list(pairs) == [(0, 0)]
+    assert pairs.unmatched_obverse.tolist() == [1]
+    assert pairs.unmatched_reverse.tolist() == [1]
+
+
+def test_pairing_finds_a_flipped_tray():
+    obverse = [(100, 100), (300, 120), (700, 400)]
+    reverse = [(1000 - x + 3, y - 2) for x, y in obverse]
+    pairs = pairing.pair(obverse, reverse, width=1000, mirror='auto')
+
+    assert pairs.mirrored
+    assert list(pairs) == [(0, 0), (1, 1), (2, 2)]
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import argparse
+import concurrent.futures
+
+from scannedcoinsplitter import commands
+from scannedcoinsplitter import manifest
+from scannedcoinsplitter import station
+from scannedcoinsplitter.commands import feed as feed_command
+from scannedcoinsplitter.commands import station as station_command
+
+
+def test_station_carries_on_without_a_missing_scanner(fake_scanimage,
+                                                      tmp_path):
+    scanners = station.configured_scanners(devices=['first', 'missing'],
+                                           output_directory=tmp_path / 'out')
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        station.Station(scanners=scanners, executor=executor,
+                        image_name='coins', rounds=2, pause=0).run()
+
+    working, missing = scanners
+    assert working.error is None
+    assert len(working.merged) == 2
+    assert missing.error is not None
+    assert missing.merged == []
+
+    saved = manifest.manifests(tmp_path / 'out')
+    assert [m['name'] for m in saved] == ['coins - scanner 0 - 0',
+                                          'coins - scanner 0 - 1']
+    for m in saved:
+        assert len(m['merged']) == 1
+        assert set(m['timings']) >= {'obverse_scan', 'reverse_scan',
+                                     'obverse_split', 'reverse_split',
+                                     'merge'}
+
+
+def test_station_lists_the_pairs_it_could_not_split(fake_scanimage,
+                                                     tmp_path, monkeypatch):
+    junk = tmp_path / 'junk.tiff'
+    junk.write_bytes(b'not an image')
+    monkeypatch.setenv('FAKE_SCANIMAGE_IMAGE', str(junk))
+    scanner, = station.configured_scanners(devices=['first'],
+                                           output_directory=tmp_path / 'out')
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        station.Station(scanners=[scanner], executor=executor,
+                        image_name='coins', pause=0).run()
+
+    assert scanner.error is None
+    assert scanner.merged == []
+    assert scanner.failed == ['coins - 0']
+
+
+def pipeline_arguments():
+    parser = argparse.ArgumentParser()
+    commands.add_pipeline_arguments(parser)
+    return vars(parser.parse_args([]))
+
+
+def station_arguments(tmp_path, devices):
+    return argparse.Namespace(devices=devices,
+                              output_directory=tmp_path / 'out',
+                              image_name='coins', rounds=1, pause=0,
+                              jobs=None, **pipeline_arguments())
+
+
+def test_station_command_succeeds(fake_scanimage, tmp_path):
+    assert station_command.main(station_arguments(tmp_path,
+                                                  ['first'])) is None
+
+
+def test_station_command_fails_with_a_scanner(fake_scanimage, tmp_path):
+    assert station_command.main(station_arguments(
+        tmp_path, ['first', 'missing'])) == 1
+
+
+def test_feeder_pairs_consecutive_pages(fake_scanimage, tmp_path,
+                                        monkeypatch):
+    monkeypatch.setenv('FAKE_SCANIMAGE_PAGES', '5')
+    output_directory = tmp_path / 'out'
+    scanner, = station.configured_scanners(devices=['feeder'],
+                                           output_directory=output_directory)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        station.FeederSession(scanner=scanner, executor=executor,
+                              image_name='fed').run()
+
+    assert scanner.error is None
+    assert len(scanner.merged) == 2
+    assert [m['name'] for m in manifest.manifests(output_directory)] == [
+        'fed - 0', 'fed - 1']
+    # the fifth page has no reverse, and is left unpaired
+    assert sorted(path.name
+                  for path in output_directory.glob('*.tiff')) == [
+        'fed - 0 - obverse.tiff', 'fed - 0 - reverse.tiff',
+        'fed - 1 - obverse.tiff', 'fed - 1 - reverse.tiff',
+        'fed - 2 - obverse.tiff',
+    ]
+
+
+def feed_arguments(tmp_path, device, pages):
+    return argparse.Namespace(device=device, source=None, resolution=300,
+                              pages=pages, output_directory=tmp_path / 'out',
+                              image_name='fed', jobs=2,
+                              **pipeline_arguments())
+
+
+def test_feed_command_succeeds(fake_scanimage, tmp_path):
+    assert feed_command.main(feed_arguments(tmp_path, 'feeder', 2)) is None
+
+
+def test_feed_command_fails_with_its_scanner(fake_scanimage, tmp_path):
+    assert feed_command.main(feed_arguments(tmp_path, 'missing', 2)) == 1
+
+
+def test_feed_command_fails_with_a_pair(fake_scanimage, tmp_path,
+                                        monkeypatch):
+    junk = tmp_path / 'junk.tiff'
+    junk.write_bytes(b'not an image')
+    monkeypatch.setenv('FAKE_SCANIMAGE_IMAGE', str(junk))
+    assert feed_command.main(feed_arguments(tmp_path, 'feeder', 2)) == 1
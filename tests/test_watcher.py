@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+import os
+
+from scannedcoinsplitter import watcher
+
+
+def scan(directory, name, content=b'scan'):
+    path = directory / name
+    path.write_bytes(content)
+    return path
+
+
+def tracker(directory):
+    progress = watcher.Progress(directory / '.progress.json')
+    return watcher.PairTracker(directory, settle=5, incomplete_timeout=60,
+                               progress=progress)
+
+
+def test_a_pair_is_ready_once_both_scans_settle(tmp_path):
+    pairs = tracker(tmp_path)
+    obverse = scan(tmp_path, 'tray - 0 - obverse.tiff')
+    assert pairs.update(now=0) == []
+
+    reverse = scan(tmp_path, 'tray - 0 - reverse.tiff')
+    assert pairs.update(now=3) == []
+    assert pairs.pending()
+    assert pairs.update(now=7) == []
+    assert pairs.update(now=8) == [(obverse, reverse)]
+    # handed out once only
+    assert pairs.update(now=20) == []
+    assert not pairs.pending()
+
+
+def test_a_pair_is_split_again_when_a_scan_is_rewritten(tmp_path):
+    pairs = tracker(tmp_path)
+    obverse = scan(tmp_path, 'tray - 0 - obverse.tiff')
+    reverse = scan(tmp_path, 'tray - 0 - reverse.tiff')
+    assert pairs.update(now=10) == []
+    assert pairs.update(now=15) == [(obverse, reverse)]
+
+    scan(tmp_path, reverse.name, b'rescanned')
+    assert pairs.update(now=16) == []
+    assert pairs.update(now=21) == [(obverse, reverse)]
+
+
+def test_pairs_split_before_a_restart_are_skipped(tmp_path):
+    obverse = scan(tmp_path, 'tray - 0 - obverse.tiff')
+    reverse = scan(tmp_path, 'tray - 0 - reverse.tiff')
+    tracker(tmp_path).progress.record(obverse, reverse, ['merged.png'])
+
+    pairs = tracker(tmp_path)
+    assert pairs.update(now=0) == []
+    assert pairs.update(now=10) == []
+
+    os.utime(str(obverse), ns=(0, 0))
+    assert pairs.update(now=11) == []
+    assert pairs.update(now=20) == [(obverse, reverse)]
+
+
+def test_other_files_are_ignored(tmp_path):
+    pairs = tracker(tmp_path)
+    scan(tmp_path, '.tray-page1.tiff')
+    scan(tmp_path, '.tray - 0 - obverse.tiff')
+    scan(tmp_path, '.tray - 0 - reverse.tiff')
+    scan(tmp_path, 'notes.txt')
+
+    assert pairs.update(now=0) == []
+    assert pairs.update(now=100) == []
+    assert pairs.scans == {}
+
+
+def test_a_lone_scan_is_reported_once(tmp_path, caplog):
+    pairs = tracker(tmp_path)
+    scan(tmp_path, 'tray - 0 - obverse.tiff')
+    with caplog.at_level(logging.WARNING, logger=watcher.__name__):
+        pairs.update(now=0)
+        pairs.update(now=61)
+        pairs.update(now=120)
+
+    assert len(caplog.records) == 1
+    assert 'waiting for its reverse scan' in caplog.records[0].getMessage()
+    assert not pairs.pending()